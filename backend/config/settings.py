@@ -97,6 +97,45 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Membership contexts are cached in 'default' and list responses in
+# 'responses'; both are evicted by signals. Use a shared backend
+# (Redis/Memcached) when running more than one server process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'promptbox-responses',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+}
+
+PROMPTBOX_MEMBERSHIP_CACHE_TIMEOUT = 300
+
+# History rows between full snapshots (bounds the work to rebuild any version)
+PROMPTBOX_HISTORY_KEYFRAME_INTERVAL = 20
+
+# History rows are queued and written after the request by an in-process
+# thread. Set to False when the process_history_outbox command runs instead.
+PROMPTBOX_HISTORY_OUTBOX_THREAD = True
+
+# Workflow runs: model backend (a name in promptbox.backends.BACKENDS or a
+# dotted class path) and the most steps of one run executing at once
+PROMPTBOX_MODEL_BACKEND = 'stub'
+PROMPTBOX_RUNNER_MAX_CONCURRENCY = 8
+
+# Password hashing processes shared by bulk user import requests (the
+# import_users command starts its own pool, one process per CPU by default)
+PROMPTBOX_USER_IMPORT_WORKERS = 2
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -0,0 +1,104 @@
+"""
+Precomputed visibility index for prompts and workflows.
+
+The visibility rules (PublicPromptFetchRules) are folded into one row per
+(principal, object) in PromptAccess / WorkflowAccess:
+
+* PUBLIC  -> the owning organization
+* TEAM    -> every team the object is shared with
+* PRIVATE -> the creator
+
+A caller can see an object when any of their principals (their user ID, their
+organization IDs and their team IDs) has a row for it, or when it is shared
+with a team below one of their teams (see promptbox.hierarchy). Membership
+and team hierarchy changes therefore never touch the index; only changes to
+an object's visibility, owner, organization or team shares do.
+"""
+from django.db.models import Q
+
+from .hierarchy import team_hierarchy
+from .models import Prompt, PromptAccess, TeamPrompt, Workflow, WorkflowAccess, WorkflowTeam
+
+BATCH_SIZE = 500
+
+
+class AccessIndex:
+    def __init__(self, model, entry_model, share_model, field):
+        self.model = model
+        self.entry_model = entry_model
+        self.share_model = share_model
+        self.field = field
+
+    def expected_entries(self, object_ids):
+        """Return the set of (object_id, principal_type, principal_id) rows the objects should have."""
+        entries = set()
+        rows = self.model.objects.filter(id__in=object_ids).values_list(
+            'id', 'organization_id', 'created_by_id', 'visibility'
+        )
+        team_objects = set()
+        for object_id, org_id, created_by_id, visibility in rows:
+            if visibility == 'PUBLIC':
+                entries.add((object_id, 'ORGANIZATION', org_id))
+            elif visibility == 'PRIVATE' and created_by_id:
+                entries.add((object_id, 'USER', created_by_id))
+            elif visibility == 'TEAM':
+                team_objects.add(object_id)
+
+        if team_objects:
+            shares = self.share_model.objects.filter(
+                **{f'{self.field}_id__in': team_objects}
+            ).values_list(f'{self.field}_id', 'team_id')
+            for object_id, team_id in shares:
+                entries.add((object_id, 'TEAM', team_id))
+
+        return entries
+
+    def sync(self, object_ids, dry_run=False):
+        """
+        Bring the index rows of the given objects in line with their current
+        state. Returns (added, removed) row counts.
+        """
+        object_ids = list(object_ids)
+        added = removed = 0
+        for start in range(0, len(object_ids), BATCH_SIZE):
+            batch = object_ids[start:start + BATCH_SIZE]
+            expected = self.expected_entries(batch)
+
+            existing = {}
+            rows = self.entry_model.objects.filter(**{f'{self.field}_id__in': batch}).values_list(
+                'id', f'{self.field}_id', 'principal_type', 'principal_id'
+            )
+            for entry_id, object_id, principal_type, principal_id in rows:
+                existing[(object_id, principal_type, principal_id)] = entry_id
+
+            stale = [entry_id for key, entry_id in existing.items() if key not in expected]
+            missing = [key for key in expected if key not in existing]
+            added += len(missing)
+            removed += len(stale)
+            if dry_run:
+                continue
+
+            if stale:
+                self.entry_model.objects.filter(id__in=stale).delete()
+            if missing:
+                self.entry_model.objects.bulk_create([
+                    self.entry_model(
+                        **{f'{self.field}_id': object_id},
+                        principal_type=principal_type,
+                        principal_id=principal_id,
+                    )
+                    for object_id, principal_type, principal_id in missing
+                ])
+
+        return added, removed
+
+    def visible(self, queryset, principal_ids):
+        """Restrict ``queryset`` to objects visible to any of ``principal_ids``."""
+        visible_ids = self.entry_model.objects.filter(
+            Q(principal_id__in=principal_ids) | Q(principal_id__in=team_hierarchy.descendants(principal_ids))
+        ).values(f'{self.field}_id')
+        return queryset.filter(id__in=visible_ids)
+
+
+prompt_access = AccessIndex(Prompt, PromptAccess, TeamPrompt, 'prompt')
+workflow_access = AccessIndex(Workflow, WorkflowAccess, WorkflowTeam, 'workflow')
@@ -0,0 +1,144 @@
+"""
+Point-in-time reads: ``?as_of=<timestamp>`` on list and retrieve.
+
+A history row holds the state its object had *before* the change it records,
+so the state at time T is the snapshot of the first history row after T, or
+the live row when nothing changed since. The page query is annotated with
+that row's ID (one index seek on (parent, created_at) per object), the
+snapshots are rebuilt for the whole page in one go (see promptbox.history)
+and applied to the loaded instances, so the regular serializers render them.
+
+Objects created after T are left out. Access rules and most filters are
+evaluated against the current rows (``filter_as_of`` handles the ones that
+must see the old state, such as a prompt's folder, from columns the history
+rows carry); objects deleted since T are gone, and related names (categories,
+teams, step prompts) are current. Changes still in the history outbox are
+written for the objects on the page only, so filters may miss an edit made
+in the last moments before the request.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from . import outbox as history_outbox
+
+AS_OF_PARAM = 'as_of'
+BATCH_SIZE = 500
+
+
+def parse_as_of(value):
+    """Parse an ISO timestamp; a bare date means the end of that day."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.combine(day + timedelta(days=1), time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def prefetched(model, rows):
+    """A QuerySet that yields ``rows`` without querying, like a prefetch result."""
+    queryset = model.objects.all()
+    queryset._result_cache = rows
+    queryset._prefetch_done = True
+    return queryset
+
+
+def next_change(store, as_of):
+    """Subquery for the ID of the first history row after ``as_of`` (None if unchanged since)."""
+    return Subquery(store.model.objects.filter(
+        **{store.field: OuterRef('pk')}, created_at__gt=as_of
+    ).order_by('created_at', 'version').values('id')[:1])
+
+
+def resolve_snapshots(store, history_ids):
+    """Map history row IDs to their full snapshots, ``BATCH_SIZE`` rows at a time."""
+    history_ids = list(history_ids)
+    snapshots = {}
+    for start in range(0, len(history_ids), BATCH_SIZE):
+        rows = list(store.model.objects.filter(id__in=history_ids[start:start + BATCH_SIZE]))
+        snapshots.update((row.id, row.snapshot) for row in store.resolve(rows))
+    return snapshots
+
+
+def filter_as_of(store, queryset, column, value, **current_lookup):
+    """
+    Keep objects of ``queryset`` (annotated with ``as_of_history_id``) whose
+    history ``column`` (see ``HistoryStore.columns``) was ``value`` at the
+    time. Unchanged objects are matched with ``current_lookup``; the whole
+    filter runs in SQL, no snapshot is rebuilt.
+    """
+    alias = f'as_of_{column}'
+    queryset = queryset.alias(**{alias: Subquery(
+        store.model.objects.filter(id=OuterRef('as_of_history_id')).values(column)[:1]
+    )})
+    then = {f'{alias}__isnull': True} if value is None else {alias: value}
+    return queryset.filter(Q(as_of_history_id__isnull=True, **current_lookup) | Q(as_of_history_id__isnull=False, **then))
+
+
+class AsOfMixin:
+    """
+    Views set ``history_store`` (see promptbox.history) and implement
+    ``restore_snapshots(pairs)``, which applies (instance, snapshot) pairs to
+    the loaded instances and their prefetched relations.
+    """
+    history_store = None
+
+    def get_as_of(self):
+        if self.action not in ('list', 'retrieve'):
+            return None
+        if not hasattr(self, '_as_of'):
+            raw = self.request.query_params.get(AS_OF_PARAM)
+            try:
+                self._as_of = parse_as_of(raw) if raw else None
+            except ValueError:
+                raise ValidationError({AS_OF_PARAM: 'Expected an ISO 8601 date or timestamp.'})
+        return self._as_of
+
+    def is_summary(self):
+        # Summaries are built from live columns in SQL
+        return super().is_summary() and self.get_as_of() is None
+
+    def as_of_queryset(self, queryset):
+        as_of = self.get_as_of()
+        if as_of is None:
+            return queryset
+        return queryset.filter(created_at__lte=as_of).annotate(as_of_history_id=next_change(self.history_store, as_of))
+
+    def filter_as_of(self, queryset, column, value, **current_lookup):
+        return filter_as_of(self.history_store, queryset, column, value, **current_lookup)
+
+    def apply_as_of(self, rows):
+        """Replace the live state of ``rows`` with their state at ``as_of``."""
+        as_of = self.get_as_of()
+        if as_of is None or not rows:
+            return rows
+        if history_outbox.flush(self.history_store, [row.pk for row in rows]):
+            # Queued changes of these objects were just written; look their next change up again
+            model = type(rows[0])
+            next_ids = dict(model.objects.filter(pk__in=[row.pk for row in rows]).annotate(
+                as_of_history_id=next_change(self.history_store, as_of)
+            ).values_list('pk', 'as_of_history_id'))
+            for row in rows:
+                row.as_of_history_id = next_ids.get(row.pk)
+        snapshots = resolve_snapshots(self.history_store, [row.as_of_history_id for row in rows if row.as_of_history_id])
+        self.restore_snapshots([
+            (row, snapshots[row.as_of_history_id])
+            for row in rows if row.as_of_history_id in snapshots
+        ])
+        return rows
+
+    def paginate_queryset(self, queryset):
+        return self.apply_as_of(super().paginate_queryset(queryset))
+
+    def get_object(self):
+        obj = super().get_object()
+        if self.action == 'retrieve':
+            self.apply_as_of([obj])
+        return obj
@@ -0,0 +1,61 @@
+"""
+Model backends used to run workflow steps (see promptbox.runner).
+
+A backend turns one step request (the composed prompt text and the prompt's
+``model``) into output text. Backends implement ``complete`` as a coroutine,
+or only ``complete_sync`` for blocking clients, which is then run in a
+worker thread. ``PROMPTBOX_MODEL_BACKEND`` names the backend to use: a key of
+``BACKENDS`` or the dotted path of a backend class.
+"""
+import asyncio
+import hashlib
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'stub'
+
+
+@dataclass(frozen=True)
+class StepRequest:
+    text: str
+    model: str
+    step_name: str = ''
+
+
+class ModelBackend:
+    name = None
+
+    async def complete(self, request):
+        return await asyncio.to_thread(self.complete_sync, request)
+
+    def complete_sync(self, request):
+        raise NotImplementedError
+
+
+class StubBackend(ModelBackend):
+    """
+    Deterministic local backend for development and tests: the output is
+    derived from the request only. ``delay`` (seconds) simulates latency.
+    """
+    name = 'stub'
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    async def complete(self, request):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        digest = hashlib.sha256(f'{request.model}\n{request.text}'.encode('utf-8')).hexdigest()[:12]
+        return f'[{request.model or "default"}:{digest}] {request.step_name or "step"} done'
+
+
+BACKENDS = {backend.name: backend for backend in (StubBackend,)}
+
+
+def get_model_backend(name=None):
+    """Instantiate the named backend, or the one configured in settings."""
+    name = name or getattr(settings, 'PROMPTBOX_MODEL_BACKEND', DEFAULT_BACKEND)
+    backend_class = BACKENDS.get(name) or import_string(name)
+    return backend_class()
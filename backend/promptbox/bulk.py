@@ -0,0 +1,388 @@
+"""
+Bulk create / update / delete of prompts.
+
+A request is validated as a whole: item shapes first, then every referenced
+organization, folder, category, team and prompt in one query per table.
+Valid items are written in a single transaction with ``bulk_create`` /
+``bulk_update``. Those skip model signals, so the search index, the access
+index and the list response cache are refreshed here explicitly.
+
+``atomic`` mode writes nothing unless every item is valid; ``best_effort``
+writes the valid items and reports the rest.
+
+``BulkPromptReverter`` rolls a whole scope of prompts back to a point in
+time the same way: target versions are found for the scope in one query
+(see promptbox.as_of) and the changes are written in one transaction.
+"""
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from . import outbox as history_outbox, response_cache
+from .access import prompt_access
+from .as_of import BATCH_SIZE, filter_as_of, next_change, resolve_snapshots
+from .deletion import delete_objects, delete_rows
+from .history import prompt_history
+from .membership import as_uuid
+from .models import Category, Folder, Prompt, PromptCategory, Team, TeamPrompt
+from .search import get_search_backend
+from .serializers import BulkPromptItemSerializer, build_prompt_snapshot, diff_relation
+
+MODES = ('atomic', 'best_effort')
+MAX_ITEMS = 500
+PROMPT_FIELDS = ['name', 'description', 'prompt', 'model', 'visibility', 'folder']
+RELATIONS = {'category_ids': 'categories', 'team_ids': 'teams'}
+
+
+def refresh_prompts(prompt_ids, organization_ids):
+    """Bring derived state in line after prompts were written without signals."""
+    prompt_ids = list(prompt_ids)
+    if prompt_ids:
+        backend = get_search_backend()
+        if backend is not None:
+            backend.index_prompts(prompt_ids)
+        prompt_access.sync(prompt_ids)
+    response_cache.invalidate(['prompts', 'workflows'], organization_ids)
+
+
+class BulkPromptWriter:
+    def __init__(self, user, membership, mode='atomic'):
+        self.user = user
+        self.membership = membership
+        self.mode = mode
+
+    def run(self, items):
+        """
+        Validate and apply ``items``. Returns (results, written) where
+        ``results`` has one entry per item, in request order.
+        """
+        self.results = [{'index': index} for index in range(len(items))]
+        valid = self.validate_shapes(items)
+        valid = self.validate_references(valid)
+
+        failed = len(items) - len(valid)
+        if failed and self.mode == 'atomic':
+            for result in self.results:
+                result.setdefault('status', 'skipped')
+            return self.results, False
+
+        if valid:
+            with transaction.atomic():
+                self.apply(valid)
+        return self.results, True
+
+    def fail(self, index, errors):
+        self.results[index].update(status='error', errors=errors)
+
+    def validate_shapes(self, items):
+        valid = []
+        seen_ids = set()
+        for index, item in enumerate(items):
+            serializer = BulkPromptItemSerializer(data=item)
+            if not serializer.is_valid():
+                self.fail(index, serializer.errors)
+                continue
+            data = serializer.validated_data
+            self.results[index]['op'] = data['op']
+            if 'id' in data:
+                if data['id'] in seen_ids:
+                    self.fail(index, {'id': ['Prompt appears more than once in this request.']})
+                    continue
+                seen_ids.add(data['id'])
+            valid.append((index, data))
+        return valid
+
+    def validate_references(self, valid):
+        prompt_ids = {data['id'] for _, data in valid if 'id' in data}
+        folder_ids = {data['folder'] for _, data in valid if data.get('folder')}
+        category_ids = {cid for _, data in valid for cid in data.get('category_ids', ())}
+        team_ids = {tid for _, data in valid for tid in data.get('team_ids', ())}
+
+        # One query per referenced table, each mapping ID -> organization
+        visible = prompt_access.visible(
+            Prompt.objects.filter(id__in=prompt_ids, organization_id__in=self.membership.org_ids),
+            self.membership.principal_ids,
+        ).prefetch_related(
+            Prefetch('prompt_categories', queryset=PromptCategory.objects.only('id', 'prompt_id', 'category_id')),
+            Prefetch('shared_teams', queryset=TeamPrompt.objects.only('id', 'prompt_id', 'team_id')),
+        ) if prompt_ids else []
+        self.prompts = {prompt.id: prompt for prompt in visible}
+        folders = dict(Folder.objects.filter(id__in=folder_ids).values_list('id', 'organization_id'))
+        categories = dict(Category.objects.filter(id__in=category_ids).values_list('id', 'organization_id'))
+        teams = dict(Team.objects.filter(id__in=team_ids).values_list('id', 'organization_id'))
+
+        checked = []
+        for index, data in valid:
+            if data['op'] == 'create':
+                org_id = data['organization']
+                if not self.membership.is_member(org_id):
+                    self.fail(index, {'organization': ['You are not a member of this organization.']})
+                    continue
+            else:
+                prompt = self.prompts.get(data['id'])
+                if prompt is None:
+                    self.fail(index, {'id': ['Prompt not found.']})
+                    continue
+                org_id = prompt.organization_id
+
+            errors = {}
+            if data.get('folder') and folders.get(data['folder']) != org_id:
+                errors['folder'] = ['Folder not found in this organization.']
+            bad_categories = [str(cid) for cid in data.get('category_ids', ()) if categories.get(cid) != org_id]
+            if bad_categories:
+                errors['category_ids'] = [f'Unknown categories: {", ".join(bad_categories)}']
+            bad_teams = [str(tid) for tid in data.get('team_ids', ()) if teams.get(tid) != org_id]
+            if bad_teams:
+                errors['team_ids'] = [f'Unknown teams: {", ".join(bad_teams)}']
+            if errors:
+                self.fail(index, errors)
+                continue
+            checked.append((index, data, org_id))
+        return checked
+
+    def apply(self, valid):
+        creates = [(index, data) for index, data, _ in valid if data['op'] == 'create']
+        updates = [(index, data) for index, data, _ in valid if data['op'] == 'update']
+        deletes = [(index, data) for index, data, _ in valid if data['op'] == 'delete']
+        org_ids = {org_id for _, _, org_id in valid}
+
+        written = self.apply_creates(creates) + self.apply_updates(updates)
+        self.apply_deletes(deletes)
+        refresh_prompts(written, org_ids)
+
+    def apply_creates(self, creates):
+        prompts, categories, teams = [], [], []
+        for index, data in creates:
+            prompt = Prompt(
+                organization_id=data['organization'],
+                created_by=self.user,
+                folder_id=data.get('folder'),
+                **{name: data[name] for name in PROMPT_FIELDS if name in data and name != 'folder'},
+            )
+            prompts.append(prompt)
+            # Repeated IDs would insert duplicate junction rows; the update path dedupes through diff_relation
+            categories.extend(PromptCategory(prompt=prompt, category_id=cid) for cid in dict.fromkeys(data.get('category_ids', ())))
+            teams.extend(TeamPrompt(prompt=prompt, team_id=tid) for tid in dict.fromkeys(data.get('team_ids', ())))
+            self.results[index].update(status='created', id=str(prompt.id))
+
+        Prompt.objects.bulk_create(prompts)
+        PromptCategory.objects.bulk_create(categories)
+        TeamPrompt.objects.bulk_create(teams)
+        return [prompt.id for prompt in prompts]
+
+    def apply_updates(self, updates):
+        now = timezone.now()
+        changed_prompts, history = [], []
+        changed_columns = set()
+        stale_categories, stale_teams = [], []
+        new_categories, new_teams = [], []
+
+        for index, data in updates:
+            prompt = self.prompts[data['id']]
+            self.results[index].update(status='updated', id=str(prompt.id))
+            snapshot = build_prompt_snapshot(prompt)
+            changed = []
+
+            for name in PROMPT_FIELDS:
+                if name not in data:
+                    continue
+                attr = 'folder_id' if name == 'folder' else name
+                if getattr(prompt, attr) != data[name]:
+                    setattr(prompt, attr, data[name])
+                    changed.append(name)
+            changed_columns.update(changed)
+
+            # Junction rows are diffed against the prefetched ones
+            if 'category_ids' in data:
+                stale, added = diff_relation(prompt.prompt_categories.all(), 'category_id', data['category_ids'])
+                if stale or added:
+                    changed.append('categories')
+                    stale_categories.extend(stale)
+                    new_categories.extend(PromptCategory(prompt=prompt, category_id=cid) for cid in added)
+            if 'team_ids' in data:
+                stale, added = diff_relation(prompt.shared_teams.all(), 'team_id', data['team_ids'])
+                if stale or added:
+                    changed.append('teams')
+                    stale_teams.extend(stale)
+                    new_teams.extend(TeamPrompt(prompt=prompt, team_id=tid) for tid in added)
+
+            if changed:
+                prompt.updated_at = now
+                changed_prompts.append(prompt)
+                history.append((prompt.id, snapshot, {
+                    'changed_by': self.user,
+                    'change_summary': 'Updated ' + ', '.join(changed),
+                }))
+
+        if changed_prompts:
+            Prompt.objects.bulk_update(changed_prompts, [*sorted(changed_columns), 'updated_at'])
+        if stale_categories:
+            delete_rows(PromptCategory, stale_categories)
+        if stale_teams:
+            delete_rows(TeamPrompt, stale_teams)
+        PromptCategory.objects.bulk_create(new_categories)
+        TeamPrompt.objects.bulk_create(new_teams)
+        history_outbox.enqueue(prompt_history, history)
+        return [prompt.id for prompt in changed_prompts]
+
+    def apply_deletes(self, deletes):
+        for index, data in deletes:
+            self.results[index].update(status='deleted', id=str(data['id']))
+        if deletes:
+            Prompt.objects.filter(id__in=[data['id'] for _, data in deletes]).delete()
+
+
+class BulkPromptReverter:
+    def __init__(self, user, membership):
+        self.user = user
+        self.membership = membership
+
+    def scope(self, as_of, organization_id=None, folder_id=None, prompt_ids=None):
+        """
+        Visible prompts matching every given filter, annotated with their
+        target version. A folder scope also covers prompts that were in the
+        folder at ``as_of`` and have been moved out since.
+        """
+        queryset = prompt_access.visible(
+            Prompt.objects.filter(organization_id__in=self.membership.org_ids),
+            self.membership.principal_ids,
+        ).annotate(as_of_history_id=next_change(prompt_history, as_of))
+        if organization_id:
+            queryset = queryset.filter(organization_id=organization_id)
+        if prompt_ids is not None:
+            queryset = queryset.filter(id__in=prompt_ids)
+        if folder_id:
+            queryset = filter_as_of(prompt_history, queryset, 'folder_id', folder_id, folder_id=folder_id) | queryset.filter(folder_id=folder_id)
+        return queryset
+
+    def run(self, scope, as_of, dry_run=False):
+        """
+        Revert every prompt in ``scope`` to its state at ``as_of``. Returns
+        (counts, results); ``results`` lists the prompts that were (or, in a
+        dry run, would be) reverted and the ones that did not exist yet.
+        """
+        self.as_of = as_of
+        rows = list(scope.order_by('name', 'id').values_list('id', 'name', 'created_at', 'as_of_history_id'))
+        if history_outbox.flush(prompt_history, [row[0] for row in rows]):
+            # Queued changes of these prompts were just written; their target versions may have moved
+            rows = list(scope.order_by('name', 'id').values_list('id', 'name', 'created_at', 'as_of_history_id'))
+        counts = {'reverted': 0, 'unchanged': 0, 'skipped': 0}
+        results = []
+        targets = []
+        for prompt_id, name, created_at, history_id in rows:
+            if created_at > as_of:
+                counts['skipped'] += 1
+                results.append({'id': str(prompt_id), 'name': name, 'status': 'skipped', 'reason': 'Created after as_of.'})
+            elif history_id is None:
+                counts['unchanged'] += 1
+            else:
+                targets.append((prompt_id, history_id))
+
+        with transaction.atomic():
+            written, org_ids = [], set()
+            for start in range(0, len(targets), BATCH_SIZE):
+                batch = self.revert_batch(targets[start:start + BATCH_SIZE], dry_run)
+                for prompt, result in batch:
+                    if result['changes']:
+                        counts['reverted'] += 1
+                        results.append(result)
+                        written.append(prompt.id)
+                        org_ids.add(prompt.organization_id)
+                    else:
+                        counts['unchanged'] += 1
+            if written and not dry_run:
+                refresh_prompts(written, org_ids)
+        return counts, results
+
+    def revert_batch(self, targets, dry_run):
+        snapshots = resolve_snapshots(prompt_history, [history_id for _, history_id in targets])
+        prompts = Prompt.objects.filter(id__in=[prompt_id for prompt_id, _ in targets]).prefetch_related(
+            Prefetch('prompt_categories', queryset=PromptCategory.objects.only('id', 'prompt_id', 'category_id')),
+            Prefetch('shared_teams', queryset=TeamPrompt.objects.only('id', 'prompt_id', 'team_id')),
+        ).in_bulk()
+        pairs = [(prompts[prompt_id], snapshots[history_id]) for prompt_id, history_id in targets if prompt_id in prompts]
+        existing = self.existing_references([snapshot for _, snapshot in pairs])
+
+        now = timezone.now()
+        changed_prompts, history, batch = [], [], []
+        changed_columns = set()
+        stale_categories, stale_teams = [], []
+        new_categories, new_teams = [], []
+        summary = f'Reverted to state as of {self.as_of:%Y-%m-%d %H:%M}'
+
+        for prompt, target in pairs:
+            current = build_prompt_snapshot(prompt)
+            result = {'id': str(prompt.id), 'name': prompt.name, 'status': 'reverted', 'changes': []}
+            batch.append((prompt, result))
+            target = self.drop_missing(prompt, target, existing, result)
+
+            for name in PROMPT_FIELDS:
+                if name in target and target[name] != current[name]:
+                    result['changes'].append(name)
+                    if name == 'folder':
+                        prompt.folder_id = target[name]
+                    else:
+                        setattr(prompt, name, target[name])
+            changed_columns.update(result['changes'])
+
+            if 'category_ids' in target:
+                stale, added = diff_relation(prompt.prompt_categories.all(), 'category_id', target['category_ids'])
+                if stale or added:
+                    result['changes'].append('categories')
+                    stale_categories.extend(stale)
+                    new_categories.extend(PromptCategory(prompt=prompt, category_id=cid) for cid in added)
+            if 'team_ids' in target:
+                stale, added = diff_relation(prompt.shared_teams.all(), 'team_id', target['team_ids'])
+                if stale or added:
+                    result['changes'].append('teams')
+                    stale_teams.extend(stale)
+                    new_teams.extend(TeamPrompt(prompt=prompt, team_id=tid) for tid in added)
+
+            if result['changes']:
+                prompt.updated_at = now
+                changed_prompts.append(prompt)
+                history.append((prompt.id, current, {'changed_by': self.user, 'change_summary': summary}))
+
+        if dry_run:
+            return batch
+        if changed_prompts:
+            Prompt.objects.bulk_update(changed_prompts, [*sorted(changed_columns), 'updated_at'])
+        if stale_categories:
+            delete_rows(PromptCategory, stale_categories)
+        if stale_teams:
+            delete_rows(TeamPrompt, stale_teams)
+        PromptCategory.objects.bulk_create(new_categories)
+        TeamPrompt.objects.bulk_create(new_teams)
+        history_outbox.enqueue(prompt_history, history)
+        return batch
+
+    def existing_references(self, snapshots):
+        """Map each folder/category/team ID the snapshots mention to its organization, if it still exists."""
+        folder_ids = {snapshot['folder'] for snapshot in snapshots if snapshot.get('folder')}
+        category_ids = {cid for snapshot in snapshots for cid in snapshot.get('category_ids', ())}
+        team_ids = {tid for snapshot in snapshots for tid in snapshot.get('team_ids', ())}
+        return {
+            'folder': dict(Folder.objects.filter(id__in=folder_ids).values_list('id', 'organization_id')),
+            'category_ids': dict(Category.objects.filter(id__in=category_ids).values_list('id', 'organization_id')),
+            'team_ids': dict(Team.objects.filter(id__in=team_ids).values_list('id', 'organization_id')),
+        }
+
+    def drop_missing(self, prompt, target, existing, result):
+        """Leave out references deleted since ``as_of``, noting them in ``result``."""
+        def exists(key, value):
+            return existing[key].get(as_uuid(value)) == prompt.organization_id
+
+        target = dict(target)
+        if target.get('folder') and not exists('folder', target['folder']):
+            result.setdefault('missing', {})['folder'] = [target['folder']]
+            target['folder'] = None
+        for key in RELATIONS:
+            if key not in target:
+                continue
+            missing = [value for value in target[key] if not exists(key, value)]
+            if missing:
+                result.setdefault('missing', {})[key] = missing
+                target[key] = [as_uuid(value) for value in target[key] if value not in missing]
+            else:
+                target[key] = [as_uuid(value) for value in target[key]]
+        return target
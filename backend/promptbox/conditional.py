@@ -0,0 +1,158 @@
+"""
+Conditional request support (ETag / Last-Modified) for list and detail views.
+
+Validators are derived from the rows a response is built from (and the rows
+prefetched alongside them), so they cost no extra queries. Lists carry only
+an ETag: the newest ``updated_at`` on a page does not change when a row is
+deleted or leaves the page, so a list Last-Modified could answer a stale 304. ``If-None-Match``
+/ ``If-Modified-Since`` answer 304 before serialization runs, and
+``If-Match`` guards updates: the precondition is checked on the locked row,
+in the transaction that writes it.
+"""
+import hashlib
+from urllib.parse import urlencode
+
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .as_of import AS_OF_PARAM
+from .membership import get_membership
+from .serializers import lock_for_update
+
+
+class ConditionalGetMixin:
+    """
+    Adds strong ETags to ``list`` and ``retrieve``, a Last-Modified header to
+    ``retrieve``, and ``If-Match`` support to ``update`` / ``partial_update``.
+
+    The ETag covers every row's ``updated_at``, the related rows loaded with
+    it (``version_related_fields`` maps a prefetched relation to the attribute
+    whose ``updated_at`` matters, ``version_forward_fields`` lists
+    select_related foreign keys), the pagination state and the caller's
+    access fingerprint. List ETags also cover the query parameters; a
+    detail read covers only ``representation_params``, and ``If-Match`` on
+    an update none, so unrelated parameters (cache busters, tracking) on the
+    read do not make a later update fail. Writes that
+    change a prompt's or workflow's relations bump its ``updated_at``, so
+    adding or removing a category or team is covered too.
+    """
+    version_related_fields = {}
+    version_forward_fields = ()
+    representation_params = (AS_OF_PARAM, 'view', 'fields', 'exclude')
+
+    def row_timestamps(self, obj):
+        timestamps = [obj.updated_at]
+        prefetched = getattr(obj, '_prefetched_objects_cache', {})
+        for relation, attr in self.version_related_fields.items():
+            for related in prefetched.get(relation, ()):
+                target = getattr(related, attr) if attr else related
+                if target is not None:
+                    timestamps.append(target.updated_at)
+        for name in self.version_forward_fields:
+            field = obj._meta.get_field(name)
+            if field.is_cached(obj) and getattr(obj, name) is not None:
+                timestamps.append(getattr(obj, name).updated_at)
+        return timestamps
+
+    def get_validators(self, rows, state=()):
+        """Return (etag, last_modified) for a response built from ``rows`` (no last_modified for lists)."""
+        # Detail ETags do not depend on the action so If-Match works on updates
+        kind = 'list' if self.action == 'list' else 'detail'
+        params = sorted(self.request.query_params.lists())
+        if kind == 'detail':
+            keep = self.representation_params if self.action == 'retrieve' else ()
+            params = [(name, values) for name, values in params if name in keep]
+        params = urlencode(params, doseq=True)
+        parts = [
+            self.basename,
+            kind,
+            params,
+            get_membership(self.request.user, self.request).fingerprint,
+            *state,
+        ]
+        last_modified = None
+        for obj in rows:
+            timestamps = self.row_timestamps(obj)
+            parts.append(str(obj.pk))
+            parts.extend(ts.isoformat() for ts in timestamps)
+            latest = max(timestamps)
+            if last_modified is None or latest > last_modified:
+                last_modified = latest
+
+        etag = hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+        return quote_etag(etag), last_modified if kind == 'detail' else None
+
+    def evaluate_preconditions(self, etag, last_modified):
+        """Return a 304/412 response when the request's preconditions say so, else None."""
+        response = get_conditional_response(
+            self.request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if response is not None:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    @staticmethod
+    def set_validators(response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        # Clients may reuse the response but must revalidate it first
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else list(queryset)
+        state = self.paginator.get_page_state() if page is not None else ()
+
+        etag, last_modified = self.get_validators(rows, state)
+        early = self.evaluate_preconditions(etag, last_modified)
+        if early is not None:
+            return early
+
+        serializer = self.get_serializer(rows, many=True)
+        if page is not None:
+            response = self.get_paginated_response(serializer.data)
+        else:
+            response = Response(serializer.data)
+        return self.set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.get_validators([instance])
+        early = self.evaluate_preconditions(etag, last_modified)
+        if early is not None:
+            return early
+
+        serializer = self.get_serializer(instance)
+        return self.set_validators(Response(serializer.data), etag, last_modified)
+
+    def update(self, request, *args, **kwargs):
+        if 'HTTP_IF_MATCH' not in request.META and 'HTTP_IF_UNMODIFIED_SINCE' not in request.META:
+            return super().update(request, *args, **kwargs)
+
+        partial = kwargs.pop('partial', False)
+        with transaction.atomic():
+            # The row stays locked from the precondition check to the write,
+            # so two clients holding the same ETag cannot both update
+            instance = self.get_object()
+            if lock_for_update(instance):
+                # Changed since it was loaded: load it again with its relations
+                instance = self.get_object()
+            etag, last_modified = self.get_validators([instance])
+            early = self.evaluate_preconditions(etag, last_modified)
+            if early is not None:
+                return early
+
+            serializer = self.get_serializer(instance, data=request.data, partial=partial)
+            serializer.is_valid(raise_exception=True)
+            self.perform_update(serializer)
+
+        if getattr(instance, '_prefetched_objects_cache', None):
+            instance._prefetched_objects_cache = {}
+        return Response(serializer.data)
@@ -0,0 +1,53 @@
+"""
+Set-based deletes that skip per-row model signals.
+
+``QuerySet.delete()`` sends post_delete once per row, and the receivers in
+promptbox.signals reindex, resync access and evict caches for each of them.
+Callers deleting many rows use these helpers and refresh that derived state
+once for the whole write (see ``promptbox.bulk.refresh_prompts``).
+"""
+from django.db import connection, models
+
+BATCH_SIZE = 500
+
+
+def delete_rows(model, ids):
+    """
+    Delete ``model`` rows by primary key, one ``DELETE ... WHERE pk IN``
+    per batch. Rows pointing at the deleted ones are left alone: use
+    ``delete_objects`` unless there are none.
+    """
+    ids = list(ids)
+    pk = model._meta.pk
+    table, column = connection.ops.quote_name(model._meta.db_table), connection.ops.quote_name(pk.column)
+    deleted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = [pk.get_db_prep_value(value, connection) for value in ids[start:start + BATCH_SIZE]]
+            cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({", ".join(["%s"] * len(batch))})', batch)
+            deleted += cursor.rowcount
+    return deleted
+
+
+def delete_objects(model, ids):
+    """
+    Delete ``model`` rows and apply their relations' ``on_delete`` the way
+    the collector would (CASCADE recursively, SET_NULL), with a statement
+    per table instead of per-row signals. Returns the ``model`` rows deleted.
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    for relation in model._meta.related_objects:
+        field = relation.field
+        rows = relation.related_model._base_manager.filter(**{f'{field.name}__in': ids})
+        if relation.related_model is model:
+            # e.g. subfolders deleted along with their parents in this call
+            rows = rows.exclude(pk__in=ids)
+        if relation.on_delete is models.CASCADE:
+            delete_objects(relation.related_model, rows.values_list('pk', flat=True))
+        elif relation.on_delete is models.SET_NULL:
+            rows.update(**{field.name: None})
+        elif relation.on_delete is not models.DO_NOTHING:
+            raise ValueError(f'Cannot bulk delete {model.__name__} rows referenced by {relation.related_model.__name__}.')
+    return delete_rows(model, ids)
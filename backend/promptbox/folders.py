@@ -0,0 +1,317 @@
+"""
+Materialized paths for the folder tree.
+
+Every folder stores ``path``, the hex IDs of its ancestors and itself, each
+followed by '/', and its ``depth`` (0 for roots). The folders under X are
+then the rows whose path starts with X's path: one range scan on the path
+index (see ``subtree``), without walking ``parent`` level by level.
+
+Paths are kept up to date by the Folder signals: a saved folder gets its
+path from its parent, and a move rewrites the paths of the whole subtree in
+one UPDATE. Deleting a folder cascades to its subtree, so no path outlives
+its folder. ``rebuild_folder_paths`` recomputes every path from ``parent``.
+
+``FolderSubtree`` moves, copies and purges whole subtrees. It works from
+the paths with set-based statements over bounded batches of IDs, so a
+subtree's prompts are never loaded all at once; a ``progress`` callback
+receives (stage, done, total) after every batch.
+"""
+import uuid
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
+
+from . import response_cache
+from .access import prompt_access
+from .bulk import delete_objects, refresh_prompts
+from .models import Folder, Prompt, PromptCategory, TeamPrompt
+from .search import get_search_backend
+
+SEPARATOR = '/'
+BATCH_SIZE = 1000
+# Copied as they are; IDs, timestamps, folder and owner are set per copy
+PROMPT_COPY_FIELDS = ['organization_id', 'name', 'description', 'prompt', 'model', 'visibility', 'created_by_id', 'folder_id']
+
+
+class SubtreeError(ValueError):
+    pass
+
+
+def child_path(parent_path, folder_id):
+    return f'{parent_path or ""}{folder_id.hex}{SEPARATOR}'
+
+
+def path_depth(path):
+    return path.count(SEPARATOR) - 1
+
+
+def subtree(path, prefix='', include_self=True):
+    """
+    Lookups for the folders at and below ``path`` (``prefix`` reaches them
+    through a relation, e.g. ``'folder__'``). A range rather than LIKE, so
+    it is a plain index range scan: paths are hex and '/', and '0' is the
+    character after '/' in byte order. That order is SQLite's default
+    (BINARY) collation; on PostgreSQL the column is declared COLLATE "C"
+    (migration 0018), since linguistic collations ignore '/'.
+    """
+    low = 'gte' if include_self else 'gt'
+    return {f'{prefix}path__{low}': path, f'{prefix}path__lt': path[:-1] + '0'}
+
+
+def assign_path(folder):
+    """
+    Set ``path`` and ``depth`` on ``folder`` before it is saved, from its
+    parent's stored path. Returns the folder's previous stored path, if any.
+    """
+    ids = [folder.pk] + ([folder.parent_id] if folder.parent_id else [])
+    stored = dict(Folder.objects.filter(pk__in=ids).values_list('id', 'path'))
+    folder.path = child_path(stored.get(folder.parent_id), folder.pk)
+    folder.depth = path_depth(folder.path)
+    return stored.get(folder.pk)
+
+
+def move_subtree(old_path, new_path):
+    """Re-root every folder below ``old_path`` under ``new_path``, in one statement."""
+    if not old_path or old_path == new_path:
+        return 0
+    return Folder.objects.filter(**subtree(old_path, include_self=False)).update(
+        path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+        depth=F('depth') + (path_depth(new_path) - path_depth(old_path)),
+    )
+
+
+def build_paths(rows):
+    """
+    Compute {id: path} from (id, parent ID) pairs. Folders in a parent cycle
+    (which no path can describe) are made roots.
+    """
+    children = {}
+    for folder_id, parent_id in rows:
+        children.setdefault(parent_id, []).append(folder_id)
+    known = {folder_id for folder_id, _ in rows}
+    paths = {}
+    pending = [(None, folder_id) for parent_id, ids in children.items() if parent_id not in known for folder_id in ids]
+    while True:
+        while pending:
+            parent_path, folder_id = pending.pop()
+            if folder_id in paths:
+                continue
+            paths[folder_id] = child_path(parent_path, folder_id)
+            pending.extend((paths[folder_id], child) for child in children.get(folder_id, ()))
+        stranded = sorted(known - set(paths), key=str)
+        if not stranded:
+            return paths
+        pending.append((None, stranded[0]))
+
+
+def rebuild_paths(organization_ids=None, dry_run=False):
+    """Recompute every folder's path and depth from ``parent``. Returns the number of folders fixed."""
+    folders = Folder.objects.all()
+    if organization_ids is not None:
+        folders = folders.filter(organization_id__in=organization_ids)
+    rows = list(folders.values_list('id', 'parent_id', 'path', 'depth'))
+    paths = build_paths([(folder_id, parent_id) for folder_id, parent_id, _, _ in rows])
+
+    stale = [
+        Folder(id=folder_id, path=paths[folder_id], depth=path_depth(paths[folder_id]))
+        for folder_id, _, path, depth in rows
+        if (path, depth) != (paths[folder_id], path_depth(paths[folder_id]))
+    ]
+    if not dry_run:
+        Folder.objects.bulk_update(stale, ['path', 'depth'], batch_size=BATCH_SIZE)
+    return len(stale)
+
+
+def delete_prompts(prompt_ids):
+    """
+    Delete prompts and their dependent rows in a statement per table (see
+    promptbox.bulk.delete_objects). Callers refresh the list response cache.
+    """
+    prompt_ids = list(prompt_ids)
+    backend = get_search_backend()
+    if backend is not None:
+        backend.remove_prompts(prompt_ids)
+    return delete_objects(Prompt, prompt_ids)
+
+
+class FolderSubtree:
+    def __init__(self, folder, user=None, principal_ids=None, batch_size=BATCH_SIZE, progress=None):
+        """
+        ``principal_ids`` (see promptbox.membership) limits the prompts that
+        are copied or deleted to those the caller can see; ``None`` means
+        all of them. Copies are owned by ``user`` when one is given.
+        """
+        self.folder = folder
+        self.user = user
+        self.principal_ids = principal_ids
+        self.batch_size = batch_size
+        self.progress = progress or (lambda stage, done, total: None)
+        self.copy_root = None
+
+    def folders(self):
+        return Folder.objects.filter(**subtree(self.folder.path))
+
+    def prompts(self, visible_only=False):
+        prompts = Prompt.objects.filter(**subtree(self.folder.path, 'folder__'))
+        if visible_only and self.principal_ids is not None:
+            prompts = prompt_access.visible(prompts, self.principal_ids)
+        return prompts
+
+    def check_parent(self, parent):
+        if parent is None:
+            return
+        if parent.organization_id != self.folder.organization_id:
+            raise SubtreeError('The target folder belongs to another organization.')
+        # A target inside the subtree would make the subtree contain its own copy or be its own ancestor
+        if parent.path.startswith(self.folder.path):
+            raise SubtreeError('The target folder is the folder itself or one of its subfolders.')
+
+    def move(self, parent):
+        """Re-parent the folder; the Folder signals move the subtree in one UPDATE. Returns the folders moved."""
+        self.check_parent(parent)
+        with transaction.atomic():
+            self.folder.parent = parent
+            self.folder.save()
+        moved = self.folders().count()
+        self.progress('folders', moved, moved)
+        return moved
+
+    def copy(self, parent, name=None, resume=None):
+        """
+        Deep-copy the subtree under ``parent``: folders first, in one
+        transaction (in path order, so parents precede children), then
+        prompts in batches with their category and team rows, each batch its
+        own transaction, as in ``purge``. Returns (new root, folders copied,
+        prompts copied).
+
+        Copies get IDs derived from the new root's ID and the original's, and
+        prompt batches go in ID order, so committed batches are a prefix of
+        the originals. ``resume`` is the root of an interrupted copy
+        (``copy_root`` once the folders are in): the copy continues from
+        the first prompt whose copy is missing, and fills in folders added
+        since.
+        """
+        if resume is not None:
+            if resume.pk == self.folder.pk:
+                raise SubtreeError('A folder cannot be resumed as its own copy.')
+            parent = resume.parent
+        self.check_parent(parent)
+        root_id = resume.pk if resume is not None else uuid.uuid4()
+        # Root maps to the copy's root; every other ID to one derived from it
+        new_ids = {self.folder.pk: root_id}
+
+        def copy_id(source_id):
+            return new_ids.get(source_id) or uuid.uuid5(root_id, str(source_id))
+
+        with transaction.atomic():
+            folders = list(self.folders().order_by('path').values(
+                'id', 'parent_id', 'organization_id', 'name', 'description', 'is_archived', 'team_id', 'user_id', 'type',
+            ))
+            for row in folders:
+                new_ids[row['id']] = copy_id(row['id'])
+            existing = set(Folder.objects.filter(id__in=new_ids.values()).values_list('id', flat=True))
+            new_paths = {root_id: resume.path} if resume is not None else {}
+            pending, folder_count = [], 0
+            for row in folders:
+                new_id = new_ids[row['id']]
+                if row['id'] == self.folder.pk:
+                    parent_id, parent_path = (parent.pk, parent.path) if parent is not None else (None, '')
+                else:
+                    parent_id = new_ids[row['parent_id']]
+                    parent_path = new_paths[parent_id]
+                new_paths.setdefault(new_id, child_path(parent_path, new_id))
+                if new_id in existing:
+                    continue
+                pending.append(Folder(
+                    id=new_id, organization_id=row['organization_id'], parent_id=parent_id,
+                    name=name if name and row['id'] == self.folder.pk else row['name'],
+                    description=row['description'], is_archived=row['is_archived'], team_id=row['team_id'],
+                    user_id=self.user.pk if self.user is not None else row['user_id'], type=row['type'],
+                    path=new_paths[new_id], depth=path_depth(new_paths[new_id]),
+                ))
+                if len(pending) >= self.batch_size:
+                    folder_count += len(Folder.objects.bulk_create(pending))
+                    pending = []
+                    self.progress('folders', folder_count, len(folders))
+            folder_count += len(Folder.objects.bulk_create(pending))
+            response_cache.invalidate(['folders'], [self.folder.organization_id])
+        self.copy_root = Folder.objects.get(pk=root_id)
+        self.progress('folders', folder_count, len(folders))
+
+        prompts = self.prompts(visible_only=True).order_by('id')
+        prompt_total, done, prompt_count, last_id = prompts.count(), 0, 0, None
+        while True:
+            batch = prompts if last_id is None else prompts.filter(id__gt=last_id)
+            ids = list(batch.values_list('id', flat=True)[:self.batch_size])
+            if not ids:
+                break
+            last_id, done = ids[-1], done + len(ids)
+            if resume is not None:
+                copied = set(Prompt.objects.filter(id__in=[copy_id(pk) for pk in ids]).values_list('id', flat=True))
+                ids = [pk for pk in ids if copy_id(pk) not in copied]
+            if ids:
+                with transaction.atomic():
+                    rows = list(Prompt.objects.filter(id__in=ids).values('id', *PROMPT_COPY_FIELDS))
+                    prompt_count += self.copy_prompts(rows, copy_id)
+                    response_cache.invalidate(['prompts'], [self.folder.organization_id])
+            self.progress('prompts', done, prompt_total)
+
+        return self.copy_root, folder_count, prompt_count
+
+    def copy_prompts(self, rows, copy_id):
+        copies = {}
+        for row in rows:
+            fields = {name: row[name] for name in PROMPT_COPY_FIELDS}
+            fields['folder_id'] = copy_id(row['folder_id'])
+            if self.user is not None:
+                fields['created_by_id'] = self.user.pk
+            copies[row['id']] = Prompt(id=copy_id(row['id']), **fields)
+        Prompt.objects.bulk_create(copies.values())
+
+        for model, field in ((PromptCategory, 'category_id'), (TeamPrompt, 'team_id')):
+            links = model.objects.filter(prompt_id__in=list(copies)).values_list('prompt_id', field)
+            model.objects.bulk_create(
+                [model(prompt_id=copies[prompt_id].pk, **{field: value}) for prompt_id, value in links],
+                batch_size=self.batch_size,
+            )
+        refresh_prompts([copy.pk for copy in copies.values()], [self.folder.organization_id])
+        return len(copies)
+
+    def purge(self, delete=False):
+        """
+        Remove the subtree. Its prompts are detached (moved to the root, as a
+        plain folder delete does) or, with ``delete``, deleted; prompts
+        the caller cannot see are always only detached. Folders then go
+        deepest first. Every batch is its own transaction, and invalidates the
+        list responses it affects when it commits, so an interrupted purge
+        leaves a consistent, smaller subtree and can simply be rerun.
+        Returns (folders removed, prompts deleted, prompts detached).
+        """
+        organization_id = self.folder.organization_id
+        prompt_total = self.prompts().count()
+        deleted = detached = 0
+        if delete:
+            deletable = self.prompts(visible_only=True).values_list('id', flat=True)
+            while batch := list(deletable[:self.batch_size]):
+                with transaction.atomic():
+                    deleted += delete_prompts(batch)
+                    response_cache.invalidate(['prompts', 'workflows'], [organization_id])
+                self.progress('prompts', deleted, prompt_total)
+
+        remaining = self.prompts().values_list('id', flat=True)
+        while batch := list(remaining[:self.batch_size]):
+            with transaction.atomic():
+                detached += Prompt.objects.filter(id__in=batch).update(folder=None, updated_at=timezone.now())
+                response_cache.invalidate(['prompts'], [organization_id])
+            self.progress('prompts', deleted + detached, prompt_total)
+
+        folder_total, removed = self.folders().count(), 0
+        folders = self.folders().order_by('-depth').values_list('id', flat=True)
+        while batch := list(folders[:self.batch_size]):
+            with transaction.atomic():
+                removed += delete_objects(Folder, batch)
+                response_cache.invalidate(['folders'], [organization_id])
+            self.progress('folders', removed, folder_total)
+        return removed, deleted, detached
@@ -0,0 +1,96 @@
+"""
+Team hierarchy as a closure table.
+
+Members of a team can see what is shared with any team below it. Rather
+than walking ``Team.parent`` on every request, TeamClosure holds one row per
+(ancestor, descendant) pair, so visibility checks (see promptbox.access)
+expand a user's teams to the teams below them with one indexed lookup.
+
+The rows of a team's subtree are recomputed whenever the team is saved
+(created, re-parented, activated or deactivated) and for the whole
+organization when a team is deleted, since its children become roots.
+An inactive team breaks the chain: it neither inherits nor passes on.
+"""
+from .models import Team, TeamClosure
+
+BATCH_SIZE = 500
+
+
+class TeamHierarchy:
+    def descendants(self, team_ids):
+        """Subquery of the teams at and below ``team_ids``."""
+        return TeamClosure.objects.filter(ancestor_id__in=team_ids).values('descendant_id')
+
+    def load(self, organization_id):
+        return {
+            team_id: (parent_id, is_active)
+            for team_id, parent_id, is_active in Team.objects.filter(
+                organization_id=organization_id
+            ).values_list('id', 'parent_id', 'is_active')
+        }
+
+    @staticmethod
+    def subtree(teams, team_id):
+        children = {}
+        for child_id, (parent_id, _) in teams.items():
+            children.setdefault(parent_id, []).append(child_id)
+        found, pending = set(), [team_id]
+        while pending:
+            current = pending.pop()
+            if current not in found:
+                found.add(current)
+                pending.extend(children.get(current, ()))
+        return found
+
+    @staticmethod
+    def expected_rows(teams, team_ids):
+        """Return the set of (ancestor, descendant, depth) rows ``team_ids`` should have."""
+        rows = set()
+        for team_id in team_ids:
+            current, depth, seen = team_id, 0, set()
+            # Up the parent chain while teams are active; ``seen`` stops parent cycles
+            while current in teams and current not in seen and teams[current][1]:
+                seen.add(current)
+                rows.add((current, team_id, depth))
+                current, depth = teams[current][0], depth + 1
+        return rows
+
+    def sync(self, organization_id, team_ids=None, dry_run=False):
+        """
+        Bring the closure rows of ``team_ids`` (as descendants; default:
+        every team of the organization) in line with the parent links.
+        Returns (added, removed) row counts.
+        """
+        teams = self.load(organization_id)
+        return self.apply(teams, set(teams) if team_ids is None else set(team_ids), dry_run)
+
+    def apply(self, teams, team_ids, dry_run=False):
+        expected = self.expected_rows(teams, team_ids)
+
+        existing = {}
+        rows = TeamClosure.objects.filter(descendant_id__in=team_ids).values_list('id', 'ancestor_id', 'descendant_id', 'depth')
+        for row_id, ancestor_id, descendant_id, depth in rows:
+            existing[(ancestor_id, descendant_id, depth)] = row_id
+
+        stale = [row_id for key, row_id in existing.items() if key not in expected]
+        missing = [key for key in expected if key not in existing]
+        if not dry_run:
+            if stale:
+                TeamClosure.objects.filter(id__in=stale).delete()
+            TeamClosure.objects.bulk_create([
+                TeamClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+                for ancestor_id, descendant_id, depth in missing
+            ], batch_size=BATCH_SIZE)
+        return len(missing), len(stale)
+
+    def sync_subtree(self, team):
+        """Recompute the rows of ``team`` and every team below it."""
+        teams = self.load(team.organization_id)
+        return self.apply(teams, self.subtree(teams, team.pk))
+
+    def would_cycle(self, team, parent):
+        """Whether making ``parent`` the parent of ``team`` would create a loop."""
+        return parent.pk in self.subtree(self.load(team.organization_id), team.pk)
+
+
+team_hierarchy = TeamHierarchy()
@@ -0,0 +1,431 @@
+"""
+Delta-compressed change history for prompts and workflows.
+
+History rows of one parent form a chain numbered by ``version``. Keyframes
+store the full ``snapshot``; every other row stores a ``delta`` that turns
+the previous version's snapshot into its own. A new keyframe is written
+once ``KEYFRAME_INTERVAL`` versions have passed since the last one, so
+reconstructing any version replays at most that many deltas, all loaded in
+a single query.
+
+Deltas are JSON objects with up to four keys:
+
+* ``set``    -> {field: new value}
+* ``edit``   -> {field: [[start, end, text], ...]} line-level replacements for
+  long text fields (``start``/``end`` index the previous value's lines)
+* ``splice`` -> {field: [[start, end, [item, ...]], ...]} the same for lists
+  (e.g. a workflow's steps), item by item
+* ``unset``  -> [field, ...]
+"""
+import difflib
+import json
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery, Sum, TextField
+from django.db.models.functions import Cast, Coalesce, Length
+from django.utils import timezone
+
+from .models import PromptHistory, WorkflowHistory
+
+KEYFRAME_INTERVAL = getattr(settings, 'PROMPTBOX_HISTORY_KEYFRAME_INTERVAL', 20)
+# Shorter strings are stored whole; a line diff would not be smaller
+TEXT_DIFF_MIN_LENGTH = 80
+BATCH_SIZE = 500
+# Fields diffed line by line by diff_snapshots; others are compared whole
+TEXT_FIELDS = ('prompt', 'description')
+WORD_DIFF_MAX_LINES = 20
+WORD_RE = re.compile(r'\s+|\w+|[^\w\s]')
+# Stored size of a row's payload, as the database serializes it
+PAYLOAD_SIZE = Coalesce(Length(Cast('snapshot', TextField())), Length(Cast('delta', TextField())), 0)
+
+
+def diff_text(old, new):
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    return [
+        [i1, i2, ''.join(new_lines[j1:j2])]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def patch_text(old, ops):
+    lines = old.splitlines(keepends=True)
+    # Back to front, so earlier line indices stay valid
+    for start, end, text in reversed(ops):
+        lines[start:end] = [text]
+    return ''.join(lines)
+
+
+def diff_list(old, new):
+    # Items are compared by their JSON form, so dicts and lists can be matched
+    matcher = difflib.SequenceMatcher(
+        None, [json.dumps(item, sort_keys=True) for item in old], [json.dumps(item, sort_keys=True) for item in new],
+        autojunk=False,
+    )
+    return [
+        [i1, i2, new[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def patch_list(old, ops):
+    items = list(old)
+    for start, end, new in reversed(ops):
+        items[start:end] = new
+    return items
+
+
+def make_delta(old, new):
+    """Return the delta that turns snapshot ``old`` into snapshot ``new``."""
+    delta = {}
+    for key, value in new.items():
+        if key in old and old[key] == value:
+            continue
+        before = old.get(key)
+        if isinstance(value, str) and isinstance(before, str) and len(value) >= TEXT_DIFF_MIN_LENGTH:
+            ops = diff_text(before, value)
+            if len(json.dumps(ops)) < len(json.dumps(value)):
+                delta.setdefault('edit', {})[key] = ops
+                continue
+        if isinstance(value, list) and isinstance(before, list) and before:
+            ops = diff_list(before, value)
+            if len(json.dumps(ops)) < len(json.dumps(value)):
+                delta.setdefault('splice', {})[key] = ops
+                continue
+        delta.setdefault('set', {})[key] = value
+    removed = [key for key in old if key not in new]
+    if removed:
+        delta['unset'] = removed
+    return delta
+
+
+def apply_delta(state, delta):
+    state = dict(state)
+    for key, ops in delta.get('edit', {}).items():
+        state[key] = patch_text(state[key], ops)
+    for key, ops in delta.get('splice', {}).items():
+        state[key] = patch_list(state[key], ops)
+    state.update(delta.get('set', {}))
+    for key in delta.get('unset', ()):
+        state.pop(key, None)
+    return state
+
+
+def diff_words(old, new):
+    """Word-level diff as [[tag, text], ...] with tag one of equal/delete/insert."""
+    old_words = WORD_RE.findall(old)
+    new_words = WORD_RE.findall(new)
+    matcher = difflib.SequenceMatcher(None, old_words, new_words, autojunk=False)
+    parts = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            parts.append(['equal', ''.join(old_words[i1:i2])])
+            continue
+        if i2 > i1:
+            parts.append(['delete', ''.join(old_words[i1:i2])])
+        if j2 > j1:
+            parts.append(['insert', ''.join(new_words[j1:j2])])
+    return parts
+
+
+def diff_lines(old, new):
+    """
+    Line-level hunks between two texts. Unchanged lines are left out; small
+    replaced blocks also carry a word-level diff.
+    """
+    old_lines = old.splitlines()
+    new_lines = new.splitlines()
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    hunks = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        hunk = {
+            'op': tag,
+            'old_start': i1 + 1,
+            'old_lines': old_lines[i1:i2],
+            'new_start': j1 + 1,
+            'new_lines': new_lines[j1:j2],
+        }
+        if tag == 'replace' and max(i2 - i1, j2 - j1) <= WORD_DIFF_MAX_LINES:
+            hunk['words'] = diff_words('\n'.join(old_lines[i1:i2]), '\n'.join(new_lines[j1:j2]))
+        hunks.append(hunk)
+    return hunks
+
+
+def diff_items(old, new):
+    """
+    Item-level changes between two lists (e.g. workflow steps), from the
+    same matching as the history deltas (``diff_list``): items replaced in
+    place are ``changed``, the rest of a changed run ``added`` / ``removed``.
+    Indexes are 0-based positions in the list they refer to.
+    """
+    added, removed, changed = [], [], []
+    shift = 0
+    for start, end, items in diff_list(old, new):
+        paired = min(end - start, len(items))
+        for offset in range(paired):
+            changed.append({'index': start + shift + offset, 'from': old[start + offset], 'to': items[offset]})
+        removed.extend({'index': index, 'item': old[index]} for index in range(start + paired, end))
+        added.extend(
+            {'index': start + shift + offset, 'item': items[offset]} for offset in range(paired, len(items))
+        )
+        shift += len(items) - (end - start)
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+
+def diff_snapshots(old, new):
+    """
+    Describe how snapshot ``old`` became ``new``: line/word hunks for long
+    text fields, added/removed members for ID lists, added/removed/changed
+    items for other lists (workflow steps) and from/to pairs for everything
+    else. Unchanged fields are left out.
+    """
+    changes = {}
+    for key in sorted(set(old) | set(new)):
+        before, after = old.get(key), new.get(key)
+        if before == after:
+            continue
+        if key in TEXT_FIELDS and isinstance(before or '', str) and isinstance(after or '', str):
+            changes[key] = {'type': 'text', 'hunks': diff_lines(before or '', after or '')}
+        elif key.endswith('_ids') and isinstance(before or [], list) and isinstance(after or [], list):
+            before, after = before or [], after or []
+            changes[key] = {
+                'type': 'set',
+                'added': [value for value in after if value not in before],
+                'removed': [value for value in before if value not in after],
+            }
+        elif isinstance(before or [], list) and isinstance(after or [], list):
+            changes[key] = {'type': 'list', **diff_items(before or [], after or [])}
+        else:
+            changes[key] = {'type': 'value', 'from': before, 'to': after}
+    return changes
+
+
+def rows_to_drop(rows, policy, now):
+    """
+    Decide which history rows ``policy`` removes. ``rows`` are (id, version,
+    created_at, payload size) tuples of one parent in version order. The
+    newest row is always kept: it is the head new versions are built on.
+    """
+    protected = {row[0] for row in rows[-(policy.keep_last or 1):]}
+
+    def bucket(created_at):
+        age = now - created_at
+        local = timezone.localtime(created_at)
+        if policy.weekly_after_days is not None and age > timedelta(days=policy.weekly_after_days):
+            return ('week', *local.isocalendar()[:2])
+        if policy.daily_after_days is not None and age > timedelta(days=policy.daily_after_days):
+            return ('day', local.date())
+        return None
+
+    # Thinning keeps the newest row of each day / week bucket
+    buckets = [bucket(created_at) for _, _, created_at, _ in rows]
+    drop = {
+        row[0] for index, row in enumerate(rows)
+        if buckets[index] is not None and index + 1 < len(rows) and buckets[index + 1] == buckets[index]
+    }
+
+    if policy.max_bytes is not None:
+        total = 0
+        for row_id, _, _, size in reversed(rows):
+            if row_id in drop:
+                continue
+            total += size
+            if total > policy.max_bytes:
+                drop.add(row_id)
+    return drop - protected
+
+
+class HistoryStore:
+    def __init__(self, model, field, columns=None):
+        self.model = model
+        self.field = field
+        # {history column: snapshot key} copied onto every row, so queries can filter on them
+        self.columns = columns or {}
+
+    def _heads(self, parent_ids):
+        """
+        Return {parent_id: (version, snapshot, keyframe version)} for the
+        newest history row of each parent, loading each chain from its last
+        keyframe in a single query.
+        """
+        last_keyframe = self.model.objects.filter(
+            **{self.field: OuterRef(self.field)}, is_keyframe=True
+        ).order_by('-version').values('version')[:1]
+        rows = self.model.objects.filter(
+            **{f'{self.field}_id__in': parent_ids}, version__gte=Subquery(last_keyframe)
+        ).order_by(f'{self.field}_id', 'version')
+
+        by_parent = {}
+        for row in rows:
+            by_parent.setdefault(getattr(row, f'{self.field}_id'), []).append(row)
+        heads = {}
+        for parent_id, chain in by_parent.items():
+            for row, state in self.replay(chain):
+                heads[parent_id] = (row.version, state, chain[0].version)
+        return heads
+
+    @staticmethod
+    def replay(rows):
+        """Walk rows of one parent in version order, yielding (row, snapshot)."""
+        state = None
+        for row in rows:
+            if row.is_keyframe:
+                state = row.snapshot
+            else:
+                state = apply_delta(state, row.delta)
+            yield row, state
+
+    def lock_parents(self, parent_ids):
+        """
+        Lock the parents' rows until the transaction ends, so concurrent
+        writers number their versions one after the other instead of both
+        taking the same next version.
+        """
+        parent_model = self.model._meta.get_field(self.field).related_model
+        list(parent_model._base_manager.select_for_update().filter(pk__in=parent_ids).order_by('pk').values_list('pk', flat=True))
+
+    def build(self, entries):
+        """
+        Build unsaved history rows for ``entries``, a list of (parent_id,
+        snapshot, extra fields). Entries of the same parent are chained in
+        list order. Loads every parent's current chain in one query. Call
+        it in a transaction: the parents stay locked until it ends.
+        """
+        parent_ids = {parent_id for parent_id, _, _ in entries}
+        self.lock_parents(parent_ids)
+        heads = self._heads(parent_ids)
+        built = []
+        for parent_id, snapshot, fields in entries:
+            version, state, keyframe = heads.get(parent_id, (0, None, 0))
+            row = self.model(**{f'{self.field}_id': parent_id}, version=version + 1, **fields)
+            for column, key in self.columns.items():
+                setattr(row, column, snapshot.get(key))
+            keyframe = self.lay_out(row, snapshot, state, keyframe)
+            heads[parent_id] = (row.version, snapshot, keyframe)
+            built.append(row)
+        return built
+
+    @staticmethod
+    def lay_out(row, state, previous, keyframe):
+        """
+        Store ``state`` on ``row`` as a keyframe, or as a delta against
+        ``previous`` (the state of the row before it in the chain). Returns
+        the version of the chain's newest keyframe.
+        """
+        if previous is None or row.version - keyframe >= KEYFRAME_INTERVAL:
+            row.is_keyframe, row.snapshot, row.delta = True, state, None
+            return row.version
+        row.is_keyframe, row.snapshot, row.delta = False, None, make_delta(previous, state)
+        return keyframe
+
+    def record(self, parent, snapshot, **fields):
+        """Append a history row for ``parent`` describing ``snapshot``."""
+        with transaction.atomic():
+            row = self.build([(parent.pk, snapshot, fields)])[0]
+            row.save()
+        return row
+
+    def record_many(self, entries):
+        with transaction.atomic():
+            return self.model.objects.bulk_create(self.build(entries))
+
+    def resolve(self, rows):
+        """
+        Fill in ``snapshot`` on delta rows, in place. Every parent's chain is
+        loaded from the keyframe preceding its oldest requested row, in one
+        query for the whole batch.
+        """
+        wanted = {}
+        for row in rows:
+            if not row.is_keyframe and row.snapshot is None:
+                wanted.setdefault(getattr(row, f'{self.field}_id'), []).append(row)
+        if not wanted:
+            return rows
+
+        condition = Q()
+        for parent_id, parent_rows in wanted.items():
+            low = min(row.version for row in parent_rows)
+            high = max(row.version for row in parent_rows)
+            keyframe = self.model.objects.filter(
+                **{f'{self.field}_id': parent_id}, is_keyframe=True, version__lte=low
+            ).order_by('-version').values('version')[:1]
+            condition |= Q(**{f'{self.field}_id': parent_id}, version__gte=Subquery(keyframe), version__lte=high)
+
+        chain = self.model.objects.filter(condition).only(
+            'id', f'{self.field}_id', 'version', 'is_keyframe', 'snapshot', 'delta'
+        ).order_by(f'{self.field}_id', 'version')
+
+        by_parent = {}
+        for row in chain:
+            by_parent.setdefault(getattr(row, f'{self.field}_id'), []).append(row)
+        for parent_id, parent_rows in wanted.items():
+            states = {row.version: state for row, state in self.replay(by_parent.get(parent_id, []))}
+            for row in parent_rows:
+                row.snapshot = states.get(row.version)
+        return rows
+
+    def snapshot(self, row):
+        self.resolve([row])
+        return row.snapshot
+
+    def prune(self, parent_id, policy, now=None, dry_run=False):
+        """
+        Apply a HistoryRetentionPolicy to one parent's history. Rows that
+        survive are re-laid out (a delta whose predecessor was removed becomes
+        a delta against the previous survivor, or a keyframe), so every
+        remaining version can still be rebuilt. Returns (rows removed, payload
+        bytes before, payload bytes after).
+        """
+        chain = self.model.objects.filter(**{f'{self.field}_id': parent_id})
+
+        def plan():
+            rows = list(
+                chain.annotate(size=PAYLOAD_SIZE).order_by('version').values_list('id', 'version', 'created_at', 'size')
+            )
+            drop = rows_to_drop(rows, policy, now or timezone.now())
+            before = sum(size for *_, size in rows)
+            return drop, before, before - sum(size for row_id, *_, size in rows if row_id in drop)
+
+        if dry_run:
+            drop, before, after = plan()
+            return len(drop), before, after
+
+        with transaction.atomic():
+            # Writers append to the chain under the same lock (see build), so
+            # the rows read below stay the newest until the rewrite commits
+            self.lock_parents([parent_id])
+            drop, before, after = plan()
+            if not drop:
+                return 0, before, after
+            changed = []
+            state = previous = None
+            keyframe = 0
+            for row in chain.order_by('version'):
+                state = row.snapshot if row.is_keyframe else apply_delta(state, row.delta)
+                if row.id in drop:
+                    continue
+                layout = (row.is_keyframe, row.snapshot, row.delta)
+                keyframe = self.lay_out(row, state, previous, keyframe)
+                previous = state
+                if (row.is_keyframe, row.snapshot, row.delta) != layout:
+                    changed.append(row)
+
+            self.model.objects.bulk_update(changed, ['is_keyframe', 'snapshot', 'delta'], batch_size=BATCH_SIZE)
+            drop = list(drop)
+            for start in range(0, len(drop), BATCH_SIZE):
+                self.model.objects.filter(id__in=drop[start:start + BATCH_SIZE]).delete()
+
+        after = chain.aggregate(total=Sum(PAYLOAD_SIZE))['total'] or 0
+        return len(drop), before, after
+
+
+prompt_history = HistoryStore(PromptHistory, 'prompt', columns={'folder_id': 'folder'})
+workflow_history = HistoryStore(WorkflowHistory, 'workflow')
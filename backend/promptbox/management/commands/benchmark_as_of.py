@@ -0,0 +1,103 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from promptbox.bulk import refresh_prompts
+from promptbox.history import prompt_history
+from promptbox.models import Organization, OrganizationMember, Prompt, PromptHistory, User
+
+BODY = ''.join(f'Line {i} of the benchmark prompt body.\n' for i in range(30))
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Times ?as_of= prompt list requests as history gets deeper and fails if the cost grows '
+        '(runs in a rolled-back transaction)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prompts', type=int, default=100, help='Prompts in the benchmark organization')
+        parser.add_argument('--depths', default='1,10,50,200', help='Comma-separated history depths to measure')
+        parser.add_argument('--repeat', type=int, default=5, help='Requests per measurement')
+        parser.add_argument(
+            '--max-ratio', type=float, default=3.0,
+            help='Fail when the deepest median time exceeds the shallowest by more than this factor',
+        )
+
+    def handle(self, *args, **options):
+        depths = sorted(int(depth) for depth in options['depths'].split(','))
+        try:
+            with transaction.atomic():
+                results = self.run(options['prompts'], depths, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        # Cost must stay flat: the same queries and about the same time at every depth
+        (shallow, shallow_time, shallow_queries), (deep, deep_time, deep_queries) = results[0], results[-1]
+        if deep_queries > shallow_queries:
+            raise CommandError(f'Queries grew from {shallow_queries} at depth {shallow} to {deep_queries} at depth {deep}')
+        if deep_time > shallow_time * options['max_ratio']:
+            raise CommandError(
+                f'Median time grew {deep_time / shallow_time:.1f}x from depth {shallow} to depth {deep} '
+                f'(allowed {options["max_ratio"]}x)'
+            )
+        self.stdout.write(self.style.SUCCESS('as_of cost stays flat as history grows'))
+
+    def run(self, prompt_count, depths, repeat):
+        user = User.objects.create_user(email='benchmark-as-of@example.com', password='unused', name='Benchmark')
+        org = Organization.objects.create(name='as_of benchmark')
+        OrganizationMember.objects.create(organization=org, user=user, role='ADMIN')
+        base = timezone.now() - timedelta(days=365)
+        prompts = Prompt.objects.bulk_create(
+            Prompt(organization=org, created_by=user, name=f'Prompt {i}', prompt=BODY, model='gpt-4')
+            for i in range(prompt_count)
+        )
+        Prompt.objects.filter(organization=org).update(created_at=base)
+        refresh_prompts([prompt.id for prompt in prompts], [org.id])
+
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user=user)
+        url = reverse('prompt-list')
+        depth = 0
+        results = []
+        for target in depths:
+            for version in range(depth + 1, target + 1):
+                prompt_history.record_many(
+                    (prompt.id, {'name': f'{prompt.name} v{version}', 'prompt': BODY.replace('Line 5 ', f'Line 5 v{version} ')},
+                     {'changed_by': user, 'change_summary': 'Benchmark edit'})
+                    for prompt in prompts
+                )
+                PromptHistory.objects.filter(prompt__organization=org, version=version).update(
+                    created_at=base + timedelta(hours=version)
+                )
+            depth = target
+
+            # As of the middle of the history, so every row needs a rebuilt snapshot
+            params = {'as_of': (base + timedelta(hours=depth / 2 + 0.5)).isoformat(), 'page_size': 50}
+            client.get(url, {'page_size': 50})
+            timings = []
+            for i in range(repeat):
+                # A distinct URL per request keeps the list response cache out of the measurement
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    response = client.get(url, {**params, 'page': 1, 'nocache': i})
+                    timings.append(time.perf_counter() - start)
+                if response.status_code != 200 or response.data['count'] != prompt_count:
+                    raise CommandError(f'Unexpected list response at depth {depth}: {response.status_code}')
+            timings.sort()
+            median = timings[len(timings) // 2]
+            results.append((depth, median, len(ctx.captured_queries)))
+            self.stdout.write(
+                f'depth {depth:>5}: median {median * 1000:.1f} ms, {len(ctx.captured_queries)} queries per request'
+            )
+        return results
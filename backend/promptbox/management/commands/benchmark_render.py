@@ -0,0 +1,62 @@
+import json
+import time
+import uuid
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from promptbox.templating import (
+    CompiledTemplate, cache_info, clear_cache, decode_lines, get_template, read_rows, render_rows
+)
+
+LITERAL = 'You are a careful assistant. Follow the house style guide and keep answers short. ' * 8
+
+
+class Command(BaseCommand):
+    help = 'Measures batch template rendering throughput (rows per second) for CSV and JSON Lines input'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50_000, help='Variable rows per measurement')
+        parser.add_argument('--variables', type=int, default=5, help='Variables in the benchmark template')
+
+    def handle(self, *args, **options):
+        row_count, names = options['rows'], [f'var_{i}' for i in range(options['variables'])]
+        text = LITERAL + ''.join(f'\n{name}: {{{{ {name} }}}}' for name in names)
+        prompt = SimpleNamespace(pk=uuid.uuid4(), updated_at=timezone.now(), prompt=text)
+
+        clear_cache()
+        template = get_template(prompt)
+        for label, content_type, lines in (
+            ('csv', 'text/csv', self.csv_lines(names, row_count)),
+            ('jsonl', 'application/x-ndjson', self.jsonl_lines(names, row_count)),
+        ):
+            start = time.perf_counter()
+            rendered = sum(1 for _ in render_rows(template, read_rows(decode_lines(lines), content_type), max_rows=row_count))
+            self.report(f'{label} stream', rendered, time.perf_counter() - start)
+
+        # Baseline: parsing the template again for every row
+        values = {name: f'value {name}' for name in names}
+        start = time.perf_counter()
+        for _ in range(row_count):
+            CompiledTemplate(text).render(values)
+        self.report('compile per row', row_count, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(row_count):
+            get_template(prompt).render(values)
+        self.report('cached template', row_count, time.perf_counter() - start)
+        self.stdout.write(f'template cache: {cache_info()}')
+
+    def report(self, label, rows, seconds):
+        self.stdout.write(f'{label:>16}: {rows} rows in {seconds:.2f}s, {rows / seconds:,.0f} rows/s')
+
+    @staticmethod
+    def csv_lines(names, count):
+        yield (','.join(names) + '\r\n').encode()
+        for i in range(count):
+            yield (','.join(f'"row {i}, {name}"' for name in names) + '\r\n').encode()
+
+    @staticmethod
+    def jsonl_lines(names, count):
+        for i in range(count):
+            yield (json.dumps({name: f'row {i} {name}' for name in names}) + '\n').encode()
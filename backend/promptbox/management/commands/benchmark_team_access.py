@@ -0,0 +1,106 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from promptbox.bulk import refresh_prompts
+from promptbox.hierarchy import team_hierarchy
+from promptbox.models import Organization, OrganizationMember, Prompt, Team, TeamClosure, TeamMember, TeamPrompt, User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Times prompt list requests for a member of a root team whose prompts are shared with teams '
+        'far below it, for deep and wide team trees (runs in a rolled-back transaction)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depth', type=int, default=50, help='Teams in the deep (chain) tree')
+        parser.add_argument('--fanout', type=int, default=10, help='Children per team in the wide tree')
+        parser.add_argument('--levels', type=int, default=3, help='Levels below the root in the wide tree')
+        parser.add_argument('--prompts', type=int, default=200, help='Prompts shared with the bottom teams')
+        parser.add_argument('--repeat', type=int, default=5, help='Requests per measurement')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.measure('deep', [1] * (options['depth'] - 1), options)
+                self.measure('wide', [options['fanout']] * options['levels'], options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def measure(self, label, fanouts, options):
+        user = User.objects.create_user(email=f'benchmark-teams-{label}@example.com', password='unused', name='Benchmark')
+        author = User.objects.create_user(email=f'benchmark-author-{label}@example.com', password='unused', name='Author')
+        org = Organization.objects.create(name=f'team benchmark {label}')
+        OrganizationMember.objects.create(organization=org, user=user, role='MEMBER')
+
+        # Teams are written in bulk and the closure built once, as after an import
+        root = Team.objects.create(organization=org, name='Root')
+        levels = [[root]]
+        for level, fanout in enumerate(fanouts, start=1):
+            levels.append(Team.objects.bulk_create(
+                Team(organization=org, parent=parent, name=f'L{level} {parent.name} {i}')
+                for parent in levels[-1] for i in range(fanout)
+            ))
+        start = time.perf_counter()
+        team_hierarchy.sync(org.id)
+        build_ms = (time.perf_counter() - start) * 1000
+        TeamMember.objects.create(team=root, user=user, role='MEMBER')
+
+        bottom = levels[-1]
+        prompts = Prompt.objects.bulk_create(
+            Prompt(organization=org, created_by=author, name=f'Prompt {i}', prompt='x', model='gpt-4', visibility='TEAM')
+            for i in range(options['prompts'])
+        )
+        TeamPrompt.objects.bulk_create(
+            TeamPrompt(prompt=prompt, team=bottom[i % len(bottom)]) for i, prompt in enumerate(prompts)
+        )
+        refresh_prompts([prompt.id for prompt in prompts], [org.id])
+
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user=user)
+        url = reverse('prompt-list')
+        client.get(url, {'page_size': 50})
+        timings = []
+        for i in range(options['repeat']):
+            # A distinct URL per request keeps the list response cache out of the measurement
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = client.get(url, {'page_size': 50, 'nocache': i})
+                timings.append(time.perf_counter() - start)
+            if response.status_code != 200 or response.data['count'] != len(prompts):
+                raise CommandError(f'Expected {len(prompts)} prompts, got {response.data.get("count")}')
+        timings.sort()
+
+        # Baseline: collecting the teams below the user's by walking parent links, one query per level
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as walk:
+            frontier, below = {root.id}, set()
+            while frontier:
+                below |= frontier
+                frontier = set(Team.objects.filter(parent_id__in=frontier, is_active=True).values_list('id', flat=True)) - below
+        walk_ms = (time.perf_counter() - start) * 1000
+
+        # Re-parenting the team under the root recomputes the closure of its subtree
+        moved = levels[1][0]
+        start = time.perf_counter()
+        moved.parent = None
+        moved.save()
+        move_ms = (time.perf_counter() - start) * 1000
+
+        teams = sum(len(level) for level in levels)
+        self.stdout.write(
+            f'{label:>4}: {teams} teams, {len(levels) - 1} levels, '
+            f'{TeamClosure.objects.filter(descendant__organization=org).count()} closure rows (built in {build_ms:.0f} ms); '
+            f'list median {timings[len(timings) // 2] * 1000:.1f} ms, {len(ctx.captured_queries)} queries; '
+            f'walking the tree instead: {len(walk.captured_queries)} queries, {walk_ms:.1f} ms; '
+            f're-parent: {move_ms:.1f} ms'
+        )
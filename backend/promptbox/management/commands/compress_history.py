@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from promptbox.history import prompt_history, workflow_history
+from promptbox.outbox import drain as drain_outbox
+
+
+def payload_size(row):
+    return len(json.dumps(row.snapshot if row.is_keyframe else row.delta))
+
+
+class Command(BaseCommand):
+    help = 'Rewrites prompt/workflow history as keyframes plus deltas (use after upgrading, or to re-pack)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Parents (prompts/workflows) per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the space that would be saved')
+
+    def handle(self, *args, **options):
+        # Queued history is written first so it is covered too
+        drain_outbox()
+        for label, store in (('prompt', prompt_history), ('workflow', workflow_history)):
+            rewritten, before, after = self.compress(store, options['batch_size'], options['dry_run'])
+            self.stdout.write(f'{label} history: rewrote {rewritten} rows, payload {before} -> {after} bytes')
+        self.stdout.write(self.style.SUCCESS('History compressed' if not options['dry_run'] else 'Dry run complete'))
+
+    def compress(self, store, batch_size, dry_run):
+        parent_field = f'{store.field}_id'
+        rewritten = before = after = 0
+        last_id = None
+        while True:
+            parents = store.model.objects.order_by(parent_field).values_list(parent_field, flat=True).distinct()
+            if last_id is not None:
+                parents = parents.filter(**{f'{parent_field}__gt': last_id})
+            parent_ids = list(parents[:batch_size])
+            if not parent_ids:
+                break
+            last_id = parent_ids[-1]
+
+            with transaction.atomic():
+                rows = list(store.model.objects.filter(**{f'{parent_field}__in': parent_ids}).order_by(parent_field, 'version'))
+                changed = []
+                by_parent = {}
+                for row in rows:
+                    by_parent.setdefault(getattr(row, parent_field), []).append(row)
+                for chain in by_parent.values():
+                    # Replay the chain as stored, then lay it out again
+                    states = [state for _, state in store.replay(chain)]
+                    previous = None
+                    keyframe = 0
+                    for row, state in zip(chain, states):
+                        before += payload_size(row)
+                        layout = (row.is_keyframe, row.snapshot, row.delta)
+                        keyframe = store.lay_out(row, state, previous, keyframe)
+                        after += payload_size(row)
+                        previous = state
+                        if (row.is_keyframe, row.snapshot, row.delta) != layout:
+                            changed.append(row)
+
+                rewritten += len(changed)
+                if changed and not dry_run:
+                    store.model.objects.bulk_update(changed, ['is_keyframe', 'snapshot', 'delta'], batch_size=500)
+            self.stdout.write(f'Processed {len(parent_ids)} {store.field}s...')
+        return rewritten, before, after
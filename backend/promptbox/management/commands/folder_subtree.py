@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from promptbox.folders import BATCH_SIZE, FolderSubtree, SubtreeError
+from promptbox.membership import as_uuid
+from promptbox.models import Folder
+
+
+class Command(BaseCommand):
+    help = 'Moves, copies or purges a folder with everything below it, reporting progress per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('operation', choices=['move', 'copy', 'purge'])
+        parser.add_argument('folder', help='Folder ID')
+        parser.add_argument('--parent', help='Target parent folder ID for move/copy (omit for the root level)')
+        parser.add_argument('--name', help='Name of the copied folder')
+        parser.add_argument('--resume', help='copy: root folder ID of an interrupted copy to finish')
+        parser.add_argument('--delete-prompts', action='store_true', help='purge: delete the prompts instead of moving them to the root level')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        folder = self.get_folder(options['folder'])
+        parent = self.get_folder(options['parent']) if options['parent'] else None
+        subtree = FolderSubtree(folder, batch_size=options['batch_size'], progress=self.report)
+        operation = options['operation']
+        try:
+            if operation == 'move':
+                moved = subtree.move(parent)
+                self.stdout.write(self.style.SUCCESS(f'Moved {moved} folders'))
+            elif operation == 'copy':
+                resume = self.get_folder(options['resume']) if options['resume'] else None
+                try:
+                    root, folders, prompts = subtree.copy(parent, name=options['name'], resume=resume)
+                except BaseException:
+                    if subtree.copy_root is not None:
+                        self.stderr.write(f'Copy interrupted; rerun with --resume {subtree.copy_root.id} to finish it')
+                    raise
+                self.stdout.write(self.style.SUCCESS(f'Copied {folders} folders and {prompts} prompts to {root.id}'))
+            else:
+                folders, deleted, detached = subtree.purge(delete=options['delete_prompts'])
+                self.stdout.write(self.style.SUCCESS(
+                    f'Removed {folders} folders; {deleted} prompts deleted, {detached} moved to the root level'
+                ))
+        except SubtreeError as exc:
+            raise CommandError(str(exc))
+
+    def get_folder(self, folder_id):
+        folder = Folder.objects.filter(id=as_uuid(folder_id)).first()
+        if folder is None:
+            raise CommandError(f'Folder {folder_id} not found')
+        return folder
+
+    def report(self, stage, done, total):
+        self.stdout.write(f'{stage}: {done}/{total}')
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from promptbox.membership import as_uuid
+from promptbox.models import Organization
+from promptbox.templating import decode_lines, read_rows
+from promptbox.user_import import CHUNK_SIZE, MAX_ROWS, ROLES, UserImporter
+
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates users in an organization from a CSV (header row email,name,password[,role]) or JSON Lines '
+        'file, hashing passwords in a process pool and writing rows in chunks'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='CSV or JSON Lines file')
+        parser.add_argument('--organization', required=True, help='Organization ID')
+        parser.add_argument('--role', default='MEMBER', choices=ROLES, help='Role of rows without one')
+        parser.add_argument('--format', choices=sorted(FORMATS), help='Input format (default: from the file extension)')
+        parser.add_argument('--workers', type=int, help='Hashing processes (default: one per CPU)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--max-rows', type=int, default=MAX_ROWS)
+
+    def handle(self, *args, **options):
+        organization = Organization.objects.filter(id=as_uuid(options['organization']), is_active=True).first()
+        if organization is None:
+            raise CommandError(f'Organization {options["organization"]} not found')
+        fmt = options['format'] or options['file'].rsplit('.', 1)[-1].lower()
+        if fmt not in FORMATS:
+            raise CommandError('Cannot tell the format from the file name; pass --format')
+
+        importer = UserImporter(
+            organization, role=options['role'], workers=options['workers'],
+            chunk_size=options['chunk_size'], max_rows=options['max_rows'],
+        )
+        start = time.perf_counter()
+        with open(options['file'], 'rb') as source:
+            for result in importer.run(read_rows(decode_lines(source), FORMATS[fmt])):
+                if 'error' in result:
+                    self.stderr.write(f'row {result["row"]}: {result["error"]}')
+        elapsed = time.perf_counter() - start
+
+        style = self.style.WARNING if importer.failed else self.style.SUCCESS
+        self.stdout.write(style(
+            f'Created {importer.created} users, {importer.failed} rows failed '
+            f'({elapsed:.1f} s, {importer.workers} hashing workers)'
+        ))
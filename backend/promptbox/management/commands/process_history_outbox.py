@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from promptbox.models import HistoryOutbox
+from promptbox.outbox import BATCH_SIZE, drain
+
+
+class Command(BaseCommand):
+    help = 'Writes queued prompt/workflow history rows (run with PROMPTBOX_HISTORY_OUTBOX_THREAD = False)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Entries written per transaction')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            processed = drain(options['batch_size'], skip_locked=True)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {processed} history rows, {HistoryOutbox.objects.count()} pending'))
+            return
+
+        self.stdout.write(f'Processing history outbox every {options["interval"]}s (Ctrl+C to stop)')
+        try:
+            while True:
+                processed = drain(options['batch_size'], skip_locked=True)
+                if processed:
+                    self.stdout.write(f'Wrote {processed} history rows')
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
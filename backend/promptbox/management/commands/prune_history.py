@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from promptbox.history import prompt_history, workflow_history
+from promptbox.models import HistoryRetentionPolicy
+from promptbox.outbox import drain as drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Applies each organization\'s history retention policy to prompt and workflow history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', help='Only prune history of this organization ID')
+        parser.add_argument('--batch-size', type=int, default=200, help='Prompts/workflows loaded per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+
+    def handle(self, *args, **options):
+        # Queued history is written first so it is covered too
+        drain_outbox()
+        policies = HistoryRetentionPolicy.objects.select_related('organization').order_by('organization_id')
+        if options['organization']:
+            policies = policies.filter(organization_id=options['organization'])
+
+        now = timezone.now()
+        total_removed = total_reclaimed = 0
+        for policy in policies:
+            for label, store in (('prompt', prompt_history), ('workflow', workflow_history)):
+                removed, reclaimed = self.prune(store, policy, now, options['batch_size'], options['dry_run'])
+                total_removed += removed
+                total_reclaimed += reclaimed
+                if removed:
+                    self.stdout.write(
+                        f'{policy.organization.name}: removed {removed} {label} versions, reclaimed {reclaimed} bytes'
+                    )
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total_removed} versions, {total_reclaimed} bytes'))
+
+    def prune(self, store, policy, now, batch_size, dry_run):
+        parent_field = f'{store.field}_id'
+        parents = store.model.objects.filter(
+            **{f'{store.field}__organization_id': policy.organization_id}
+        ).order_by(parent_field).values_list(parent_field, flat=True).distinct()
+
+        removed = reclaimed = 0
+        last_id = None
+        while True:
+            batch = parents if last_id is None else parents.filter(**{f'{parent_field}__gt': last_id})
+            parent_ids = list(batch[:batch_size])
+            if not parent_ids:
+                break
+            last_id = parent_ids[-1]
+            # One short transaction per prompt/workflow
+            for parent_id in parent_ids:
+                count, before, after = store.prune(parent_id, policy, now, dry_run)
+                removed += count
+                reclaimed += before - after
+        return removed, reclaimed
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from promptbox import response_cache
+from promptbox.access import prompt_access, workflow_access
+from promptbox.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Checks the prompt/workflow access index against the source tables and repairs any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, do not repair it')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        dry_run = options['check']
+        batch_size = options['batch_size']
+        drifted = False
+
+        for label, index in (('prompts', prompt_access), ('workflows', workflow_access)):
+            added = removed = 0
+            last_id = None
+            while True:
+                objects = index.model.objects.order_by('id')
+                if last_id is not None:
+                    objects = objects.filter(id__gt=last_id)
+                object_ids = list(objects.values_list('id', flat=True)[:batch_size])
+                if not object_ids:
+                    break
+                with transaction.atomic():
+                    batch_added, batch_removed = index.sync(object_ids, dry_run=dry_run)
+                added += batch_added
+                removed += batch_removed
+                last_id = object_ids[-1]
+
+            drifted = drifted or bool(added or removed)
+            if not dry_run and (added or removed):
+                response_cache.invalidate([label], Organization.objects.values_list('id', flat=True))
+            verb = 'Missing/stale' if dry_run else 'Added/removed'
+            self.stdout.write(f'{label}: {verb} {added}/{removed} access rows')
+
+        if dry_run and drifted:
+            self.stdout.write(self.style.WARNING('Access index is out of sync; rerun without --check to repair it'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Access index is consistent'))
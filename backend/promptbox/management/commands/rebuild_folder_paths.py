@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from promptbox import response_cache
+from promptbox.folders import rebuild_paths
+from promptbox.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Recomputes folder materialized paths from the parent links and repairs any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, do not repair it')
+        parser.add_argument('--organization', action='append', dest='organizations', help='Limit to an organization ID (repeatable)')
+
+    def handle(self, *args, **options):
+        dry_run = options['check']
+        # Trees are rebuilt per organization, each in one transaction
+        org_ids = options['organizations'] or list(Organization.objects.values_list('id', flat=True))
+        fixed = 0
+        for org_id in org_ids:
+            with transaction.atomic():
+                count = rebuild_paths([org_id], dry_run=dry_run)
+            if count:
+                self.stdout.write(f'{org_id}: {count} folders {"out of date" if dry_run else "fixed"}')
+            fixed += count
+
+        if not dry_run and fixed:
+            response_cache.invalidate(['folders'], org_ids)
+        if dry_run and fixed:
+            self.stdout.write(self.style.WARNING('Folder paths are out of sync; rerun without --check to repair them'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Folder paths are consistent ({fixed} fixed)'))
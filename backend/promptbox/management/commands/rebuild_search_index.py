@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from promptbox import response_cache
+from promptbox.models import Organization, Prompt
+from promptbox.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the prompt full-text search index (use after bulk imports or restores)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--organization', help='Only reindex prompts of this organization ID')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError('The configured database has no full-text search backend')
+
+        prompts = Prompt.objects.order_by('id')
+        if options['organization']:
+            prompts = prompts.filter(organization_id=options['organization'])
+        else:
+            backend.clear()
+
+        batch_size = options['batch_size']
+        total = 0
+        last_id = None
+        while True:
+            batch = prompts
+            if last_id is not None:
+                batch = batch.filter(id__gt=last_id)
+            prompt_ids = list(batch.values_list('id', flat=True)[:batch_size])
+            if not prompt_ids:
+                break
+            with transaction.atomic():
+                backend.index_prompts(prompt_ids)
+            total += len(prompt_ids)
+            last_id = prompt_ids[-1]
+            self.stdout.write(f'Indexed {total} prompts...')
+
+        # Search results cached before the rebuild may be missing rows
+        if options['organization']:
+            org_ids = [options['organization']]
+        else:
+            org_ids = Organization.objects.values_list('id', flat=True)
+        response_cache.invalidate(['prompts'], org_ids)
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt ({total} prompts)'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from promptbox import response_cache
+from promptbox.hierarchy import team_hierarchy
+from promptbox.models import Organization
+
+
+class Command(BaseCommand):
+    help = 'Checks the team closure table against the parent links and repairs any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, do not repair it')
+
+    def handle(self, *args, **options):
+        dry_run = options['check']
+        added = removed = 0
+        drifted_orgs = []
+        for org_id in Organization.objects.values_list('id', flat=True):
+            with transaction.atomic():
+                org_added, org_removed = team_hierarchy.sync(org_id, dry_run=dry_run)
+            if org_added or org_removed:
+                drifted_orgs.append(org_id)
+            added += org_added
+            removed += org_removed
+
+        if not dry_run and drifted_orgs:
+            response_cache.invalidate(['prompts', 'workflows'], drifted_orgs)
+        verb = 'Missing/stale' if dry_run else 'Added/removed'
+        self.stdout.write(f'{verb} {added}/{removed} closure rows in {len(drifted_orgs)} organizations')
+        if dry_run and drifted_orgs:
+            self.stdout.write(self.style.WARNING('Team closure is out of sync; rerun without --check to repair it'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Team closure is consistent'))
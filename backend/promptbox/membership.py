@@ -0,0 +1,95 @@
+"""
+Membership context: the organizations (with roles) and teams a user belongs to.
+
+Computed once per request and cached across requests in Django's cache.
+Signals on OrganizationMember and TeamMember evict a user's entry whenever
+their memberships change.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import OrganizationMember, TeamMember
+
+CACHE_KEY = 'promptbox:membership:{user_id}'
+REQUEST_ATTR = '_promptbox_membership'
+
+
+def as_uuid(value):
+    if isinstance(value, uuid.UUID):
+        return value
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class MembershipContext:
+    def __init__(self, user_id, org_roles, team_ids):
+        self.user_id = user_id
+        self.org_roles = org_roles
+        self.team_ids = team_ids
+
+    @classmethod
+    def load(cls, user_id):
+        org_roles = {}
+        for org_id, role in OrganizationMember.objects.filter(user_id=user_id).values_list('organization_id', 'role'):
+            org_roles.setdefault(org_id, set()).add(role)
+        team_ids = list(TeamMember.objects.filter(user_id=user_id).values_list('team_id', flat=True))
+        return cls(user_id, org_roles, team_ids)
+
+    @property
+    def org_ids(self):
+        return list(self.org_roles)
+
+    @property
+    def principal_ids(self):
+        """IDs the access index can grant visibility to (see promptbox.access)."""
+        return [self.user_id, *self.org_roles, *self.team_ids]
+
+    @property
+    def fingerprint(self):
+        """Stable digest of everything that decides what this user can see."""
+        parts = [
+            str(self.user_id),
+            *sorted(str(org_id) for org_id in self.org_roles),
+            '|',
+            *sorted(str(team_id) for team_id in self.team_ids),
+        ]
+        return hashlib.sha256(','.join(parts).encode('utf-8')).hexdigest()[:32]
+
+    def is_member(self, organization_id):
+        return as_uuid(organization_id) in self.org_roles
+
+    def has_role(self, organization_id, role):
+        return role in self.org_roles.get(as_uuid(organization_id), ())
+
+    def is_admin(self, organization_id):
+        return self.has_role(organization_id, 'ADMIN')
+
+
+def get_membership(user, request=None):
+    """
+    Return the MembershipContext for ``user``. When ``request`` is given the
+    context is memoized on it so repeated lookups within a request are free.
+    """
+    if request is not None and getattr(request, 'user', None) == user:
+        context = getattr(request, REQUEST_ATTR, None)
+        if context is not None:
+            return context
+
+    key = CACHE_KEY.format(user_id=user.pk)
+    context = cache.get(key)
+    if context is None:
+        context = MembershipContext.load(user.pk)
+        cache.set(key, context, getattr(settings, 'PROMPTBOX_MEMBERSHIP_CACHE_TIMEOUT', 300))
+
+    if request is not None and getattr(request, 'user', None) == user:
+        setattr(request, REQUEST_ATTR, context)
+    return context
+
+
+def invalidate_membership(user_id):
+    cache.delete(CACHE_KEY.format(user_id=user_id))
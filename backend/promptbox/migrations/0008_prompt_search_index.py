@@ -0,0 +1,66 @@
+from django.db import migrations
+
+from promptbox.search import BATCH_SIZE, get_search_backend
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS promptbox_prompt_fts USING fts5('
+            'prompt_id UNINDEXED, name, description, prompt, categories, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE IF NOT EXISTS promptbox_prompt_fts ('
+            'prompt_id uuid PRIMARY KEY REFERENCES promptbox_prompt (id) ON DELETE CASCADE, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS promptbox_prompt_fts_document_idx '
+            'ON promptbox_prompt_fts USING GIN (document)'
+        )
+
+
+def populate_search_index(apps, schema_editor):
+    # Index the existing prompts, so search does not come back empty until
+    # rebuild_search_index runs
+    backend = get_search_backend(schema_editor.connection.vendor)
+    if backend is None:
+        return
+    Prompt = apps.get_model('promptbox', 'Prompt')
+    PromptCategory = apps.get_model('promptbox', 'PromptCategory')
+    prompt_ids = list(Prompt.objects.order_by('pk').values_list('pk', flat=True))
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(0, len(prompt_ids), BATCH_SIZE):
+            batch = prompt_ids[start:start + BATCH_SIZE]
+            categories = {}
+            for prompt_id, category_name in PromptCategory.objects.filter(
+                prompt_id__in=batch,
+            ).values_list('prompt_id', 'category__name'):
+                categories.setdefault(prompt_id, []).append(category_name)
+            documents = {
+                prompt_id: (name, description, body, ' '.join(sorted(categories.get(prompt_id, []))))
+                for prompt_id, name, description, body in Prompt.objects.filter(
+                    pk__in=batch,
+                ).values_list('pk', 'name', 'description', 'prompt')
+            }
+            backend._insert(cursor, documents)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS promptbox_prompt_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promptbox', '0007_workflow_workflowhistory_workflowstep_workflowteam'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
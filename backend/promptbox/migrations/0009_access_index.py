@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:17
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+def populate_access_index(apps, schema_editor):
+    for model_name, entry_name, share_name, field in (
+        ('Prompt', 'PromptAccess', 'TeamPrompt', 'prompt'),
+        ('Workflow', 'WorkflowAccess', 'WorkflowTeam', 'workflow'),
+    ):
+        model = apps.get_model('promptbox', model_name)
+        entry_model = apps.get_model('promptbox', entry_name)
+        share_model = apps.get_model('promptbox', share_name)
+
+        entries = []
+        for obj in model.objects.exclude(visibility='TEAM').iterator():
+            if obj.visibility == 'PUBLIC':
+                entries.append(entry_model(**{f'{field}_id': obj.id}, principal_type='ORGANIZATION', principal_id=obj.organization_id))
+            elif obj.created_by_id:
+                entries.append(entry_model(**{f'{field}_id': obj.id}, principal_type='USER', principal_id=obj.created_by_id))
+        shares = share_model.objects.filter(**{f'{field}__visibility': 'TEAM'}).values_list(f'{field}_id', 'team_id').distinct()
+        for object_id, team_id in shares.iterator():
+            entries.append(entry_model(**{f'{field}_id': object_id}, principal_type='TEAM', principal_id=team_id))
+        entry_model.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promptbox', '0008_prompt_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromptAccess',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('principal_type', models.CharField(choices=[('ORGANIZATION', 'Organization'), ('TEAM', 'Team'), ('USER', 'User')], max_length=20)),
+                ('principal_id', models.UUIDField()),
+                ('prompt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access_entries', to='promptbox.prompt')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('principal_id', 'prompt'), name='unique_prompt_access')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkflowAccess',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('principal_type', models.CharField(choices=[('ORGANIZATION', 'Organization'), ('TEAM', 'Team'), ('USER', 'User')], max_length=20)),
+                ('principal_id', models.UUIDField()),
+                ('workflow', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access_entries', to='promptbox.workflow')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('principal_id', 'workflow'), name='unique_workflow_access')],
+            },
+        ),
+        migrations.RunPython(populate_access_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+from django.db import migrations, models
+
+
+def number_history(apps, schema_editor):
+    # Existing rows keep their full snapshots (every row is a keyframe) and
+    # are numbered per parent in creation order; compress_history turns them
+    # into deltas afterwards.
+    for model_name, field in (('PromptHistory', 'prompt'), ('WorkflowHistory', 'workflow')):
+        model = apps.get_model('promptbox', model_name)
+        rows = model.objects.order_by(f'{field}_id', 'created_at', 'id').values_list('id', f'{field}_id')
+        batch = []
+        parent_id = version = None
+        for row_id, row_parent_id in rows.iterator():
+            version = version + 1 if row_parent_id == parent_id else 1
+            parent_id = row_parent_id
+            batch.append(model(id=row_id, version=version))
+            if len(batch) >= 500:
+                model.objects.bulk_update(batch, ['version'])
+                batch = []
+        model.objects.bulk_update(batch, ['version'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promptbox', '0009_access_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompthistory',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='prompthistory',
+            name='is_keyframe',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='prompthistory',
+            name='delta',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='prompthistory',
+            name='snapshot',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='workflowhistory',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='workflowhistory',
+            name='is_keyframe',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='workflowhistory',
+            name='delta',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='workflowhistory',
+            name='snapshot',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RunPython(number_history, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='prompthistory',
+            constraint=models.UniqueConstraint(fields=('prompt', 'version'), name='unique_prompt_history_version'),
+        ),
+        migrations.AddConstraint(
+            model_name='workflowhistory',
+            constraint=models.UniqueConstraint(fields=('workflow', 'version'), name='unique_workflow_history_version'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:49
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promptbox', '0010_history_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoryRetentionPolicy',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('keep_last', models.PositiveIntegerField(blank=True, help_text='Newest versions always kept', null=True)),
+                ('daily_after_days', models.PositiveIntegerField(blank=True, help_text='Older versions are thinned to the last one of each day', null=True)),
+                ('weekly_after_days', models.PositiveIntegerField(blank=True, help_text='Older versions are thinned to the last one of each week', null=True)),
+                ('max_bytes', models.PositiveIntegerField(blank=True, help_text='Cap on stored history per prompt/workflow; oldest versions go first', null=True)),
+                ('organization', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='history_retention', to='promptbox.organization')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
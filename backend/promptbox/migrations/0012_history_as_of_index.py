@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promptbox', '0011_history_retention_policy'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prompthistory',
+            index=models.Index(fields=['prompt', 'created_at'], name='prompt_history_as_of_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workflowhistory',
+            index=models.Index(fields=['workflow', 'created_at'], name='workflow_history_as_of_idx'),
+        ),
+    ]
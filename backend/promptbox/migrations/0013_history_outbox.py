@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promptbox', '0012_history_as_of_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='prompthistory',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='workflowhistory',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='HistoryOutbox',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('prompt', 'Prompt'), ('workflow', 'Workflow')], max_length=20)),
+                ('object_id', models.UUIDField()),
+                ('snapshot', models.JSONField()),
+                ('change_summary', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('changed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id'], name='history_outbox_object_idx')],
+            },
+        ),
+    ]
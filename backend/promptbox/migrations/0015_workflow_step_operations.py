@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promptbox', '0014_workflow_runs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historyoutbox',
+            name='operations',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='workflowhistory',
+            name='operations',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
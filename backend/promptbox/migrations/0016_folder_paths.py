@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:26
+
+from django.db import migrations, models
+
+
+def populate_folder_paths(apps, schema_editor):
+    Folder = apps.get_model('promptbox', 'Folder')
+    parents = dict(Folder.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def path_of(folder_id, seen=()):
+        if folder_id not in paths:
+            parent_id = parents.get(folder_id)
+            # A parent cycle cannot be described by a path; the folder becomes a root
+            prefix = path_of(parent_id, seen + (folder_id,)) if parent_id in parents and parent_id not in seen else ''
+            paths[folder_id] = f'{prefix}{folder_id.hex}/'
+        return paths[folder_id]
+
+    folders = [Folder(id=folder_id, path=path_of(folder_id)) for folder_id in parents]
+    for folder in folders:
+        folder.depth = folder.path.count('/') - 1
+    Folder.objects.bulk_update(folders, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promptbox', '0015_workflow_step_operations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folder',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='path',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(fields=['path'], name='folder_path_idx'),
+        ),
+        migrations.RunPython(populate_folder_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:31
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+def populate_team_closure(apps, schema_editor):
+    Team = apps.get_model('promptbox', 'Team')
+    TeamClosure = apps.get_model('promptbox', 'TeamClosure')
+    teams = {team_id: (parent_id, is_active) for team_id, parent_id, is_active in Team.objects.values_list('id', 'parent_id', 'is_active')}
+    rows = []
+    for team_id in teams:
+        current, depth, seen = team_id, 0, set()
+        while current in teams and current not in seen and teams[current][1]:
+            seen.add(current)
+            rows.append(TeamClosure(ancestor_id=current, descendant_id=team_id, depth=depth))
+            current, depth = teams[current][0], depth + 1
+    TeamClosure.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promptbox', '0016_folder_paths'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamClosure',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='promptbox.team')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='promptbox.team')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_team_closure')],
+            },
+        ),
+        migrations.RunPython(populate_team_closure, migrations.RunPython.noop),
+    ]
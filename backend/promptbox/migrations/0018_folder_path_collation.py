@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def use_byte_order_collation(apps, schema_editor):
+    # Subtree lookups are ranges over path; they need '/' < '0' < 'a' byte
+    # ordering, which linguistic collations (e.g. en_US) do not give. The
+    # ALTER rebuilds folder_path_idx with the new collation.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE promptbox_folder ALTER COLUMN path TYPE text COLLATE "C"')
+
+
+def use_default_collation(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('ALTER TABLE promptbox_folder ALTER COLUMN path TYPE text COLLATE "default"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promptbox', '0017_team_closure'),
+    ]
+
+    operations = [
+        migrations.RunPython(use_byte_order_collation, use_default_collation),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+from promptbox.history import apply_delta
+
+
+def populate_folder_ids(apps, schema_editor):
+    # Replay each prompt's chain once, in version order, to read the folder
+    # of every snapshot
+    PromptHistory = apps.get_model('promptbox', 'PromptHistory')
+    rows = PromptHistory.objects.order_by('prompt_id', 'version').only(
+        'id', 'prompt_id', 'is_keyframe', 'snapshot', 'delta',
+    )
+    batch = []
+    parent_id = state = None
+    for row in rows.iterator(chunk_size=500):
+        if row.prompt_id != parent_id:
+            parent_id, state = row.prompt_id, None
+        state = row.snapshot if row.is_keyframe else apply_delta(state, row.delta)
+        folder_id = (state or {}).get('folder')
+        if folder_id:
+            row.folder_id = folder_id
+            batch.append(row)
+        if len(batch) >= 500:
+            PromptHistory.objects.bulk_update(batch, ['folder_id'])
+            batch = []
+    PromptHistory.objects.bulk_update(batch, ['folder_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('promptbox', '0018_folder_path_collation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompthistory',
+            name='folder_id',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+        migrations.RunPython(populate_folder_ids, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.base_user import BaseUserManager
 
@@ -96,6 +97,27 @@ class Team(BaseModel):
     def __str__(self):
         return self.name
 
+class TeamClosure(models.Model):
+    """
+    Ancestry of teams, maintained by promptbox.hierarchy from ``Team.parent``:
+    one row per (ancestor, descendant) pair, each active team paired with
+    itself at depth 0. Pairs are only recorded while every team from the
+    ancestor down to the descendant is active.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    ancestor = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            # Also the index visibility checks read: ancestor -> descendants
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_team_closure'),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} is {self.depth} above {self.descendant_id}"
+
 class TeamMember(BaseModel):
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='members')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='team_memberships')
@@ -146,22 +168,46 @@ class Folder(BaseModel):
     team = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, blank=True, related_name='folders')
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='folders')
     type = models.CharField(max_length=20, choices=TYPE_CHOICES, default='PRIVATE')
+    # Materialized path of ancestor IDs, maintained from parent (see promptbox.folders);
+    # byte-order collated (COLLATE "C" on PostgreSQL, migration 0018)
+    path = models.TextField(default='', editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['path'], name='folder_path_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.type})"
 
 class PromptHistory(BaseModel):
     """
-    Tracks changes made to a Prompt. Each record stores a snapshot of the
-    prompt fields at the time of the change.
+    Tracks changes made to a Prompt. Each record describes the prompt
+    fields at the time of the change: keyframes hold the full ``snapshot``,
+    other rows a ``delta`` against the previous version (see promptbox.history).
     """
+    # Set from the outbox entry when written asynchronously (see promptbox.outbox)
+    created_at = models.DateTimeField(default=timezone.now)
     prompt = models.ForeignKey(Prompt, on_delete=models.CASCADE, related_name='history')
     changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='prompt_changes')
     change_summary = models.CharField(max_length=255)
-    snapshot = models.JSONField()
+    version = models.PositiveIntegerField()
+    is_keyframe = models.BooleanField(default=True)
+    snapshot = models.JSONField(null=True, blank=True)
+    delta = models.JSONField(null=True, blank=True)
+    # The snapshot's folder, so point-in-time folder filters run in SQL (see promptbox.as_of)
+    folder_id = models.UUIDField(null=True, blank=True)
 
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['prompt', 'version'], name='unique_prompt_history_version'),
+        ]
+        indexes = [
+            # Point-in-time reads seek the first change after a timestamp
+            models.Index(fields=['prompt', 'created_at'], name='prompt_history_as_of_idx'),
+        ]
 
     def __str__(self):
         return f"History for {self.prompt.name} at {self.created_at}"
@@ -192,6 +238,31 @@ class PromptCategory(models.Model):
     def __str__(self):
         return f"{self.prompt.name} in {self.category.name}"
 
+class PromptAccess(models.Model):
+    """
+    Denormalized visibility index for prompts, maintained by promptbox.access.
+    One row per principal that can see the prompt: the organization for PUBLIC
+    prompts, each shared team for TEAM prompts and the creator for PRIVATE ones.
+    """
+    PRINCIPAL_CHOICES = [
+        ('ORGANIZATION', 'Organization'),
+        ('TEAM', 'Team'),
+        ('USER', 'User'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    prompt = models.ForeignKey(Prompt, on_delete=models.CASCADE, related_name='access_entries')
+    principal_type = models.CharField(max_length=20, choices=PRINCIPAL_CHOICES)
+    principal_id = models.UUIDField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['principal_id', 'prompt'], name='unique_prompt_access'),
+        ]
+
+    def __str__(self):
+        return f"{self.principal_type} {self.principal_id} can see {self.prompt_id}"
+
 class Workflow(BaseModel):
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='workflows')
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='workflows')
@@ -233,16 +304,152 @@ class WorkflowTeam(models.Model):
 
 class WorkflowHistory(BaseModel):
     """
-    Tracks changes made to a Workflow. Each record stores a snapshot of the
-    workflow fields at the time of the change.
+    Tracks changes made to a Workflow. Each record describes the workflow
+    fields at the time of the change: keyframes hold the full ``snapshot``,
+    other rows a ``delta`` against the previous version (see promptbox.history).
     """
+    # Set from the outbox entry when written asynchronously (see promptbox.outbox)
+    created_at = models.DateTimeField(default=timezone.now)
     workflow = models.ForeignKey(Workflow, on_delete=models.CASCADE, related_name='history')
     changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='workflow_changes')
     change_summary = models.CharField(max_length=255)
-    snapshot = models.JSONField()
+    version = models.PositiveIntegerField()
+    is_keyframe = models.BooleanField(default=True)
+    snapshot = models.JSONField(null=True, blank=True)
+    delta = models.JSONField(null=True, blank=True)
+    # Step edits made through the step operations API (see promptbox.steps)
+    operations = models.JSONField(null=True, blank=True)
 
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['workflow', 'version'], name='unique_workflow_history_version'),
+        ]
+        indexes = [
+            # Point-in-time reads seek the first change after a timestamp
+            models.Index(fields=['workflow', 'created_at'], name='workflow_history_as_of_idx'),
+        ]
 
     def __str__(self):
         return f"History for {self.workflow.name} at {self.created_at}"
+
+class WorkflowRun(BaseModel):
+    """
+    One execution of a workflow (see promptbox.runner). Timings are wall
+    clock; ``duration_ms`` covers the whole run.
+    """
+    STATUS_CHOICES = [
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+
+    workflow = models.ForeignKey(Workflow, on_delete=models.CASCADE, related_name='runs')
+    started_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='workflow_runs')
+    backend = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='RUNNING')
+    input = models.TextField(blank=True)
+    output = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Run of {self.workflow.name} ({self.status})"
+
+class WorkflowStepRun(BaseModel):
+    """
+    One step of a WorkflowRun. Steps sharing an ``order`` run concurrently;
+    ``queued_ms`` is the time between the start of the run and of the step.
+    """
+    STATUS_CHOICES = [
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+        ('SKIPPED', 'Skipped'),
+    ]
+
+    run = models.ForeignKey(WorkflowRun, on_delete=models.CASCADE, related_name='step_runs')
+    step = models.ForeignKey(WorkflowStep, on_delete=models.SET_NULL, null=True, related_name='runs')
+    prompt = models.ForeignKey(Prompt, on_delete=models.SET_NULL, null=True, related_name='step_runs')
+    order = models.PositiveIntegerField()
+    name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    output = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    queued_ms = models.PositiveIntegerField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['order', 'started_at']
+
+    def __str__(self):
+        return f"Step {self.order} of run {self.run_id}"
+
+class HistoryRetentionPolicy(BaseModel):
+    """
+    How much prompt/workflow history an organization keeps. Enforced by the
+    prune_history command; empty limits are not applied.
+    """
+    organization = models.OneToOneField(Organization, on_delete=models.CASCADE, related_name='history_retention')
+    keep_last = models.PositiveIntegerField(null=True, blank=True, help_text='Newest versions always kept')
+    daily_after_days = models.PositiveIntegerField(
+        null=True, blank=True, help_text='Older versions are thinned to the last one of each day'
+    )
+    weekly_after_days = models.PositiveIntegerField(
+        null=True, blank=True, help_text='Older versions are thinned to the last one of each week'
+    )
+    max_bytes = models.PositiveIntegerField(
+        null=True, blank=True, help_text='Cap on stored history per prompt/workflow; oldest versions go first'
+    )
+
+    def __str__(self):
+        return f"History retention for {self.organization.name}"
+
+class HistoryOutbox(models.Model):
+    """
+    History rows waiting to be written, enqueued in the same transaction as
+    the change they describe and drained by promptbox.outbox.
+    """
+    KIND_CHOICES = [
+        ('prompt', 'Prompt'),
+        ('workflow', 'Workflow'),
+    ]
+
+    # Sequential so entries are drained in the order they were written
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.UUIDField()
+    snapshot = models.JSONField()
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    change_summary = models.CharField(max_length=255)
+    operations = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'object_id'], name='history_outbox_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"Pending {self.kind} history for {self.object_id}"
+
+class WorkflowAccess(models.Model):
+    """
+    Denormalized visibility index for workflows. Same layout as PromptAccess.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    workflow = models.ForeignKey(Workflow, on_delete=models.CASCADE, related_name='access_entries')
+    principal_type = models.CharField(max_length=20, choices=PromptAccess.PRINCIPAL_CHOICES)
+    principal_id = models.UUIDField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['principal_id', 'workflow'], name='unique_workflow_access'),
+        ]
+
+    def __str__(self):
+        return f"{self.principal_type} {self.principal_id} can see {self.workflow_id}"
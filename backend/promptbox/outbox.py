@@ -0,0 +1,151 @@
+"""
+Transactional outbox for prompt and workflow history.
+
+Writers enqueue (object, snapshot) entries in the same transaction as the
+change they describe: one INSERT, no reads of the existing history chain.
+The entries are turned into history rows in batches, in the order they were
+enqueued, by a background thread woken when the transaction commits
+(``PROMPTBOX_HISTORY_OUTBOX_THREAD``) or by the ``process_history_outbox``
+worker command.
+
+Readers of history call ``flush`` first, which writes the pending entries
+of the objects they are about to read, so the API always sees its own
+writes even when no worker is running.
+
+Draining is serialized within a process by ``_drain_lock``: ``select_for_update``
+is a no-op on SQLite, so the thread and a request's ``flush`` would
+otherwise write the same entries twice. Across processes the row locks
+(PostgreSQL) or the database lock (SQLite) keep drainers apart; ``flush``
+gives up on a lock conflict and leaves the entries to the other drainer.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+
+from .history import prompt_history, workflow_history
+from .models import HistoryOutbox
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+STORES = {store.field: store for store in (prompt_history, workflow_history)}
+
+
+def enqueue(store, entries):
+    """
+    Queue history rows for ``store``. ``entries`` is a list of (parent_id,
+    snapshot, fields) like ``HistoryStore.record_many`` takes; ``fields`` may
+    hold ``changed_by``, ``change_summary`` and (for workflows) ``operations``.
+    """
+    rows = [
+        HistoryOutbox(kind=store.field, object_id=parent_id, snapshot=snapshot, **fields)
+        for parent_id, snapshot, fields in entries
+    ]
+    if rows:
+        HistoryOutbox.objects.bulk_create(rows)
+        transaction.on_commit(wake)
+    return rows
+
+
+def drain(batch_size=BATCH_SIZE, store=None, parent_ids=None, skip_locked=False):
+    """
+    Write pending entries as history rows, oldest first, one transaction per
+    batch. Optionally limited to one store and some of its objects. Returns
+    the number of entries processed.
+    """
+    pending = HistoryOutbox.objects.order_by('id')
+    if store is not None:
+        pending = pending.filter(kind=store.field)
+    if parent_ids is not None:
+        pending = pending.filter(object_id__in=list(parent_ids))
+
+    processed = 0
+    with _drain_lock:
+        while True:
+            with transaction.atomic():
+                batch = list(pending.select_for_update(skip_locked=skip_locked)[:batch_size])
+                if not batch:
+                    return processed
+                write(batch)
+                HistoryOutbox.objects.filter(id__in=[entry.id for entry in batch]).delete()
+            processed += len(batch)
+
+
+def write(batch):
+    by_kind = {}
+    for entry in batch:
+        by_kind.setdefault(entry.kind, []).append(entry)
+    for kind, entries in by_kind.items():
+        store = STORES[kind]
+        # Objects deleted since the change have no history left to extend
+        parent_model = store.model._meta.get_field(store.field).related_model
+        existing = set(parent_model.objects.filter(
+            id__in={entry.object_id for entry in entries}
+        ).values_list('id', flat=True))
+        store.record_many([
+            (entry.object_id, entry.snapshot, fields(entry))
+            for entry in entries if entry.object_id in existing
+        ])
+
+
+def fields(entry):
+    fields = {
+        'changed_by_id': entry.changed_by_id,
+        'change_summary': entry.change_summary,
+        'created_at': entry.created_at,
+    }
+    # Only workflow history records step operations
+    if entry.operations is not None:
+        fields['operations'] = entry.operations
+    return fields
+
+
+def flush(store, parent_ids=None):
+    """Write pending entries of ``store`` (for ``parent_ids``, if given) before reading history."""
+    if parent_ids is not None:
+        parent_ids = list(parent_ids)
+        if not parent_ids:
+            return 0
+    pending = HistoryOutbox.objects.filter(kind=store.field)
+    if parent_ids is not None:
+        pending = pending.filter(object_id__in=parent_ids)
+    if not pending.exists():
+        return 0
+    try:
+        return drain(store=store, parent_ids=parent_ids)
+    except DatabaseError:
+        # Another process is draining (SQLite has no row locks); its rows appear once it commits
+        logger.warning('Flushing queued history failed; leaving it to the other drainer', exc_info=True)
+        return 0
+
+
+_drain_lock = threading.Lock()
+_wakeup = threading.Event()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def wake():
+    """Start or wake the in-process drainer (a no-op when a worker command does the draining)."""
+    global _thread
+    if not getattr(settings, 'PROMPTBOX_HISTORY_OUTBOX_THREAD', True):
+        return
+    with _thread_lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name='promptbox-history-outbox', daemon=True)
+            _thread.start()
+    _wakeup.set()
+
+
+def _run():
+    while True:
+        _wakeup.wait()
+        _wakeup.clear()
+        close_old_connections()
+        try:
+            drain(skip_locked=True)
+        except Exception:
+            # Entries stay queued; the next wake-up or the worker command retries them
+            logger.exception('Writing queued history failed')
@@ -0,0 +1,188 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework import filters, pagination
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Keyset (seek) pagination on the view's ordering field plus ``id`` as a
+    tiebreaker. Each page is a single indexed range query: no COUNT(*) and no
+    OFFSET, so walking deep pages costs the same as the first one.
+
+    Cursors are opaque base64 tokens encoding the boundary row and direction.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, page_size=None, page_size_query_param=None, max_page_size=None):
+        if page_size is not None:
+            self.page_size = page_size
+        if page_size_query_param is not None:
+            self.page_size_query_param = page_size_query_param
+        if max_page_size is not None:
+            self.max_page_size = max_page_size
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+            if size > 0:
+                return min(size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    @staticmethod
+    def get_ordering(request, queryset, view):
+        """
+        Return (field, descending) from the view's ``ordering`` parameter or
+        default. Orderings a keyset cannot follow are rejected rather than
+        silently replaced: unknown fields, more than one field, computed
+        fields, and querysets already ordered by something else (search
+        relevance).
+        """
+        ordering_filter = filters.OrderingFilter()
+        param = request.query_params.get(ordering_filter.ordering_param)
+        if param:
+            requested = [term.strip() for term in param.split(',') if term.strip()]
+            ordering = ordering_filter.remove_invalid_fields(queryset, requested, view, request)
+            if ordering != requested or len(ordering) != 1:
+                valid = [name for name, _ in ordering_filter.get_valid_fields(queryset, view, {'request': request})]
+                raise ParseError(f'Cursor pagination orders by a single field, one of: {", ".join(valid)}')
+        else:
+            ordering = ordering_filter.get_default_ordering(view) or ['id']
+        field = ordering[0].lstrip('-')
+
+        try:
+            queryset.model._meta.get_field(field)
+        except FieldDoesNotExist:
+            raise ParseError(f'Cursor pagination cannot order by {field}')
+        current = queryset.query.order_by
+        if current and str(current[0]).lstrip('-') != field:
+            raise ParseError('Cursor pagination cannot follow search relevance; pass an explicit ordering')
+        return field, ordering[0].startswith('-')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, queryset, view)
+        model_field = queryset.model._meta.get_field(self.field)
+        pk_field = queryset.model._meta.pk
+
+        cursor = self.decode_cursor(request, model_field, pk_field)
+        reverse = bool(cursor and cursor['reverse'])
+        # Walking backwards is the same query with every comparison flipped
+        descending = self.descending != reverse
+
+        if cursor is not None:
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}': cursor['value']}) |
+                Q(**{self.field: cursor['value'], f'pk__{lookup}': cursor['pk']})
+            )
+
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}pk')
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = cursor is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = results
+        return results
+
+    def decode_cursor(self, request, model_field, pk_field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            return {
+                'value': model_field.to_python(payload['v']),
+                'pk': pk_field.to_python(payload['pk']),
+                'reverse': bool(payload.get('r')),
+            }
+        except (TypeError, ValueError, KeyError, ValidationError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        value = getattr(obj, self.field)
+        payload = {
+            'v': value.isoformat() if hasattr(value, 'isoformat') else value,
+            'pk': str(obj.pk),
+        }
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_page_state(self):
+        return (self.get_next_link(), self.get_previous_link())
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class StandardResultsSetPagination(pagination.PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset mode. Clients switch to it
+    with ``?pagination=cursor`` and then follow the returned next/previous links;
+    orderings the keyset cannot follow are a 400 in that mode.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    mode_query_param = 'pagination'
+
+    def cursor_requested(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor' or
+            KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.cursor_requested(request):
+            self.keyset = KeysetPagination(self.page_size, self.page_size_query_param, self.max_page_size)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_page_state(self):
+        """Everything besides the rows that shapes the paginated response (used for ETags)."""
+        if self.keyset is not None:
+            return self.keyset.get_page_state()
+        return (self.page.paginator.count, self.get_next_link(), self.get_previous_link())
@@ -0,0 +1,20 @@
+"""
+Password hashing for the user import's process pool.
+
+Pool workers are started fresh (forkserver or spawn, never a fork of a
+threaded server process), so they import this module by name and unpickle
+``hash_password`` from it. It must therefore not import promptbox models
+or anything else that needs configured Django settings.
+"""
+import multiprocessing
+
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def hash_password(hasher, password):
+    """What ``User.set_password`` stores for ``hasher`` (an instance from ``get_hasher``)."""
+    return hasher.encode(password, hasher.salt())
+
+
+def pool_context():
+    return multiprocessing.get_context(START_METHOD)
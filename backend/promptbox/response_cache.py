@@ -0,0 +1,139 @@
+"""
+Invalidation-aware cache for serialized list responses.
+
+Entries are keyed by the caller's membership fingerprint, the normalized
+request URL and a generation number per (organization, scope). Signals bump
+the generation of exactly the organization and scope a write touches, which
+orphans the affected entries; they then age out of the cache's LRU / TTL
+bounds (see the ``responses`` alias in settings.CACHES). A write inside a
+transaction bumps the generation again when it commits.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from .membership import as_uuid, get_membership
+
+CACHE_ALIAS = 'responses'
+KEY_PREFIX = 'promptbox:list'
+STATS_KEYS = ('hits', 'misses', 'stores', 'invalidations')
+
+
+def get_cache():
+    return caches[CACHE_ALIAS if CACHE_ALIAS in settings.CACHES else 'default']
+
+
+def _generation_key(scope, organization_id):
+    return f'{KEY_PREFIX}:gen:{scope}:{organization_id}'
+
+
+def get_generations(scope, organization_ids):
+    """
+    Return the current generation of every organization for ``scope``. A
+    missing generation (never set, or evicted) is replaced by a fresh unique
+    value, so an eviction can never bring back entries from an older one.
+    """
+    cache = get_cache()
+    keys = sorted(_generation_key(scope, org_id) for org_id in organization_ids)
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def invalidate(scopes, organization_ids):
+    """Orphan cached list responses of ``scopes`` for the given organizations."""
+    cache = get_cache()
+    keys = [
+        _generation_key(scope, org_id)
+        for scope in scopes for org_id in organization_ids if org_id is not None
+    ]
+    if not keys:
+        return
+    cache.set_many({key: time.time_ns() for key in keys}, timeout=None)
+    _count('invalidations', len(keys))
+    if transaction.get_connection().in_atomic_block:
+        # Until the write commits, other requests still read the old rows and
+        # would cache them under the new generation; orphan those once it does
+        transaction.on_commit(lambda: cache.set_many({key: time.time_ns() for key in keys}, timeout=None))
+
+
+def _count(name, amount=1):
+    cache = get_cache()
+    key = f'{KEY_PREFIX}:stats:{name}'
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, amount)
+
+
+def stats():
+    cache = get_cache()
+    values = cache.get_many([f'{KEY_PREFIX}:stats:{name}' for name in STATS_KEYS])
+    result = {name: values.get(f'{KEY_PREFIX}:stats:{name}', 0) for name in STATS_KEYS}
+    lookups = result['hits'] + result['misses']
+    result['hit_ratio'] = round(result['hits'] / lookups, 4) if lookups else None
+    return result
+
+
+class CachedListMixin:
+    """
+    Serves ``list`` from the response cache. Views set ``cache_scope`` to the
+    invalidation scope their rows belong to. Cached entries keep their ETag,
+    so conditional requests still short-circuit.
+    """
+    cache_scope = None
+
+    def get_list_cache_key(self):
+        request = self.request
+        membership = get_membership(request.user, request)
+        org_id = request.query_params.get('organization_id')
+        if org_id and membership.is_member(org_id):
+            org_ids = [as_uuid(org_id)]
+        else:
+            org_ids = membership.org_ids
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        parts = [
+            membership.fingerprint,
+            request.get_host(),
+            request.path,
+            params,
+            *get_generations(self.cache_scope, org_ids),
+        ]
+        digest = hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+        return f'{KEY_PREFIX}:{self.cache_scope}:{digest}'
+
+    def list(self, request, *args, **kwargs):
+        cache = get_cache()
+        key = self.get_list_cache_key()
+        entry = cache.get(key)
+        if entry is not None:
+            _count('hits')
+            data, etag, last_modified = entry
+            if etag:
+                modified = (
+                    datetime.fromtimestamp(last_modified, tz=dt_timezone.utc) if last_modified else None
+                )
+                early = self.evaluate_preconditions(etag, modified)
+                if early is not None:
+                    return early
+                return self.set_validators(Response(data), etag, modified)
+            return Response(data)
+
+        _count('misses')
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            last_modified = parse_http_date_safe(response.get('Last-Modified', ''))
+            cache.set(key, (response.data, response.get('ETag'), last_modified))
+            _count('stores')
+        return response
@@ -0,0 +1,193 @@
+"""
+Workflow execution.
+
+Steps run by ``order``. Steps that share an order value run concurrently on
+an asyncio loop, and every step receives the combined output of the group
+before it as its input. Events are produced as steps complete, so callers
+can stream them (see ``WorkflowViewSet.run``).
+
+The database is only used before the loop starts (loading the steps and
+creating the WorkflowRun) and after it ends (recording the step runs), so
+the loop never waits on the ORM. Model calls go through a backend from
+promptbox.backends.
+"""
+import asyncio
+import time
+from itertools import groupby
+
+from django.conf import settings
+from django.utils import timezone
+
+from .access import prompt_access
+from .backends import StepRequest
+from .models import Prompt, WorkflowRun, WorkflowStepRun
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+def compose(prompt_text, input_text):
+    """The text sent for a step: its prompt, followed by the input if there is one."""
+    return f'{prompt_text}\n\n{input_text}' if input_text else prompt_text
+
+
+async def cancel(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def elapsed_ms(since):
+    return int((time.perf_counter() - since) * 1000)
+
+
+class WorkflowRunner:
+    def __init__(self, workflow, backend, user=None, principal_ids=None):
+        """
+        ``principal_ids`` (see promptbox.membership) limits the prompts the
+        run may read; steps whose prompt is not visible fail.
+        """
+        self.workflow = workflow
+        self.backend = backend
+        self.user = user
+        self.principal_ids = principal_ids
+        self.max_concurrency = getattr(settings, 'PROMPTBOX_RUNNER_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY)
+
+    def start(self, input_text=''):
+        steps = list(self.workflow.steps.select_related('prompt').only(
+            'id', 'workflow_id', 'order', 'name', 'prompt__id', 'prompt__name', 'prompt__prompt', 'prompt__model',
+        ).order_by('order', 'created_at'))
+        prompt_ids = {step.prompt_id for step in steps if step.prompt_id}
+        if self.principal_ids is not None:
+            prompts = prompt_access.visible(Prompt.objects.filter(id__in=prompt_ids), self.principal_ids)
+            prompt_ids = set(prompts.values_list('id', flat=True))
+        self.readable = prompt_ids
+
+        self.groups = [list(group) for _, group in groupby(steps, key=lambda step: step.order)]
+        self.step_runs = []
+        self.output = ''
+        self.run = WorkflowRun.objects.create(
+            workflow=self.workflow, started_by=self.user, backend=self.backend.name or type(self.backend).__name__,
+            input=input_text, started_at=timezone.now(),
+        )
+        return self.run
+
+    async def events(self):
+        """Yield a ``run`` event, then one ``step`` event per step as it completes."""
+        yield {
+            'event': 'run', 'run': str(self.run.id), 'workflow': str(self.workflow.id),
+            'backend': self.run.backend, 'steps': sum(len(group) for group in self.groups),
+        }
+        self.clock = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        input_text = self.run.input
+        failed = False
+        for group in self.groups:
+            if failed:
+                for step in group:
+                    step_run = self.step_run(step, 'SKIPPED', error='An earlier step failed.')
+                    yield self.step_event(step_run)
+                continue
+
+            tasks = [asyncio.ensure_future(self.execute(step, input_text, semaphore)) for step in group]
+            for next_done in asyncio.as_completed(tasks):
+                yield self.step_event(await next_done)
+
+            results = [task.result() for task in tasks]
+            failed = any(step_run.status == 'FAILED' for step_run in results)
+            input_text = '\n\n'.join(step_run.output for step_run in results)
+        self.output = '' if failed else input_text
+
+    async def execute(self, step, input_text, semaphore):
+        async with semaphore:
+            queued_ms = elapsed_ms(self.clock)
+            started_at, started = timezone.now(), time.perf_counter()
+            if step.prompt_id not in self.readable:
+                return self.step_run(step, 'FAILED', error='Prompt not found.', started_at=started_at, queued_ms=queued_ms)
+            request = StepRequest(
+                text=compose(step.prompt.prompt, input_text), model=step.prompt.model, step_name=step.name or step.prompt.name,
+            )
+            try:
+                output = await self.backend.complete(request)
+            except Exception as exc:
+                return self.step_run(
+                    step, 'FAILED', error=str(exc) or type(exc).__name__,
+                    started_at=started_at, queued_ms=queued_ms, duration_ms=elapsed_ms(started),
+                )
+            return self.step_run(
+                step, 'SUCCEEDED', output=output, started_at=started_at, queued_ms=queued_ms, duration_ms=elapsed_ms(started),
+            )
+
+    def step_run(self, step, status, **fields):
+        step_run = WorkflowStepRun(
+            run=self.run, step=step, prompt_id=step.prompt_id if step.prompt_id in self.readable else None,
+            order=step.order, name=step.name, status=status, **fields,
+        )
+        self.step_runs.append(step_run)
+        return step_run
+
+    @staticmethod
+    def step_event(step_run):
+        return {
+            'event': 'step', 'id': str(step_run.id), 'step': str(step_run.step_id), 'order': step_run.order,
+            'name': step_run.name, 'status': step_run.status, 'output': step_run.output, 'error': step_run.error,
+            'queued_ms': step_run.queued_ms, 'duration_ms': step_run.duration_ms,
+        }
+
+    def finish(self, error=None):
+        """Record the step runs and the outcome; returns the closing ``done`` event."""
+        WorkflowStepRun.objects.bulk_create(self.step_runs)
+        run = self.run
+        failed = error or any(step_run.status != 'SUCCEEDED' for step_run in self.step_runs)
+        run.status = 'FAILED' if failed else 'SUCCEEDED'
+        run.output = '' if failed else self.output
+        run.finished_at = timezone.now()
+        run.duration_ms = int((run.finished_at - run.started_at).total_seconds() * 1000)
+        run.save(update_fields=['status', 'output', 'finished_at', 'duration_ms', 'updated_at'])
+        return {
+            'event': 'done', 'run': str(run.id), 'status': run.status, 'output': run.output,
+            'duration_ms': run.duration_ms, 'error': error or '',
+        }
+
+    def stream(self, input_text=''):
+        """
+        Run the workflow, yielding events as they happen. A plain iterator,
+        so it can back a WSGI streaming response: the loop runs while the
+        next event is awaited.
+        """
+        self.start(input_text)
+        loop = asyncio.new_event_loop()
+        events = self.events()
+        try:
+            while True:
+                try:
+                    event = loop.run_until_complete(events.__anext__())
+                except StopAsyncIteration:
+                    break
+                yield event
+        except GeneratorExit:
+            # The client went away; record what completed
+            self.shutdown(loop, events)
+            self.finish(error='Cancelled.')
+            raise
+        except Exception as exc:
+            self.shutdown(loop, events)
+            yield self.finish(error=str(exc) or type(exc).__name__)
+            return
+        self.shutdown(loop, events)
+        yield self.finish()
+
+    @staticmethod
+    def shutdown(loop, events):
+        if loop.is_closed():
+            return
+        loop.run_until_complete(cancel(asyncio.all_tasks(loop)))
+        loop.run_until_complete(events.aclose())
+        loop.close()
+
+
+def run_workflow(workflow, backend, input_text='', user=None, principal_ids=None):
+    """Run ``workflow`` to completion and return its WorkflowRun."""
+    runner = WorkflowRunner(workflow, backend, user=user, principal_ids=principal_ids)
+    for _ in runner.stream(input_text):
+        pass
+    return runner.run
@@ -0,0 +1,189 @@
+"""
+Full-text search index for prompts.
+
+Prompts are indexed into a side table (``promptbox_prompt_fts``, created by
+migration 0008) holding the name, description, prompt body and category names
+of every prompt. On SQLite the table is an FTS5 virtual table; on PostgreSQL
+it holds a weighted ``tsvector``. Both backends expose the same interface, so the viewsets only
+deal with ``get_search_backend()``.
+"""
+import re
+
+from django.db import connection
+from rest_framework import filters
+
+from .models import Prompt, PromptCategory
+
+INDEX_TABLE = 'promptbox_prompt_fts'
+
+# Only word characters reach the database query, so user input can never
+# inject FTS5 / tsquery operators.
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERMS = 16
+BATCH_SIZE = 500
+
+
+def tokenize(term):
+    return TOKEN_RE.findall((term or '').lower())[:MAX_TERMS]
+
+
+def build_documents(prompt_ids):
+    """Return {prompt_id: (name, description, prompt, categories)} for the given prompts."""
+    documents = {}
+    rows = Prompt.objects.filter(id__in=prompt_ids).values_list('id', 'name', 'description', 'prompt')
+    for prompt_id, name, description, body in rows:
+        documents[prompt_id] = [name, description, body, []]
+
+    category_rows = PromptCategory.objects.filter(prompt_id__in=prompt_ids).values_list('prompt_id', 'category__name')
+    for prompt_id, category_name in category_rows:
+        if prompt_id in documents:
+            documents[prompt_id][3].append(category_name)
+
+    return {
+        prompt_id: (name, description, body, ' '.join(sorted(categories)))
+        for prompt_id, (name, description, body, categories) in documents.items()
+    }
+
+
+class BaseSearchBackend:
+    """
+    Index maintenance and matching shared by the backends, driven by the
+    vendor SQL below. ``index_key`` is what ``delete_sql`` looks a prompt up
+    by; ``match_sql`` and ``rank_sql`` (lower is a better match) get the
+    tokens joined into the engine's query syntax for their ``%s``.
+    """
+    vendor = None
+    delete_sql = None
+    insert_sql = None
+    token_format = '%s'
+    token_separator = ' '
+    match_sql = None
+    rank_sql = None
+
+    def index_prompts(self, prompt_ids):
+        """Refresh the index entries of the given prompts (removing deleted ones)."""
+        prompt_ids = list(prompt_ids)
+        for start in range(0, len(prompt_ids), BATCH_SIZE):
+            batch = prompt_ids[start:start + BATCH_SIZE]
+            documents = build_documents(batch)
+            with connection.cursor() as cursor:
+                self._delete(cursor, batch)
+                self._insert(cursor, documents)
+
+    def remove_prompts(self, prompt_ids):
+        prompt_ids = list(prompt_ids)
+        with connection.cursor() as cursor:
+            for start in range(0, len(prompt_ids), BATCH_SIZE):
+                self._delete(cursor, prompt_ids[start:start + BATCH_SIZE])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {INDEX_TABLE}')
+
+    def search(self, queryset, term):
+        """
+        Restrict ``queryset`` to prompts matching ``term`` and annotate each row
+        with ``search_rank`` (lower is a better match).
+        """
+        tokens = tokenize(term)
+        if not tokens:
+            return queryset
+        query = self.token_separator.join(self.token_format % token for token in tokens)
+        return queryset.extra(
+            select={'search_rank': self.rank_sql},
+            select_params=[query] * self.rank_sql.count('%s'),
+            tables=[INDEX_TABLE],
+            where=[f'{INDEX_TABLE}.prompt_id = {Prompt._meta.db_table}.id', self.match_sql],
+            params=[query],
+        )
+
+    def index_key(self, prompt_id):
+        return prompt_id
+
+    def index_row(self, prompt_id, document):
+        """Parameters of ``insert_sql`` for one prompt."""
+        return (prompt_id, *document)
+
+    def _delete(self, cursor, prompt_ids):
+        cursor.executemany(self.delete_sql, [(self.index_key(pid),) for pid in prompt_ids])
+
+    def _insert(self, cursor, documents):
+        cursor.executemany(self.insert_sql, [self.index_row(pid, document) for pid, document in documents.items()])
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """
+    FTS5 backend. The virtual table rowid is derived from the prompt UUID so
+    that refreshing a single prompt is a rowid lookup instead of a table scan.
+    """
+    vendor = 'sqlite'
+    # Column weights for bm25(): name, description, prompt, categories.
+    weights = (10.0, 4.0, 1.0, 6.0)
+    delete_sql = f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s'
+    insert_sql = (
+        f'INSERT INTO {INDEX_TABLE} (rowid, prompt_id, name, description, prompt, categories) '
+        'VALUES (%s, %s, %s, %s, %s, %s)'
+    )
+    # Every token is quoted and used as a prefix, so partially typed words match.
+    token_format = '"%s"*'
+    match_sql = f'{INDEX_TABLE} MATCH %s'
+    rank_sql = f'bm25({INDEX_TABLE}, 0, {", ".join(map(str, weights))})'
+
+    def index_key(self, prompt_id):
+        return prompt_id.int & ((1 << 63) - 1)
+
+    def index_row(self, prompt_id, document):
+        return (self.index_key(prompt_id), prompt_id.hex, *document)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """tsvector backend with a GIN index; name and categories weigh the most."""
+    vendor = 'postgresql'
+    config = 'simple'
+    delete_sql = f'DELETE FROM {INDEX_TABLE} WHERE prompt_id = ANY(%s)'
+    insert_sql = (
+        f'INSERT INTO {INDEX_TABLE} (prompt_id, document) VALUES (%s, '
+        f"setweight(to_tsvector('{config}', %s), 'A') || setweight(to_tsvector('{config}', %s), 'C') || "
+        f"setweight(to_tsvector('{config}', %s), 'D') || setweight(to_tsvector('{config}', %s), 'B'))"
+    )
+    token_format = "'%s':*"
+    token_separator = ' & '
+    match_sql = f"{INDEX_TABLE}.document @@ to_tsquery('{config}', %s)"
+    rank_sql = f"-ts_rank({INDEX_TABLE}.document, to_tsquery('{config}', %s))"
+
+    def _delete(self, cursor, prompt_ids):
+        # One statement per batch instead of one per prompt
+        cursor.execute(self.delete_sql, [list(prompt_ids)])
+
+
+BACKENDS = {
+    backend.vendor: backend for backend in (SQLiteSearchBackend, PostgresSearchBackend)
+}
+
+
+def get_search_backend(vendor=None):
+    """Return the search backend for the database in use, or None if unsupported."""
+    backend_class = BACKENDS.get(vendor or connection.vendor)
+    return backend_class() if backend_class else None
+
+
+class PromptSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter that answers ``?search=`` from the full-text index. Results are
+    ordered by relevance unless the client asked for an explicit ``ordering``.
+    Falls back to DRF's icontains search on databases without a backend.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        backend = get_search_backend()
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+
+        term = request.query_params.get(self.search_param, '')
+        if not tokenize(term):
+            return queryset
+
+        results = backend.search(queryset, term)
+        if 'ordering' not in request.query_params:
+            results = results.order_by('search_rank', *queryset.query.order_by)
+        return results
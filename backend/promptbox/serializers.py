@@ -1,15 +1,54 @@
+from django.db import models, transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
 from rest_framework import serializers
 from .models import (
     Organization, User, OrganizationMember, Team, TeamMember,
-    Category, Prompt, TeamPrompt, PromptCategory, Folder, PromptHistory,
-    Workflow, WorkflowStep, WorkflowTeam, WorkflowHistory
+    Category, Prompt, TeamPrompt, PromptCategory, Folder, PromptHistory, HistoryRetentionPolicy,
+    Workflow, WorkflowStep, WorkflowTeam, WorkflowHistory, WorkflowRun, WorkflowStepRun
 )
+from . import outbox as history_outbox
+from .deletion import delete_objects, delete_rows
+from .hierarchy import team_hierarchy
+from .history import prompt_history, workflow_history
+from .membership import get_membership
+
+PROMPT_PREVIEW_LENGTH = 200
+
+
+class DynamicFieldsMixin:
+    """
+    Trims the serialized fields to the ``fields`` / ``exclude`` sets the view
+    places in the serializer context (from ``?fields=`` and ``?exclude=``).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        only = self.context.get('fields')
+        exclude = self.context.get('exclude')
+        for name in list(self.fields):
+            if (only is not None and name not in only) or (exclude and name in exclude):
+                self.fields.pop(name)
 
 class FolderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Folder
         fields = '__all__'
 
+    def validate(self, attrs):
+        parent = attrs.get('parent')
+        if parent is not None and self.instance is not None and parent.path.startswith(self.instance.path):
+            raise serializers.ValidationError({'parent': 'A folder cannot be moved into itself or one of its subfolders.'})
+        organization = attrs.get('organization') or getattr(self.instance, 'organization', None)
+        if parent is not None and organization is not None and parent.organization_id != organization.pk:
+            raise serializers.ValidationError({'parent': 'The parent folder belongs to another organization.'})
+        return attrs
+
+
+class FolderTreeSerializer(FolderSerializer):
+    """A folder of ``FolderViewSet.tree``; ``children`` are filled in by the view."""
+    prompt_count = serializers.IntegerField(read_only=True)
+    subtree_prompt_count = serializers.IntegerField(read_only=True)
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -32,6 +71,10 @@ class UserManageSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'teams']
 
     def get_teams(self, obj):
+        # UserViewSet prefetches the page's memberships, already scoped and ordered
+        if hasattr(obj, 'active_team_memberships'):
+            return TeamSummarySerializer([member.team for member in obj.active_team_memberships], many=True).data
+
         request = self.context.get('request')
         org_id = None
         if request is not None:
@@ -71,12 +114,7 @@ class UserCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Authentication required')
 
         org_id = attrs.get('organization_id')
-        is_admin = OrganizationMember.objects.filter(
-            organization_id=org_id,
-            user=request.user,
-            role='ADMIN',
-        ).exists()
-        if not is_admin:
+        if not get_membership(request.user, request).is_admin(org_id):
             raise serializers.ValidationError('Admin role required to create users')
 
         return attrs
@@ -127,6 +165,15 @@ class TeamSerializer(serializers.ModelSerializer):
         model = Team
         fields = '__all__'
 
+    def validate(self, attrs):
+        parent = attrs.get('parent')
+        organization = attrs.get('organization') or getattr(self.instance, 'organization', None)
+        if parent is not None and organization is not None and parent.organization_id != organization.pk:
+            raise serializers.ValidationError({'parent': 'The parent team belongs to another organization.'})
+        if parent is not None and self.instance is not None and team_hierarchy.would_cycle(self.instance, parent):
+            raise serializers.ValidationError({'parent': 'A team cannot be placed under itself or one of its subteams.'})
+        return attrs
+
 class TeamMemberSerializer(serializers.ModelSerializer):
     user_email = serializers.ReadOnlyField(source='user.email')
     user_name = serializers.ReadOnlyField(source='user.name')
@@ -154,7 +201,42 @@ class TeamPromptSerializer(serializers.ModelSerializer):
         model = TeamPrompt
         fields = ['id', 'team', 'team_name']
 
-class PromptSerializer(serializers.ModelSerializer):
+def diff_relation(rows, key, wanted):
+    """
+    Compare loaded junction ``rows`` against the ``wanted`` target IDs.
+    Returns (pks of rows to delete, target IDs to insert).
+    """
+    current = {getattr(row, key): row.pk for row in rows}
+    wanted = list(dict.fromkeys(wanted))
+    keep = set(wanted)
+    return [pk for target, pk in current.items() if target not in keep], [t for t in wanted if t not in current]
+
+def lock_for_update(instance):
+    """
+    Lock ``instance``'s row until the transaction ends. If another write
+    committed since it was loaded (every write bumps ``updated_at``), reload
+    it and drop its prefetched relations, so diffs and the history "before"
+    snapshot start from the current state. Returns whether it was reloaded.
+    """
+    locked = type(instance)._base_manager.select_for_update().filter(pk=instance.pk)
+    if locked.values_list('updated_at', flat=True).get() == instance.updated_at:
+        return False
+    instance.refresh_from_db()
+    return True
+
+def build_prompt_snapshot(prompt):
+    return {
+        'name': prompt.name,
+        'description': prompt.description,
+        'prompt': prompt.prompt,
+        'model': prompt.model,
+        'visibility': prompt.visibility,
+        'folder': str(prompt.folder_id) if prompt.folder_id else None,
+        'category_ids': sorted([str(pc.category_id) for pc in prompt.prompt_categories.all()]),
+        'team_ids': sorted([str(tp.team_id) for tp in prompt.shared_teams.all()]),
+    }
+
+class PromptSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     categories = PromptCategorySerializer(source='prompt_categories', many=True, read_only=True)
     shared_teams = TeamPromptSerializer(many=True, read_only=True)
     created_by_name = serializers.ReadOnlyField(source='created_by.name')
@@ -167,13 +249,65 @@ class PromptSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'categories', 'shared_teams', 'folder'
         ]
 
-class PromptHistorySerializer(serializers.ModelSerializer):
+class PromptSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Lightweight list representation (``?view=summary``). Expects the queryset
+    to annotate ``prompt_preview`` and ``prompt_length`` instead of loading the body.
+    """
+    prompt_preview = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Prompt
+        fields = [
+            'id', 'organization', 'created_by', 'name', 'description',
+            'prompt_preview', 'model', 'visibility', 'folder', 'updated_at'
+        ]
+
+    def get_prompt_preview(self, obj):
+        if obj.prompt_length > len(obj.prompt_preview):
+            return obj.prompt_preview.rstrip() + '…'
+        return obj.prompt_preview
+
+class HistoryRetentionPolicySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = HistoryRetentionPolicy
+        fields = ['keep_last', 'daily_after_days', 'weekly_after_days', 'max_bytes', 'updated_at']
+        read_only_fields = ['updated_at']
+
+    def validate(self, attrs):
+        daily = attrs.get('daily_after_days', getattr(self.instance, 'daily_after_days', None))
+        weekly = attrs.get('weekly_after_days', getattr(self.instance, 'weekly_after_days', None))
+        if daily is not None and weekly is not None and weekly < daily:
+            raise serializers.ValidationError({'weekly_after_days': 'Must not be less than daily_after_days.'})
+        return attrs
+
+class HistoryListSerializer(serializers.ListSerializer):
+    """Reconstructs the snapshots of a whole page of history rows at once."""
+    def to_representation(self, data):
+        rows = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child.history_store.resolve(rows)
+        return super().to_representation(rows)
+
+class HistorySnapshotMixin:
+    """
+    History rows may only hold a delta (see promptbox.history); the snapshot
+    is rebuilt before the row is rendered.
+    """
+    history_store = None
+
+    def to_representation(self, instance):
+        self.history_store.resolve([instance])
+        return super().to_representation(instance)
+
+class PromptHistorySerializer(HistorySnapshotMixin, serializers.ModelSerializer):
     changed_by_name = serializers.ReadOnlyField(source='changed_by.name')
+    history_store = prompt_history
 
     class Meta:
         model = PromptHistory
+        list_serializer_class = HistoryListSerializer
         fields = [
-            'id', 'prompt', 'changed_by', 'changed_by_name',
+            'id', 'prompt', 'version', 'changed_by', 'changed_by_name',
             'change_summary', 'snapshot', 'created_at'
         ]
         read_only_fields = fields
@@ -195,64 +329,50 @@ class UpdatePromptSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
     def _build_snapshot(self, prompt):
-        return {
-            'name': prompt.name,
-            'description': prompt.description,
-            'prompt': prompt.prompt,
-            'model': prompt.model,
-            'visibility': prompt.visibility,
-            'folder': str(prompt.folder_id) if prompt.folder_id else None,
-            'category_ids': sorted([str(pc.category_id) for pc in prompt.prompt_categories.all()]),
-            'team_ids': sorted([str(tp.team_id) for tp in prompt.shared_teams.all()]),
-        }
+        return build_prompt_snapshot(prompt)
 
     def update(self, instance, validated_data):
         category_ids = validated_data.pop('category_ids', None)
         team_ids = validated_data.pop('team_ids', None)
 
-        # Build snapshot of old state
-        old_snapshot = self._build_snapshot(instance)
+        with transaction.atomic():
+            lock_for_update(instance)
+            # One read of the relations serves the snapshot and the diffs below
+            prefetch_related_objects([instance], 'prompt_categories', 'shared_teams')
+            old_snapshot = self._build_snapshot(instance)
+
+            changed_fields = []
+            for attr, value in validated_data.items():
+                old_value = getattr(instance, attr)
+                if old_value != value:
+                    changed_fields.append(attr)
+                    setattr(instance, attr, value)
+
+            if category_ids is not None:
+                stale, added = diff_relation(instance.prompt_categories.all(), 'category_id', category_ids)
+                if stale or added:
+                    changed_fields.append('categories')
+                    delete_rows(PromptCategory, stale)
+                    PromptCategory.objects.bulk_create(
+                        [PromptCategory(prompt=instance, category_id=cat_id) for cat_id in added]
+                    )
 
-        # Apply field updates
-        changed_fields = []
-        for attr, value in validated_data.items():
-            old_value = getattr(instance, attr)
-            if old_value != value:
-                changed_fields.append(attr)
-                setattr(instance, attr, value)
-        instance.save()
+            if team_ids is not None:
+                stale, added = diff_relation(instance.shared_teams.all(), 'team_id', team_ids)
+                if stale or added:
+                    changed_fields.append('teams')
+                    delete_rows(TeamPrompt, stale)
+                    TeamPrompt.objects.bulk_create([TeamPrompt(prompt=instance, team_id=tid) for tid in added])
 
-        # Update categories if provided
-        if category_ids is not None:
-            old_cat_ids = set(str(pc.category_id) for pc in instance.prompt_categories.all())
-            new_cat_ids = set(str(cid) for cid in category_ids)
-            if old_cat_ids != new_cat_ids:
-                changed_fields.append('categories')
-                instance.prompt_categories.all().delete()
-                for cat_id in category_ids:
-                    PromptCategory.objects.create(prompt=instance, category_id=cat_id)
-
-        # Update teams if provided
-        if team_ids is not None:
-            old_team_ids = set(str(tp.team_id) for tp in instance.shared_teams.all())
-            new_team_ids = set(str(tid) for tid in team_ids)
-            if old_team_ids != new_team_ids:
-                changed_fields.append('teams')
-                instance.shared_teams.all().delete()
-                for tid in team_ids:
-                    TeamPrompt.objects.create(prompt=instance, team_id=tid)
-
-        # Create history record if anything changed
-        if changed_fields:
-            request = self.context.get('request')
-            user = request.user if request else None
-            summary = 'Updated ' + ', '.join(changed_fields)
-            PromptHistory.objects.create(
-                prompt=instance,
-                changed_by=user,
-                change_summary=summary,
-                snapshot=old_snapshot,
-            )
+            # Saved last: its signals reindex the prompt, resync its access and
+            # evict list caches against the new relations, once for the whole edit
+            instance.save()
+
+            if changed_fields:
+                request = self.context.get('request')
+                user = request.user if request else None
+                summary = 'Updated ' + ', '.join(changed_fields)
+                history_outbox.enqueue(prompt_history, [(instance.pk, old_snapshot, {'changed_by': user, 'change_summary': summary})])
 
         return instance
 
@@ -287,6 +407,49 @@ class CreatePromptSerializer(serializers.ModelSerializer):
         return prompt
 
 
+class BulkPromptItemSerializer(serializers.ModelSerializer):
+    """
+    One entry of a bulk request. Foreign keys are plain UUIDs here; they are
+    resolved for the whole batch at once by promptbox.bulk.
+    """
+    OPERATIONS = ['create', 'update', 'delete']
+    CREATE_REQUIRED = ['organization', 'name', 'prompt', 'model']
+
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    id = serializers.UUIDField(required=False)
+    organization = serializers.UUIDField(required=False)
+    folder = serializers.UUIDField(required=False, allow_null=True)
+    category_ids = serializers.ListField(child=serializers.UUIDField(), required=False)
+    team_ids = serializers.ListField(child=serializers.UUIDField(), required=False)
+
+    class Meta:
+        model = Prompt
+        fields = [
+            'op', 'id', 'organization', 'name', 'description', 'prompt',
+            'model', 'visibility', 'category_ids', 'team_ids', 'folder'
+        ]
+        extra_kwargs = {
+            'name': {'required': False},
+            'prompt': {'required': False},
+            'model': {'required': False},
+        }
+
+    def validate(self, attrs):
+        op = attrs['op']
+        if op == 'create':
+            missing = [name for name in self.CREATE_REQUIRED if name not in attrs]
+            if missing:
+                raise serializers.ValidationError({name: 'This field is required.' for name in missing})
+            if 'id' in attrs:
+                raise serializers.ValidationError({'id': 'IDs are assigned by the server.'})
+        else:
+            if 'id' not in attrs:
+                raise serializers.ValidationError({'id': 'This field is required.'})
+            if 'organization' in attrs:
+                raise serializers.ValidationError({'organization': 'Prompts cannot change organization.'})
+        return attrs
+
+
 class WorkflowStepSerializer(serializers.ModelSerializer):
     prompt_name = serializers.ReadOnlyField(source='prompt.name')
 
@@ -303,7 +466,7 @@ class WorkflowTeamSerializer(serializers.ModelSerializer):
         fields = ['id', 'team', 'team_name']
 
 
-class WorkflowSerializer(serializers.ModelSerializer):
+class WorkflowSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     steps = WorkflowStepSerializer(many=True, read_only=True)
     shared_teams = WorkflowTeamSerializer(many=True, read_only=True)
     created_by_name = serializers.ReadOnlyField(source='created_by.name')
@@ -318,15 +481,66 @@ class WorkflowSerializer(serializers.ModelSerializer):
         ]
 
     def get_step_count(self, obj):
+        # Annotated by WorkflowViewSet; counted only for instances loaded elsewhere
+        if hasattr(obj, 'step_count'):
+            return obj.step_count
         return obj.steps.count()
 
 
+class WorkflowSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Lightweight list representation (``?view=summary``) without steps or teams.
+    Expects the queryset to annotate ``step_count``.
+    """
+    step_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Workflow
+        fields = [
+            'id', 'organization', 'created_by', 'name', 'description',
+            'visibility', 'updated_at', 'step_count'
+        ]
+
+
 class WorkflowStepInputSerializer(serializers.Serializer):
     prompt = serializers.UUIDField()
     order = serializers.IntegerField(min_value=0)
     name = serializers.CharField(max_length=255, allow_blank=True, default='')
 
 
+class WorkflowStepOperationSerializer(serializers.Serializer):
+    """
+    One step edit (see promptbox.steps). Steps are placed ``after`` another
+    step (``null`` for the start) or ``parallel_with`` one, joining its
+    group; inserts without a position are appended.
+    """
+    OPERATIONS = ['insert', 'move', 'remove', 'rename']
+
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    step = serializers.UUIDField(required=False)
+    prompt = serializers.UUIDField(required=False)
+    name = serializers.CharField(max_length=255, allow_blank=True, required=False)
+    after = serializers.UUIDField(required=False, allow_null=True)
+    parallel_with = serializers.UUIDField(required=False)
+
+    def validate(self, attrs):
+        op = attrs['op']
+        required = {'insert': ['prompt'], 'move': ['step'], 'remove': ['step'], 'rename': ['step', 'name']}[op]
+        missing = [name for name in required if name not in attrs]
+        if missing:
+            raise serializers.ValidationError({name: 'This field is required.' for name in missing})
+        if op == 'insert' and 'step' in attrs:
+            raise serializers.ValidationError({'step': 'IDs are assigned by the server.'})
+        if 'after' in attrs and 'parallel_with' in attrs:
+            raise serializers.ValidationError('Give either after or parallel_with, not both.')
+        placed = 'after' in attrs or 'parallel_with' in attrs
+        if op == 'move' and not placed:
+            raise serializers.ValidationError('A move needs after or parallel_with.')
+        if op in ('remove', 'rename') and placed:
+            raise serializers.ValidationError(f'A {op} does not take a position.')
+        return attrs
+
+
 class CreateWorkflowSerializer(serializers.ModelSerializer):
     team_ids = serializers.ListField(
         child=serializers.UUIDField(), write_only=True, required=False
@@ -357,6 +571,19 @@ class CreateWorkflowSerializer(serializers.ModelSerializer):
         return workflow
 
 
+def build_workflow_snapshot(workflow):
+    return {
+        'name': workflow.name,
+        'description': workflow.description,
+        'visibility': workflow.visibility,
+        'team_ids': sorted([str(wt.team_id) for wt in workflow.shared_teams.all()]),
+        'steps': [
+            {'prompt': str(s.prompt_id), 'order': s.order, 'name': s.name}
+            for s in workflow.steps.all()
+        ],
+    }
+
+
 class UpdateWorkflowSerializer(serializers.ModelSerializer):
     team_ids = serializers.ListField(
         child=serializers.UUIDField(), write_only=True, required=False
@@ -369,79 +596,109 @@ class UpdateWorkflowSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
     def _build_snapshot(self, workflow):
-        return {
-            'name': workflow.name,
-            'description': workflow.description,
-            'visibility': workflow.visibility,
-            'team_ids': sorted([str(wt.team_id) for wt in workflow.shared_teams.all()]),
-            'steps': [
-                {'prompt': str(s.prompt_id), 'order': s.order, 'name': s.name}
-                for s in workflow.steps.order_by('order')
-            ],
-        }
+        return build_workflow_snapshot(workflow)
+
+    def _apply_steps(self, instance, steps_data):
+        """
+        Rewrite the step list in place: rows are matched by position, so
+        unchanged steps are left alone, changed ones are updated and only the
+        surplus is inserted or deleted. Returns True if anything changed.
+        """
+        current = list(instance.steps.all())
+        wanted = [
+            (step['prompt'], step['order'], step.get('name', ''))
+            for step in steps_data
+        ]
+        changed = []
+        for row, (prompt_id, order, name) in zip(current, wanted):
+            if (row.prompt_id, row.order, row.name) != (prompt_id, order, name):
+                row.prompt_id, row.order, row.name = prompt_id, order, name
+                row.updated_at = timezone.now()
+                changed.append(row)
+        stale = [row.pk for row in current[len(wanted):]]
+        added = [
+            WorkflowStep(workflow=instance, prompt_id=prompt_id, order=order, name=name)
+            for prompt_id, order, name in wanted[len(current):]
+        ]
+
+        if changed:
+            WorkflowStep.objects.bulk_update(changed, ['prompt', 'order', 'name', 'updated_at'])
+        if stale:
+            # Past runs keep their step runs (step set to NULL)
+            delete_objects(WorkflowStep, stale)
+        WorkflowStep.objects.bulk_create(added)
+        return bool(changed or stale or added)
 
     def update(self, instance, validated_data):
         team_ids = validated_data.pop('team_ids', None)
         steps_data = validated_data.pop('steps', None)
 
-        old_snapshot = self._build_snapshot(instance)
-
-        changed_fields = []
-        for attr, value in validated_data.items():
-            if getattr(instance, attr) != value:
-                changed_fields.append(attr)
-                setattr(instance, attr, value)
-        instance.save()
-
-        if team_ids is not None:
-            old_team_ids = set(str(wt.team_id) for wt in instance.shared_teams.all())
-            new_team_ids = set(str(tid) for tid in team_ids)
-            if old_team_ids != new_team_ids:
-                changed_fields.append('teams')
-                instance.shared_teams.all().delete()
-                for tid in team_ids:
-                    WorkflowTeam.objects.create(workflow=instance, team_id=tid)
-
-        if steps_data is not None:
-            old_steps = [
-                {'prompt': str(s.prompt_id), 'order': s.order, 'name': s.name}
-                for s in instance.steps.order_by('order')
-            ]
-            new_steps = [
-                {'prompt': str(s['prompt']), 'order': s['order'], 'name': s.get('name', '')}
-                for s in steps_data
-            ]
-            if old_steps != new_steps:
+        with transaction.atomic():
+            lock_for_update(instance)
+            # One read of the relations serves the snapshot and the diffs below
+            prefetch_related_objects([instance], 'shared_teams', 'steps')
+            old_snapshot = self._build_snapshot(instance)
+
+            changed_fields = []
+            for attr, value in validated_data.items():
+                if getattr(instance, attr) != value:
+                    changed_fields.append(attr)
+                    setattr(instance, attr, value)
+
+            if team_ids is not None:
+                stale, added = diff_relation(instance.shared_teams.all(), 'team_id', team_ids)
+                if stale or added:
+                    changed_fields.append('teams')
+                    delete_rows(WorkflowTeam, stale)
+                    WorkflowTeam.objects.bulk_create([WorkflowTeam(workflow=instance, team_id=tid) for tid in added])
+
+            if steps_data is not None and self._apply_steps(instance, steps_data):
                 changed_fields.append('steps')
-                instance.steps.all().delete()
-                for step in steps_data:
-                    WorkflowStep.objects.create(
-                        workflow=instance,
-                        prompt_id=step['prompt'],
-                        order=step['order'],
-                        name=step.get('name', ''),
-                    )
 
-        if changed_fields:
-            request = self.context.get('request')
-            user = request.user if request else None
-            WorkflowHistory.objects.create(
-                workflow=instance,
-                changed_by=user,
-                change_summary='Updated ' + ', '.join(changed_fields),
-                snapshot=old_snapshot,
-            )
+            # Saved last: its signals resync access and caches against the new relations
+            instance.save()
+
+            if changed_fields:
+                request = self.context.get('request')
+                user = request.user if request else None
+                summary = 'Updated ' + ', '.join(changed_fields)
+                history_outbox.enqueue(workflow_history, [(instance.pk, old_snapshot, {'changed_by': user, 'change_summary': summary})])
 
         return instance
 
 
-class WorkflowHistorySerializer(serializers.ModelSerializer):
+class WorkflowHistorySerializer(HistorySnapshotMixin, serializers.ModelSerializer):
     changed_by_name = serializers.ReadOnlyField(source='changed_by.name')
+    history_store = workflow_history
 
     class Meta:
         model = WorkflowHistory
+        list_serializer_class = HistoryListSerializer
         fields = [
-            'id', 'workflow', 'changed_by', 'changed_by_name',
-            'change_summary', 'snapshot', 'created_at'
+            'id', 'workflow', 'version', 'changed_by', 'changed_by_name',
+            'change_summary', 'operations', 'snapshot', 'created_at'
+        ]
+        read_only_fields = fields
+
+
+class WorkflowStepRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WorkflowStepRun
+        fields = [
+            'id', 'step', 'prompt', 'order', 'name', 'status', 'output', 'error',
+            'started_at', 'queued_ms', 'duration_ms'
+        ]
+        read_only_fields = fields
+
+
+class WorkflowRunSerializer(serializers.ModelSerializer):
+    started_by_name = serializers.ReadOnlyField(source='started_by.name')
+    step_runs = WorkflowStepRunSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = WorkflowRun
+        fields = [
+            'id', 'workflow', 'started_by', 'started_by_name', 'backend', 'status', 'input', 'output',
+            'started_at', 'finished_at', 'duration_ms', 'step_runs'
         ]
         read_only_fields = fields
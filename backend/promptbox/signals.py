@@ -1,6 +1,16 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete
 from django.dispatch import receiver
-from .models import Organization, OrganizationMember, Team, TeamMember
+from django.utils import timezone
+from .models import (
+    Organization, OrganizationMember, Team, TeamMember, Category, Prompt, PromptCategory,
+    TeamPrompt, Folder, Workflow, WorkflowStep, WorkflowTeam
+)
+from .access import prompt_access, workflow_access
+from .folders import assign_path, move_subtree
+from .hierarchy import team_hierarchy
+from .membership import invalidate_membership
+from . import response_cache
+from .search import get_search_backend
 
 @receiver(post_save, sender=Organization)
 def create_default_team(sender, instance, created, **kwargs):
@@ -11,6 +21,15 @@ def create_default_team(sender, instance, created, **kwargs):
             description=f"Default team for {instance.name}"
         )
 
+@receiver(post_save, sender=Team)
+def sync_team_closure(sender, instance, **kwargs):
+    team_hierarchy.sync_subtree(instance)
+
+@receiver(post_delete, sender=Team)
+def resync_team_closure(sender, instance, **kwargs):
+    # The deleted team's children are roots now
+    team_hierarchy.sync(instance.organization_id)
+
 @receiver(post_save, sender=OrganizationMember)
 def add_member_to_default_team(sender, instance, created, **kwargs):
     if created:
@@ -34,3 +53,106 @@ def add_member_to_default_team(sender, instance, created, **kwargs):
                     # Let's use the same role for now, or 'MEMBER'.
                     # Usually default team implies general access. Let's use 'MEMBER' to be safe unless they are ADMIN.
                 )
+
+
+@receiver(pre_save, sender=Folder)
+def set_folder_path(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'parent' in update_fields:
+        instance._previous_path = assign_path(instance)
+
+@receiver(post_save, sender=Folder)
+def move_folder_subtree(sender, instance, update_fields=None, **kwargs):
+    previous_path = instance.__dict__.pop('_previous_path', None)
+    if update_fields is not None and 'parent' in update_fields and 'path' not in update_fields:
+        Folder.objects.filter(pk=instance.pk).update(path=instance.path, depth=instance.depth)
+    # Descendants follow a moved folder
+    move_subtree(previous_path, instance.path)
+
+@receiver(post_save, sender=Prompt)
+def index_prompt(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend:
+        backend.index_prompts([instance.pk])
+
+@receiver(post_delete, sender=Prompt)
+def unindex_prompt(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend:
+        backend.remove_prompts([instance.pk])
+
+@receiver(post_save, sender=PromptCategory)
+@receiver(post_delete, sender=PromptCategory)
+def reindex_prompt_categories(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if backend:
+        backend.index_prompts([instance.prompt_id])
+
+@receiver(post_save, sender=Category)
+def reindex_category_prompts(sender, instance, created, **kwargs):
+    # Category names are part of the indexed document
+    backend = get_search_backend()
+    if backend and not created:
+        prompt_ids = PromptCategory.objects.filter(category=instance).values_list('prompt_id', flat=True)
+        backend.index_prompts(prompt_ids)
+
+@receiver(post_save, sender=Prompt)
+def sync_prompt_access(sender, instance, **kwargs):
+    prompt_access.sync([instance.pk])
+
+@receiver(post_save, sender=TeamPrompt)
+@receiver(post_delete, sender=TeamPrompt)
+def sync_team_prompt_access(sender, instance, **kwargs):
+    prompt_access.sync([instance.prompt_id])
+
+@receiver(post_save, sender=Workflow)
+def sync_workflow_access(sender, instance, **kwargs):
+    workflow_access.sync([instance.pk])
+
+@receiver(post_save, sender=WorkflowTeam)
+@receiver(post_delete, sender=WorkflowTeam)
+def sync_workflow_team_access(sender, instance, **kwargs):
+    workflow_access.sync([instance.workflow_id])
+
+@receiver(post_save, sender=OrganizationMember)
+@receiver(post_delete, sender=OrganizationMember)
+@receiver(post_save, sender=TeamMember)
+@receiver(post_delete, sender=TeamMember)
+def invalidate_cached_membership(sender, instance, **kwargs):
+    invalidate_membership(instance.user_id)
+
+@receiver(pre_delete, sender=Category)
+def touch_categorized_prompts(sender, instance, **kwargs):
+    # Writes through the API bump the parent once themselves; a cascade
+    # from a deleted category or team removes junction rows behind their back
+    Prompt.objects.filter(prompt_categories__category=instance).update(updated_at=timezone.now())
+
+@receiver(pre_delete, sender=Team)
+def touch_shared_items(sender, instance, **kwargs):
+    now = timezone.now()
+    Prompt.objects.filter(shared_teams__team=instance).update(updated_at=now)
+    Workflow.objects.filter(shared_teams__team=instance).update(updated_at=now)
+
+# Response cache invalidation: (sender, scopes, how to find the organization)
+CACHE_DEPENDENCIES = [
+    (Prompt, ('prompts', 'workflows'), lambda i: i.organization_id),
+    (PromptCategory, ('prompts',), lambda i: Category.objects.filter(pk=i.category_id).values_list('organization_id', flat=True).first()),
+    (TeamPrompt, ('prompts',), lambda i: Team.objects.filter(pk=i.team_id).values_list('organization_id', flat=True).first()),
+    (Category, ('prompts',), lambda i: i.organization_id),
+    (Folder, ('folders', 'prompts'), lambda i: i.organization_id),
+    (Team, ('prompts', 'workflows'), lambda i: i.organization_id),
+    (Workflow, ('workflows',), lambda i: i.organization_id),
+    (WorkflowStep, ('workflows',), lambda i: Workflow.objects.filter(pk=i.workflow_id).values_list('organization_id', flat=True).first()),
+    (WorkflowTeam, ('workflows',), lambda i: Team.objects.filter(pk=i.team_id).values_list('organization_id', flat=True).first()),
+    (OrganizationMember, ('prompts', 'workflows', 'folders'), lambda i: i.organization_id),
+    (TeamMember, ('prompts', 'workflows', 'folders'), lambda i: Team.objects.filter(pk=i.team_id).values_list('organization_id', flat=True).first()),
+]
+
+def _connect_cache_invalidation(model, scopes, get_org_id):
+    def invalidate_list_cache(sender, instance, **kwargs):
+        response_cache.invalidate(scopes, [get_org_id(instance)])
+
+    post_save.connect(invalidate_list_cache, sender=model, weak=False, dispatch_uid=f'list_cache_{model.__name__}_save')
+    post_delete.connect(invalidate_list_cache, sender=model, weak=False, dispatch_uid=f'list_cache_{model.__name__}_delete')
+
+for _model, _scopes, _get_org_id in CACHE_DEPENDENCIES:
+    _connect_cache_invalidation(_model, _scopes, _get_org_id)
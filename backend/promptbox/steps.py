@@ -0,0 +1,189 @@
+"""
+Incremental edits of a workflow's step list.
+
+Steps sharing an ``order`` run together (see promptbox.runner), so an order
+key names a group. Keys placed here leave ``ORDER_GAP`` between groups and a
+step placed between two groups takes the midpoint of their keys, so an
+insert, move, remove or rename writes only the row it touches. When two
+neighbouring groups have no key left between them the workflow's groups are
+respaced once (one bulk update), and later edits have room again.
+
+Operations are applied in memory, in request order, and written in one
+transaction. The history entry keeps the operations next to the usual
+snapshot, whose delta only holds the steps that changed.
+"""
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from . import outbox as history_outbox
+from .access import prompt_access
+from .deletion import delete_objects
+from .history import workflow_history
+from .models import Prompt, Workflow, WorkflowStep
+from .serializers import build_workflow_snapshot
+
+ORDER_GAP = 1024
+MAX_OPERATIONS = 100
+
+
+class StepOperationError(ValueError):
+    def __init__(self, errors, index=None):
+        self.errors = errors
+        self.index = index
+        super().__init__(errors)
+
+
+class WorkflowStepEditor:
+    def __init__(self, workflow, user, principal_ids):
+        """``principal_ids`` (see promptbox.membership) limits the prompts that can be inserted."""
+        self.workflow = workflow
+        self.user = user
+        self.principal_ids = principal_ids
+
+    def run(self, operations):
+        """
+        Apply ``operations`` (validated WorkflowStepOperationSerializer data).
+        Returns the workflow with its steps reloaded, or raises
+        StepOperationError, in which case nothing is written.
+        """
+        with transaction.atomic():
+            # Concurrent edits would pick the same free keys
+            workflow = Workflow.objects.select_for_update().get(pk=self.workflow.pk)
+            prefetch_related_objects([workflow], 'shared_teams', 'steps')
+            snapshot = build_workflow_snapshot(workflow)
+            self.load(workflow)
+            prompts = self.insertable_prompts(operations)
+
+            for index, operation in enumerate(operations):
+                try:
+                    getattr(self, operation['op'])(operation, prompts)
+                except StepOperationError as exc:
+                    exc.index = index
+                    raise
+            self.write(workflow)
+            history_outbox.enqueue(workflow_history, [(workflow.pk, snapshot, {
+                'changed_by': self.user,
+                'change_summary': 'Updated steps: ' + ', '.join(dict.fromkeys(op['op'] for op in operations)),
+                'operations': self.records,
+            })])
+        workflow._prefetched_objects_cache = {}
+        return workflow
+
+    def load(self, workflow):
+        self.steps = sorted(workflow.steps.all(), key=lambda step: (step.order, step.created_at))
+        self.by_id = {step.pk: step for step in self.steps}
+        self.added = []
+        self.changed = set()
+        self.removed = []
+        self.records = []
+
+    def insertable_prompts(self, operations):
+        prompt_ids = {operation['prompt'] for operation in operations if operation['op'] == 'insert'}
+        if not prompt_ids:
+            return set()
+        prompts = Prompt.objects.filter(id__in=prompt_ids, organization_id=self.workflow.organization_id)
+        return set(prompt_access.visible(prompts, self.principal_ids).values_list('id', flat=True))
+
+    def get(self, step_id, field='step'):
+        step = self.by_id.get(step_id)
+        if step is None:
+            raise StepOperationError({field: ['Step not found.']})
+        return step
+
+    def place(self, operation, moving=None):
+        """The order key for a step positioned as ``operation`` asks."""
+        if 'parallel_with' in operation:
+            anchor = self.get(operation['parallel_with'], 'parallel_with')
+            if anchor is moving:
+                raise StepOperationError({'parallel_with': ['A step cannot be placed relative to itself.']})
+            return anchor.order
+        if 'after' not in operation:
+            anchor = max((step for step in self.steps if step is not moving), key=lambda step: step.order, default=None)
+        elif operation['after'] is None:
+            anchor = None
+        else:
+            anchor = self.get(operation['after'], 'after')
+            if anchor is moving:
+                raise StepOperationError({'after': ['A step cannot be placed relative to itself.']})
+
+        key = self.key_after(anchor, moving)
+        if key is None:
+            self.respace(moving)
+            key = self.key_after(anchor, moving)
+        return key
+
+    def key_after(self, anchor, moving):
+        """A free key between ``anchor``'s group (or the start) and the next group, if there is one."""
+        low = anchor.order if anchor is not None else -1
+        higher = [step.order for step in self.steps if step is not moving and step.order > low]
+        if not higher:
+            return max(low, 0) + ORDER_GAP
+        high = min(higher)
+        if high - low < 2:
+            return None
+        return low + (high - low) // 2
+
+    def respace(self, moving):
+        """Spread the groups ``ORDER_GAP`` apart, keeping their order."""
+        keys = sorted({step.order for step in self.steps if step is not moving})
+        new_keys = {key: (position + 1) * ORDER_GAP for position, key in enumerate(keys)}
+        respaced = [step for step in self.steps if step is not moving and step.order != new_keys[step.order]]
+        for step in respaced:
+            step.order = new_keys[step.order]
+            self.changed.add(step.pk)
+        self.records.append({'op': 'respace', 'steps': len(respaced)})
+
+    def insert(self, operation, prompts):
+        if operation['prompt'] not in prompts:
+            raise StepOperationError({'prompt': ['Prompt not found.']})
+        step = WorkflowStep(
+            workflow_id=self.workflow.pk, prompt_id=operation['prompt'],
+            name=operation.get('name', ''), order=self.place(operation),
+        )
+        self.steps.append(step)
+        self.by_id[step.pk] = step
+        self.added.append(step)
+        self.records.append({
+            'op': 'insert', 'step': str(step.pk), 'prompt': str(step.prompt_id), 'name': step.name, 'order': step.order,
+        })
+
+    def move(self, operation, prompts):
+        step = self.get(operation['step'])
+        before = step.order
+        step.order = self.place(operation, moving=step)
+        self.changed.add(step.pk)
+        self.records.append({'op': 'move', 'step': str(step.pk), 'from': before, 'order': step.order})
+
+    def remove(self, operation, prompts):
+        step = self.get(operation['step'])
+        self.steps.remove(step)
+        del self.by_id[step.pk]
+        if step in self.added:
+            self.added.remove(step)
+        else:
+            self.removed.append(step.pk)
+        self.changed.discard(step.pk)
+        self.records.append({
+            'op': 'remove', 'step': str(step.pk), 'prompt': str(step.prompt_id) if step.prompt_id else None, 'name': step.name,
+        })
+
+    def rename(self, operation, prompts):
+        step = self.get(operation['step'])
+        before, step.name = step.name, operation['name']
+        self.changed.add(step.pk)
+        self.records.append({'op': 'rename', 'step': str(step.pk), 'from': before, 'name': step.name})
+
+    def write(self, workflow):
+        now = timezone.now()
+        added = {step.pk for step in self.added}
+        changed = [step for step in self.steps if step.pk in self.changed and step.pk not in added]
+        for step in changed:
+            step.updated_at = now
+        if self.removed:
+            delete_objects(WorkflowStep, self.removed)
+        if changed:
+            WorkflowStep.objects.bulk_update(changed, ['order', 'name', 'updated_at'])
+        WorkflowStep.objects.bulk_create(self.added)
+        # bulk writes skip signals; saving the workflow resyncs access and caches
+        workflow.save(update_fields=['updated_at'])
@@ -0,0 +1,147 @@
+"""
+Prompt templates.
+
+``{{ name }}`` in a prompt's text is a variable; all other text, including
+other braces, is literal. A prompt is parsed once into a CompiledTemplate
+(literal pieces and the variable names between them) and kept in an
+in-process LRU keyed by (prompt ID, updated_at), so an edit naturally
+compiles a new entry and the old one ages out.
+
+Batch rendering reads variable rows from a CSV (header row = names) or JSON
+Lines stream and yields one NDJSON result per row, so neither the input nor
+the output is ever held in memory as a whole.
+"""
+import codecs
+import csv
+import json
+import re
+import threading
+from collections import OrderedDict
+
+VARIABLE_RE = re.compile(r'\{\{\s*([A-Za-z_]\w*)\s*\}\}')
+CACHE_SIZE = 1024
+MAX_ROWS = 100_000
+CSV_TYPES = ('text/csv',)
+JSONL_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-lines')
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class MissingVariables(TemplateError):
+    def __init__(self, names):
+        self.names = names
+        super().__init__(f'Missing variables: {", ".join(names)}')
+
+
+class CompiledTemplate:
+    __slots__ = ('literals', 'names', 'variables')
+
+    def __init__(self, text):
+        # split() alternates literal, name, literal, ..., literal
+        pieces = VARIABLE_RE.split(text)
+        self.literals = pieces[0::2]
+        self.names = pieces[1::2]
+        self.variables = tuple(dict.fromkeys(self.names))
+
+    def render(self, values):
+        missing = [name for name in self.variables if name not in values]
+        if missing:
+            raise MissingVariables(missing)
+        out = [self.literals[0]]
+        for name, literal in zip(self.names, self.literals[1:]):
+            value = values[name]
+            out.append('' if value is None else str(value))
+            out.append(literal)
+        return ''.join(out)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def get_template(prompt):
+    """The compiled template of ``prompt``, compiled at most once per version."""
+    key = (prompt.pk, prompt.updated_at)
+    with _cache_lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            _stats['hits'] += 1
+            return compiled
+        _stats['misses'] += 1
+
+    compiled = CompiledTemplate(prompt.prompt)
+    with _cache_lock:
+        _cache[key] = compiled
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def cache_info():
+    with _cache_lock:
+        return {'size': len(_cache), **_stats}
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+        _stats.update(hits=0, misses=0)
+
+
+def decode_lines(chunks):
+    """Text lines from an iterable of byte lines (e.g. a request body)."""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def read_rows(lines, content_type):
+    """
+    Yield (row number, values or error message) for each data row of a CSV
+    or JSON Lines stream. Row numbers count data rows from 1.
+    """
+    if content_type in CSV_TYPES:
+        reader = csv.DictReader(lines)
+        for number, row in enumerate(reader, start=1):
+            if None in row:
+                yield number, 'More values than columns.'
+            else:
+                yield number, row
+    elif content_type in JSONL_TYPES:
+        number = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield number, 'Invalid JSON.'
+                continue
+            yield number, row if isinstance(row, dict) else 'Each line must be a JSON object.'
+    else:
+        raise TemplateError(f'Unsupported content type: {content_type}')
+
+
+def render_rows(template, rows, max_rows=MAX_ROWS):
+    """Render ``rows`` (see read_rows) and yield one NDJSON line per row."""
+    for number, values in rows:
+        if number > max_rows:
+            yield json.dumps({'row': number, 'error': f'At most {max_rows} rows per request.'}) + '\n'
+            return
+        if isinstance(values, str):
+            yield json.dumps({'row': number, 'error': values}) + '\n'
+            continue
+        try:
+            yield json.dumps({'row': number, 'text': template.render(values)}) + '\n'
+        except TemplateError as exc:
+            yield json.dumps({'row': number, 'error': str(exc)}) + '\n'
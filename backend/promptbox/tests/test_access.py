@@ -0,0 +1,184 @@
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox.models import (
+    User, Organization, OrganizationMember, Team, TeamClosure, TeamMember, Prompt, PromptAccess, TeamPrompt,
+    Workflow, WorkflowTeam
+)
+
+class AccessIndexTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='viewer@example.com', password='password123', name='Viewer')
+        self.author = User.objects.create_user(email='author@example.com', password='password123', name='Author')
+        self.client.force_authenticate(user=self.user)
+
+        self.org = Organization.objects.create(name='Access Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='MEMBER')
+        OrganizationMember.objects.create(organization=self.org, user=self.author, role='MEMBER')
+
+        self.team = Team.objects.create(organization=self.org, name='Viewers')
+        self.other_team = Team.objects.create(organization=self.org, name='Others')
+        TeamMember.objects.create(team=self.team, user=self.user, role='MEMBER')
+
+    def _prompt(self, name, visibility, created_by=None, teams=()):
+        prompt = Prompt.objects.create(
+            organization=self.org, created_by=created_by or self.author, name=name,
+            prompt='Body', model='gpt-4', visibility=visibility,
+        )
+        for team in teams:
+            TeamPrompt.objects.create(team=team, prompt=prompt)
+        return prompt
+
+    def _names(self, **params):
+        response = self.client.get(reverse('prompt-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(p['name'] for p in response.data['results'])
+
+    def test_list_applies_fetch_rules_without_duplicates(self):
+        self._prompt('Public', 'PUBLIC')
+        self._prompt('Shared', 'TEAM', teams=[self.team, self.other_team])
+        self._prompt('Not shared', 'TEAM', teams=[self.other_team])
+        self._prompt('Mine', 'PRIVATE', created_by=self.user)
+        self._prompt('Theirs', 'PRIVATE')
+
+        self.assertEqual(self._names(), ['Mine', 'Public', 'Shared'])
+        self.assertEqual(self._names(visibility='TEAM'), ['Shared'])
+        self.assertEqual(self._names(visibility='PRIVATE'), ['Mine'])
+
+    def test_list_query_has_no_distinct(self):
+        self._prompt('Public', 'PUBLIC')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('prompt-list'))
+        prompt_queries = [q['sql'] for q in ctx.captured_queries if 'FROM "promptbox_prompt"' in q['sql']]
+        self.assertTrue(prompt_queries)
+        self.assertFalse(any('DISTINCT' in sql for sql in prompt_queries))
+
+    def test_index_follows_visibility_and_share_changes(self):
+        prompt = self._prompt('Moving', 'PRIVATE')
+        self.assertEqual(self._names(), [])
+
+        prompt.visibility = 'TEAM'
+        prompt.save()
+        share = TeamPrompt.objects.create(team=self.team, prompt=prompt)
+        self.assertEqual(self._names(), ['Moving'])
+
+        share.delete()
+        self.assertEqual(self._names(), [])
+
+        prompt.visibility = 'PUBLIC'
+        prompt.save()
+        self.assertEqual(list(PromptAccess.objects.filter(prompt=prompt).values_list('principal_type', flat=True)), ['ORGANIZATION'])
+
+    def test_team_membership_grants_access_immediately(self):
+        self._prompt('Other team', 'TEAM', teams=[self.other_team])
+        self.assertEqual(self._names(), [])
+
+        TeamMember.objects.create(team=self.other_team, user=self.user, role='MEMBER')
+        self.assertEqual(self._names(), ['Other team'])
+
+    def test_workflow_list_uses_access_index(self):
+        shared = Workflow.objects.create(organization=self.org, created_by=self.author, name='Shared flow', visibility='TEAM')
+        WorkflowTeam.objects.create(workflow=shared, team=self.team)
+        Workflow.objects.create(organization=self.org, created_by=self.author, name='Private flow', visibility='PRIVATE')
+
+        response = self.client.get(reverse('workflow-list'))
+        self.assertEqual([w['name'] for w in response.data['results']], ['Shared flow'])
+
+    def test_rebuild_command_repairs_drift(self):
+        prompt = self._prompt('Public', 'PUBLIC')
+        PromptAccess.objects.filter(prompt=prompt).delete()
+
+        out = StringIO()
+        call_command('rebuild_access_index', '--check', stdout=out)
+        self.assertIn('out of sync', out.getvalue())
+        self.assertFalse(PromptAccess.objects.filter(prompt=prompt).exists())
+
+        call_command('rebuild_access_index', stdout=StringIO())
+        self.assertTrue(PromptAccess.objects.filter(prompt=prompt).exists())
+
+
+class TeamHierarchyTests(APITestCase):
+    """Members of a team see what is shared with the teams below it."""
+    _prompt = AccessIndexTests._prompt
+    _names = AccessIndexTests._names
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='lead@example.com', password='password123', name='Lead')
+        self.author = User.objects.create_user(email='author@example.com', password='password123', name='Author')
+        self.client.force_authenticate(user=self.user)
+        self.org = Organization.objects.create(name='Hierarchy Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='MEMBER')
+        OrganizationMember.objects.create(organization=self.org, user=self.author, role='MEMBER')
+
+        self.team = Team.objects.create(organization=self.org, name='Viewers')
+        self.other_team = Team.objects.create(organization=self.org, name='Others')
+        TeamMember.objects.create(team=self.team, user=self.user, role='MEMBER')
+        self.child = Team.objects.create(organization=self.org, name='Child', parent=self.team)
+        self.grandchild = Team.objects.create(organization=self.org, name='Grandchild', parent=self.child)
+
+    def _ancestors(self, team):
+        return dict(TeamClosure.objects.filter(descendant=team).values_list('ancestor__name', 'depth'))
+
+    def test_closure_follows_parent_links(self):
+        self.assertEqual(self._ancestors(self.grandchild), {'Grandchild': 0, 'Child': 1, 'Viewers': 2})
+
+        self.grandchild.parent = self.other_team
+        self.grandchild.save()
+        self.assertEqual(self._ancestors(self.grandchild), {'Grandchild': 0, 'Others': 1})
+
+        self.child.delete()
+        self.assertFalse(TeamClosure.objects.filter(ancestor__name='Child').exists())
+
+    def test_parent_team_members_see_descendant_shares(self):
+        self._prompt('Deep', 'TEAM', teams=[self.grandchild])
+        self._prompt('Elsewhere', 'TEAM', teams=[self.other_team])
+        shared = Workflow.objects.create(organization=self.org, created_by=self.author, name='Deep flow', visibility='TEAM')
+        WorkflowTeam.objects.create(workflow=shared, team=self.grandchild)
+
+        self.assertEqual(self._names(), ['Deep'])
+        response = self.client.get(reverse('workflow-list'))
+        self.assertEqual([w['name'] for w in response.data['results']], ['Deep flow'])
+
+        # Children do not see what is shared with their parents
+        self._prompt('Top', 'TEAM', teams=[self.team])
+        self.client.force_authenticate(user=self.author)
+        TeamMember.objects.create(team=self.grandchild, user=self.author, role='MEMBER')
+        self.assertNotIn('Top', self._names(visibility='TEAM'))
+
+    def test_reparenting_and_deactivation_update_access(self):
+        self._prompt('Deep', 'TEAM', teams=[self.grandchild])
+        self.assertEqual(self._names(), ['Deep'])
+
+        self.child.is_active = False
+        self.child.save()
+        self.assertEqual(self._names(), [])
+
+        self.child.is_active = True
+        self.child.save()
+        self.grandchild.parent = self.other_team
+        self.grandchild.save()
+        self.assertEqual(self._names(), [])
+
+        self.other_team.parent = self.team
+        self.other_team.save()
+        self.assertEqual(self._names(), ['Deep'])
+
+    def test_team_cannot_move_under_its_subtree(self):
+        response = self.client.patch(reverse('team-detail', args=[self.team.id]), {'parent': str(self.grandchild.id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('parent', response.data)
+
+    def test_rebuild_closure_command_repairs_drift(self):
+        TeamClosure.objects.filter(descendant=self.grandchild).delete()
+        out = StringIO()
+        call_command('rebuild_team_closure', '--check', stdout=out)
+        self.assertIn('out of sync', out.getvalue())
+
+        call_command('rebuild_team_closure', stdout=StringIO())
+        self.assertEqual(self._ancestors(self.grandchild), {'Grandchild': 0, 'Child': 1, 'Viewers': 2})
@@ -0,0 +1,168 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox.models import (
+    User, Organization, OrganizationMember, Category, Folder, Prompt, PromptHistory, Workflow, WorkflowHistory,
+    HistoryOutbox
+)
+from promptbox import outbox
+from promptbox.history import prompt_history
+from promptbox.outbox import drain
+
+
+class AsOfTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='asof@example.com', password='password123', name='Time Traveller')
+        self.client.force_authenticate(user=self.user)
+        self.org = Organization.objects.create(name='As Of Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.old_category = Category.objects.create(organization=self.org, name='Old')
+        self.new_category = Category.objects.create(organization=self.org, name='New')
+        self.folder = Folder.objects.create(organization=self.org, name='Drafts')
+        self.base = timezone.now() - timedelta(days=30)
+
+    def _create_prompt(self, name='Version 0', **fields):
+        response = self.client.post(reverse('prompt-list'), {
+            'organization': str(self.org.id), 'name': name, 'prompt': 'Body', 'model': 'gpt-4', **fields,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return Prompt.objects.get(id=response.data['id'])
+
+    def _edit(self, prompt, count, **fields):
+        url = reverse('prompt-detail', args=[prompt.id])
+        for i in range(1, count + 1):
+            response = self.client.patch(url, {'name': f'Version {i}', **fields}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def _backdate(self, prompt):
+        """Created at ``base``; version N changed at ``base`` + N hours."""
+        drain()
+        Prompt.objects.filter(id=prompt.id).update(created_at=self.base)
+        for entry in PromptHistory.objects.filter(prompt=prompt):
+            PromptHistory.objects.filter(id=entry.id).update(created_at=self.base + timedelta(hours=entry.version))
+
+    def _at(self, hours):
+        return (self.base + timedelta(hours=hours)).isoformat()
+
+    def test_list_and_retrieve_return_past_state(self):
+        prompt = self._create_prompt(category_ids=[str(self.old_category.id)])
+        self._edit(prompt, 1, category_ids=[str(self.new_category.id)])
+        self._edit(prompt, 3)
+        self._backdate(prompt)
+
+        response = self.client.get(reverse('prompt-list'), {'as_of': self._at(0.5)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [result] = response.data['results']
+        self.assertEqual(result['name'], 'Version 0')
+        self.assertEqual([c['category_name'] for c in result['categories']], ['Old'])
+
+        response = self.client.get(reverse('prompt-detail', args=[prompt.id]), {'as_of': self._at(2.5)})
+        self.assertEqual(response.data['name'], 'Version 2')
+        self.assertEqual([c['category_name'] for c in response.data['categories']], ['New'])
+
+        # After the last change the live row is served
+        response = self.client.get(reverse('prompt-detail', args=[prompt.id]), {'as_of': self._at(10)})
+        self.assertEqual(response.data['name'], 'Version 3')
+
+    def test_objects_created_later_are_excluded(self):
+        prompt = self._create_prompt()
+        self._backdate(prompt)
+        self._create_prompt(name='Newcomer')
+
+        response = self.client.get(reverse('prompt-list'), {'as_of': self._at(1)})
+        self.assertEqual([result['id'] for result in response.data['results']], [str(prompt.id)])
+        response = self.client.get(reverse('prompt-detail', args=[prompt.id]), {'as_of': (self.base - timedelta(days=1)).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_folder_filter_uses_past_folder(self):
+        moved = self._create_prompt(name='Moved', folder=str(self.folder.id))
+        self.client.patch(reverse('prompt-detail', args=[moved.id]), {'folder': None}, format='json')
+        self._backdate(moved)
+        stayed = self._create_prompt(name='Stayed', folder=str(self.folder.id))
+        Prompt.objects.filter(id=stayed.id).update(created_at=self.base)
+
+        response = self.client.get(reverse('prompt-list'), {'folder_id': str(self.folder.id)})
+        self.assertEqual([result['name'] for result in response.data['results']], ['Stayed'])
+        response = self.client.get(reverse('prompt-list'), {'folder_id': str(self.folder.id), 'as_of': self._at(0.5)})
+        self.assertEqual(sorted(result['name'] for result in response.data['results']), ['Moved', 'Stayed'])
+        response = self.client.get(reverse('prompt-list'), {'folder_id': 'root', 'as_of': self._at(0.5)})
+        self.assertEqual(response.data['results'], [])
+
+    def test_folder_filter_does_not_rebuild_snapshots(self):
+        for i in range(3):
+            prompt = self._create_prompt(name=f'Elsewhere {i}')
+            self._edit(prompt, 2)
+            self._backdate(prompt)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('prompt-list'), {'folder_id': str(self.folder.id), 'as_of': self._at(1.5)})
+        self.assertEqual(response.data['results'], [])
+        # The past folder is compared in SQL; no history chain is loaded for an empty page
+        self.assertFalse(any('"delta"' in q['sql'] for q in ctx.captured_queries))
+
+    def test_only_the_page_flushes_queued_history(self):
+        first, second = self._create_prompt(name='A'), self._create_prompt(name='B')
+        self._backdate(first)
+        self._backdate(second)
+        Prompt.objects.filter(id=second.id).update(created_at=self.base + timedelta(minutes=1))
+        outbox.enqueue(prompt_history, [
+            (prompt.id, {'name': prompt.name, 'prompt': 'Body'}, {'change_summary': 'Updated name'})
+            for prompt in (first, second)
+        ])
+        Prompt.objects.filter(id__in=[first.id, second.id]).update(name='Renamed')
+
+        response = self.client.get(reverse('prompt-list'), {'as_of': self._at(1), 'page_size': 1, 'ordering': 'created_at'})
+        # The queued change on the page is written and read back; the other one waits for the drainer
+        self.assertEqual([result['name'] for result in response.data['results']], ['A'])
+        self.assertEqual(list(HistoryOutbox.objects.values_list('object_id', flat=True)), [second.id])
+
+    def test_query_count_does_not_grow_with_history_depth(self):
+        shallow = self._create_prompt(name='Shallow')
+        self._edit(shallow, 3)
+        self._backdate(shallow)
+        self.client.get(reverse('prompt-list'))
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('prompt-list'), {'as_of': self._at(1.5), 'page_size': 50})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(ctx.captured_queries)
+
+        before = count_queries()
+        deep = self._create_prompt(name='Deep')
+        self._edit(deep, 30)
+        self._backdate(deep)
+        self.client.get(reverse('prompt-list'))
+        self.assertEqual(count_queries(), before)
+
+    def test_workflow_as_of(self):
+        prompt = self._create_prompt()
+        response = self.client.post(reverse('workflow-list'), {
+            'organization': str(self.org.id), 'name': 'Flow v0',
+            'steps': [{'prompt': str(prompt.id), 'order': 1, 'name': 'First'}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        workflow = Workflow.objects.get(id=response.data['id'])
+        self.client.patch(reverse('workflow-detail', args=[workflow.id]), {
+            'name': 'Flow v1', 'steps': [],
+        }, format='json')
+        drain()
+        Workflow.objects.filter(id=workflow.id).update(created_at=self.base)
+        WorkflowHistory.objects.filter(workflow=workflow).update(created_at=self.base + timedelta(hours=1))
+
+        response = self.client.get(reverse('workflow-detail', args=[workflow.id]), {'as_of': self._at(0.5)})
+        self.assertEqual(response.data['name'], 'Flow v0')
+        self.assertEqual([(s['name'], s['prompt_name']) for s in response.data['steps']], [('First', 'Version 0')])
+        response = self.client.get(reverse('workflow-detail', args=[workflow.id]))
+        self.assertEqual(response.data['steps'], [])
+
+    def test_invalid_as_of(self):
+        response = self.client.get(reverse('prompt-list'), {'as_of': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('as_of', response.data)
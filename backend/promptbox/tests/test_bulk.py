@@ -0,0 +1,300 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox.access import prompt_access
+from promptbox.history import prompt_history
+from promptbox.bulk import delete_objects
+from promptbox.models import (
+    User, Organization, OrganizationMember, Team, Category, Folder, Prompt, PromptAccess, PromptCategory, PromptHistory,
+    TeamPrompt, Workflow, WorkflowRun, WorkflowStep, WorkflowStepRun, HistoryOutbox
+)
+from promptbox import outbox
+from promptbox.outbox import drain
+from promptbox.search import get_search_backend
+
+class BulkPromptTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='bulk@example.com', password='password123', name='Bulk')
+        self.client.force_authenticate(user=self.user)
+
+        self.org = Organization.objects.create(name='Bulk Org')
+        self.other_org = Organization.objects.create(name='Other Bulk Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.team = Team.objects.create(organization=self.org, name='Writers')
+        self.category = Category.objects.create(organization=self.org, name='Imported')
+        self.foreign_category = Category.objects.create(organization=self.other_org, name='Foreign')
+        self.url = reverse('prompt-bulk')
+
+    def _create_item(self, name, **extra):
+        return {
+            'op': 'create', 'organization': str(self.org.id), 'name': name,
+            'prompt': f'{name} body', 'model': 'gpt-4', 'visibility': 'PUBLIC', **extra,
+        }
+
+    def _post_creates(self, names):
+        items = [
+            self._create_item(name, category_ids=[str(self.category.id)], team_ids=[str(self.team.id)])
+            for name in names
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {'items': items}, format='json')
+        return response, len(ctx.captured_queries)
+
+    def test_bulk_create_writes_prompts_and_junctions(self):
+        response, small = self._post_creates([f'Imported {i}' for i in range(5)])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created'] * 5)
+        self.assertEqual(Prompt.objects.filter(created_by=self.user).count(), 5)
+        self.assertEqual(PromptCategory.objects.count(), 5)
+        self.assertEqual(TeamPrompt.objects.count(), 5)
+
+        # Writes are batched, so the query count does not grow with the item count
+        response, large = self._post_creates([f'Batch {i}' for i in range(50)])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(large, small)
+
+    def test_bulk_create_ignores_repeated_relation_ids(self):
+        item = self._create_item('Repeated', category_ids=[str(self.category.id)] * 2, team_ids=[str(self.team.id)] * 3)
+        response = self.client.post(self.url, {'items': [item]}, format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'created')
+        prompt = Prompt.objects.get(name='Repeated')
+        self.assertEqual(PromptCategory.objects.filter(prompt=prompt).count(), 1)
+        self.assertEqual(TeamPrompt.objects.filter(prompt=prompt).count(), 1)
+
+    def test_created_prompts_are_listed_and_searchable(self):
+        self.client.get(reverse('prompt-list'), {'organization_id': str(self.org.id)})
+        self.client.post(self.url, {'items': [self._create_item('Haystack needle')]}, format='json')
+
+        listed = self.client.get(reverse('prompt-list'), {'organization_id': str(self.org.id)})
+        self.assertEqual([p['name'] for p in listed.data['results']], ['Haystack needle'])
+        if get_search_backend() is not None:
+            found = self.client.get(reverse('prompt-list'), {'search': 'needle'})
+            self.assertEqual([p['name'] for p in found.data['results']], ['Haystack needle'])
+
+    def test_atomic_mode_writes_nothing_on_error(self):
+        items = [
+            self._create_item('Good'),
+            self._create_item('Bad', category_ids=[str(self.foreign_category.id)]),
+        ]
+        response = self.client.post(self.url, {'mode': 'atomic', 'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['results'][0]['status'], 'skipped')
+        self.assertIn('category_ids', response.data['results'][1]['errors'])
+        self.assertFalse(Prompt.objects.exists())
+
+    def test_best_effort_mode_writes_valid_items(self):
+        items = [
+            self._create_item('Good'),
+            {'op': 'create', 'name': 'Missing fields'},
+            self._create_item('Elsewhere', organization=str(self.other_org.id)),
+        ]
+        response = self.client.post(self.url, {'mode': 'best_effort', 'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'error', 'error'])
+        self.assertEqual(list(Prompt.objects.values_list('name', flat=True)), ['Good'])
+
+    def test_bulk_update_and_delete(self):
+        keep = Prompt.objects.create(organization=self.org, created_by=self.user, name='Keep', prompt='x', model='gpt-4')
+        drop = Prompt.objects.create(organization=self.org, created_by=self.user, name='Drop', prompt='x', model='gpt-4')
+        items = [
+            {'op': 'update', 'id': str(keep.id), 'name': 'Kept', 'visibility': 'TEAM', 'team_ids': [str(self.team.id)]},
+            {'op': 'delete', 'id': str(drop.id)},
+        ]
+        response = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        keep.refresh_from_db()
+        self.assertEqual(keep.name, 'Kept')
+        self.assertEqual(list(keep.shared_teams.values_list('team_id', flat=True)), [self.team.id])
+        self.assertFalse(Prompt.objects.filter(id=drop.id).exists())
+        drain()
+        history = PromptHistory.objects.get(prompt=keep)
+        self.assertEqual(history.snapshot['name'], 'Keep')
+        self.assertEqual(prompt_access.sync([keep.id], dry_run=True), (0, 0))
+
+    def test_invisible_prompts_cannot_be_changed(self):
+        other = User.objects.create_user(email='owner@example.com', password='password123', name='Owner')
+        private = Prompt.objects.create(
+            organization=self.org, created_by=other, name='Private', prompt='x', model='gpt-4', visibility='PRIVATE'
+        )
+        response = self.client.post(self.url, {'items': [{'op': 'delete', 'id': str(private.id)}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Prompt.objects.filter(id=private.id).exists())
+
+    def test_rejects_oversized_requests(self):
+        items = [self._create_item(f'P{i}') for i in range(501)]
+        response = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkRevertTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='revert@example.com', password='password123', name='Reverter')
+        self.client.force_authenticate(user=self.user)
+        self.org = Organization.objects.create(name='Revert Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.folder = Folder.objects.create(organization=self.org, name='Library')
+        self.good = Category.objects.create(organization=self.org, name='Good')
+        self.bad = Category.objects.create(organization=self.org, name='Bad')
+        self.url = reverse('prompt-bulk-revert')
+        self.as_of = timezone.now() - timedelta(hours=1)
+
+    def _library(self, count):
+        prompts = []
+        for i in range(count):
+            prompt = Prompt.objects.create(
+                organization=self.org, created_by=self.user, name=f'Prompt {i}', prompt='x', model='gpt-4', folder=self.folder,
+            )
+            PromptCategory.objects.create(prompt=prompt, category=self.good)
+            prompts.append(prompt)
+        Prompt.objects.filter(id__in=[p.id for p in prompts]).update(created_at=self.as_of - timedelta(hours=1))
+        return prompts
+
+    def _bad_edit(self, prompts):
+        items = [
+            {'op': 'update', 'id': str(p.id), 'name': f'Broken {i}', 'category_ids': [str(self.bad.id)]}
+            for i, p in enumerate(prompts)
+        ]
+        # The first prompt is also moved out of the folder
+        items[0]['folder'] = None
+        response = self.client.post(reverse('prompt-bulk'), {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        drain()
+
+    def _revert(self, **body):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, {'as_of': self.as_of.isoformat(), **body}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response, len(ctx.captured_queries)
+
+    def test_folder_revert_restores_state(self):
+        prompts = self._library(3)
+        self._bad_edit(prompts)
+
+        response, _ = self._revert(folder_id=str(self.folder.id))
+        drain()
+        self.assertEqual((response.data['reverted'], response.data['unchanged']), (3, 0))
+        self.assertEqual(response.data['results'][0]['changes'], ['name', 'folder', 'categories'])
+        for i, prompt in enumerate(prompts):
+            prompt.refresh_from_db()
+            self.assertEqual(prompt.name, f'Prompt {i}')
+            self.assertEqual(prompt.folder_id, self.folder.id)
+            self.assertEqual(list(prompt.prompt_categories.values_list('category_id', flat=True)), [self.good.id])
+            latest = PromptHistory.objects.filter(prompt=prompt).order_by('-version').first()
+            self.assertTrue(latest.change_summary.startswith('Reverted to state as of'))
+            self.assertEqual(prompt_history.snapshot(latest)['name'], f'Broken {i}')
+
+        # Reverting again finds nothing to change
+        response, _ = self._revert(folder_id=str(self.folder.id))
+        self.assertEqual(response.data['reverted'], 0)
+
+    def test_revert_flushes_only_its_scope(self):
+        prompts = self._library(2)
+        self._bad_edit(prompts)
+        outside = Prompt.objects.create(organization=self.org, created_by=self.user, name='Outside', prompt='x', model='gpt-4')
+        outbox.enqueue(prompt_history, [(outside.id, {'name': 'Outside', 'prompt': 'x'}, {'change_summary': 'Updated name'})])
+        outbox.enqueue(prompt_history, [(prompts[1].id, {'name': 'Queued', 'prompt': 'x'}, {'change_summary': 'Updated name'})])
+
+        self._revert(folder_id=str(self.folder.id))
+        queued = set(HistoryOutbox.objects.values_list('object_id', 'change_summary'))
+        self.assertIn((outside.id, 'Updated name'), queued)
+        self.assertNotIn((prompts[1].id, 'Updated name'), queued)
+
+    def test_dry_run_writes_nothing(self):
+        prompts = self._library(2)
+        self._bad_edit(prompts)
+        history_count = PromptHistory.objects.count()
+
+        response, _ = self._revert(organization_id=str(self.org.id), dry_run=True)
+        self.assertEqual(response.data['reverted'], 2)
+        self.assertEqual(Prompt.objects.filter(name__startswith='Broken').count(), 2)
+        self.assertEqual(PromptHistory.objects.count(), history_count)
+
+    def test_query_count_does_not_grow_with_scope(self):
+        small = self._library(3)
+        self._bad_edit(small)
+        _, small_queries = self._revert(ids=[str(p.id) for p in small])
+
+        large = self._library(30)
+        self._bad_edit(large)
+        _, large_queries = self._revert(ids=[str(p.id) for p in large])
+        self.assertLessEqual(large_queries, small_queries)
+
+    def test_newer_prompts_and_deleted_references(self):
+        [prompt] = self._library(1)
+        self._bad_edit([prompt])
+        newer = Prompt.objects.create(organization=self.org, created_by=self.user, name='Newer', prompt='x', model='gpt-4', folder=self.folder)
+        gone = self.good.id
+        self.good.delete()
+
+        response, _ = self._revert(folder_id=str(self.folder.id))
+        self.assertEqual(response.data['skipped'], 1)
+        by_id = {result['id']: result for result in response.data['results']}
+        self.assertEqual(by_id[str(newer.id)]['status'], 'skipped')
+        self.assertEqual(by_id[str(prompt.id)]['missing'], {'category_ids': [str(gone)]})
+        self.assertFalse(PromptCategory.objects.filter(prompt=prompt).exists())
+        newer.refresh_from_db()
+        self.assertEqual(newer.name, 'Newer')
+
+    def test_requires_scope_and_valid_timestamp(self):
+        response = self.client.post(self.url, {'as_of': self.as_of.isoformat()}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'as_of': 'soon', 'organization_id': str(self.org.id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DeleteObjectsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='deleter@example.com', password='password123', name='Deleter')
+        self.org = Organization.objects.create(name='Delete Org')
+        self.top = Folder.objects.create(organization=self.org, name='Top')
+        self.child = Folder.objects.create(organization=self.org, name='Child', parent=self.top)
+        team = Team.objects.create(organization=self.org, name='Readers')
+        category = Category.objects.create(organization=self.org, name='Ops')
+        workflow = Workflow.objects.create(organization=self.org, created_by=self.user, name='Flow')
+        run = WorkflowRun.objects.create(workflow=workflow, backend='stub')
+
+        self.prompts = []
+        for i in range(3):
+            prompt = Prompt.objects.create(
+                organization=self.org, created_by=self.user, folder=self.child, name=f'Doomed {i}', prompt='x', model='gpt-4',
+            )
+            prompt.name = f'Doomed {i} edited'
+            prompt.save()
+            PromptCategory.objects.create(prompt=prompt, category=category)
+            TeamPrompt.objects.create(prompt=prompt, team=team)
+            step = WorkflowStep.objects.create(workflow=workflow, prompt=prompt, order=i + 1)
+            WorkflowStepRun.objects.create(run=run, step=step, prompt=prompt, order=i + 1, status='SUCCEEDED')
+            self.prompts.append(prompt)
+        prompt_history.record(self.prompts[0], {'name': 'Doomed 0'})
+
+    def assert_nothing_references(self, model, ids):
+        for relation in model._meta.related_objects:
+            rows = relation.related_model._base_manager.filter(**{f'{relation.field.name}__in': ids})
+            self.assertFalse(rows.exists(), f'{relation.related_model.__name__}.{relation.field.name} still points at deleted rows')
+        connection.check_constraints()
+
+    def test_folders_cascade_to_subfolders_and_detach_prompts(self):
+        self.assertEqual(delete_objects(Folder, [self.top.id]), 1)
+        self.assertFalse(Folder.objects.filter(id=self.child.id).exists())
+        self.assertEqual(Prompt.objects.filter(id__in=[p.id for p in self.prompts], folder__isnull=True).count(), 3)
+        self.assert_nothing_references(Folder, [self.top.id, self.child.id])
+
+    def test_prompts_leave_no_dangling_references(self):
+        ids = [prompt.id for prompt in self.prompts]
+        self.assertTrue(PromptAccess.objects.filter(prompt_id__in=ids).exists())
+        self.assertTrue(PromptHistory.objects.filter(prompt_id__in=ids).exists())
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(delete_objects(Prompt, ids), 3)
+        # One statement per dependent table, however many prompts there are
+        self.assertLessEqual(len(ctx.captured_queries), 2 * len(Prompt._meta.related_objects) + 1)
+        self.assertFalse(Prompt.objects.filter(id__in=ids).exists())
+        self.assertEqual(WorkflowStep.objects.filter(prompt__isnull=True).count(), 3)
+        self.assert_nothing_references(Prompt, ids)
@@ -0,0 +1,114 @@
+from unittest import mock
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox.models import User, Organization, OrganizationMember, Team, Category, Folder, Prompt, PromptCategory
+
+class ConditionalRequestTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='etag@example.com', password='password123', name='Etag')
+        self.client.force_authenticate(user=self.user)
+
+        self.org = Organization.objects.create(name='Etag Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.category = Category.objects.create(organization=self.org, name='Cat')
+        self.prompt = Prompt.objects.create(
+            organization=self.org, created_by=self.user, name='Cached',
+            prompt='Body', model='gpt-4', visibility='PUBLIC',
+        )
+        self.detail_url = reverse('prompt-detail', kwargs={'pk': self.prompt.id})
+
+    def test_detail_returns_304_when_etag_matches(self):
+        first = self.client.get(self.detail_url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+
+        second = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_related_row_changes_change_the_etag(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        PromptCategory.objects.create(prompt=self.prompt, category=self.category)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        etag = response['ETag']
+        self.category.name = 'Renamed'
+        self.category.save()
+        self.assertEqual(self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_list_etag_depends_on_access_and_params(self):
+        url = reverse('prompt-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(url, {'view': 'summary'}, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+        Team.objects.create(organization=self.org, name='New team').members.create(user=self.user, role='MEMBER')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.detail_url)['Last-Modified']
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_has_no_last_modified(self):
+        # Deleting a row leaves the newest updated_at on the page unchanged, so only the ETag can tell
+        url = reverse('prompt-list')
+        older = Prompt.objects.create(organization=self.org, created_by=self.user, name='Older', prompt='x', model='gpt-4')
+        Prompt.objects.filter(id=older.id).update(updated_at=self.prompt.updated_at.replace(year=2000))
+        self.assertNotIn('Last-Modified', self.client.get(url))
+
+        older.delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Wed, 01 Jan 2031 00:00:00 GMT')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_if_match_guards_updates(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        response = self.client.patch(self.detail_url, {'name': 'First'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # The stale ETag no longer matches
+        response = self.client.patch(self.detail_url, {'name': 'Second'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.prompt.refresh_from_db()
+        self.assertEqual(self.prompt.name, 'First')
+
+    def test_detail_etag_ignores_unrelated_params(self):
+        etag = self.client.get(self.detail_url, {'_': '1700000000'})['ETag']
+        self.assertNotEqual(self.client.get(self.detail_url, {'fields': 'id,name'})['ETag'], etag)
+        response = self.client.patch(self.detail_url, {'name': 'Busted'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_if_match_is_checked_on_the_locked_row(self):
+        from promptbox import conditional
+
+        etag = self.client.get(self.detail_url)['ETag']
+        lock = conditional.lock_for_update
+
+        def write_first(instance):
+            # Another client's update commits between the read and the lock
+            Prompt.objects.filter(pk=instance.pk).update(name='Concurrent', updated_at=timezone.now())
+            return lock(instance)
+
+        with mock.patch.object(conditional, 'lock_for_update', side_effect=write_first):
+            response = self.client.patch(self.detail_url, {'name': 'Mine'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.prompt.refresh_from_db()
+        self.assertEqual(self.prompt.name, 'Concurrent')
+
+    def test_folder_detail_supports_etags(self):
+        folder = Folder.objects.create(organization=self.org, name='Docs', user=self.user)
+        url = reverse('folder-detail', kwargs={'pk': folder.id})
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_search_list_supports_etags(self):
+        response = self.client.get(reverse('prompt-list'), {'search': 'cached'})
+        self.assertEqual(response.data['count'], 1)
+        self.assertIn('ETag', response)
@@ -0,0 +1,281 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox.folders import FolderSubtree, SubtreeError, subtree as subtree_lookup
+from promptbox.models import (
+    User, Organization, OrganizationMember, Team, Category, Folder, Prompt, PromptCategory, PromptHistory, TeamPrompt,
+    Workflow, WorkflowStep
+)
+
+
+class FolderTreeTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='tree@example.com', password='password123', name='Gardener')
+        self.other = User.objects.create_user(email='other@example.com', password='password123', name='Other')
+        self.client.force_authenticate(user=self.user)
+        self.org = Organization.objects.create(name='Tree Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        OrganizationMember.objects.create(organization=self.org, user=self.other, role='MEMBER')
+
+        self.top = Folder.objects.create(organization=self.org, name='Top')
+        self.middle = Folder.objects.create(organization=self.org, name='Middle', parent=self.top)
+        self.bottom = Folder.objects.create(organization=self.org, name='Bottom', parent=self.middle)
+        self.side = Folder.objects.create(organization=self.org, name='Side', parent=self.top)
+
+    def _prompt(self, folder, created_by=None, visibility='PUBLIC'):
+        return Prompt.objects.create(
+            organization=self.org, created_by=created_by or self.user, folder=folder,
+            name=f'In {folder.name}', prompt='x', model='gpt-4', visibility=visibility,
+        )
+
+    def _tree(self, **params):
+        response = self.client.get(reverse('folder-tree'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_paths_follow_parents(self):
+        self.bottom.refresh_from_db()
+        self.assertEqual(self.bottom.path, f'{self.top.id.hex}/{self.middle.id.hex}/{self.bottom.id.hex}/')
+        self.assertEqual(self.bottom.depth, 2)
+
+    def test_move_rewrites_the_subtree(self):
+        response = self.client.patch(reverse('folder-detail', args=[self.middle.id]), {'parent': str(self.side.id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.bottom.refresh_from_db()
+        self.assertEqual(self.bottom.path, f'{self.top.id.hex}/{self.side.id.hex}/{self.middle.id.hex}/{self.bottom.id.hex}/')
+        self.assertEqual(self.bottom.depth, 3)
+
+        response = self.client.patch(reverse('folder-detail', args=[self.middle.id]), {'parent': None}, format='json')
+        self.bottom.refresh_from_db()
+        self.assertEqual((self.bottom.path, self.bottom.depth), (f'{self.middle.id.hex}/{self.bottom.id.hex}/', 1))
+
+    def test_cannot_move_into_own_subtree(self):
+        response = self.client.patch(reverse('folder-detail', args=[self.top.id]), {'parent': str(self.bottom.id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('parent', response.data)
+
+    def test_tree_nests_folders_with_prompt_counts(self):
+        self._prompt(self.top)
+        self._prompt(self.bottom)
+        self._prompt(self.bottom)
+        # Another user's private prompt is not counted
+        self._prompt(self.side, created_by=self.other, visibility='PRIVATE')
+
+        tree = self._tree(organization_id=str(self.org.id))
+        self.assertEqual([node['name'] for node in tree], ['Top'])
+        top = tree[0]
+        self.assertEqual((top['prompt_count'], top['subtree_prompt_count']), (1, 3))
+        self.assertEqual([node['name'] for node in top['children']], ['Middle', 'Side'])
+        middle, side = top['children']
+        self.assertEqual(middle['children'][0]['name'], 'Bottom')
+        self.assertEqual((middle['prompt_count'], middle['subtree_prompt_count']), (0, 2))
+        self.assertEqual(side['subtree_prompt_count'], 0)
+
+        subtree = self._tree(root=str(self.middle.id))
+        self.assertEqual([node['name'] for node in subtree], ['Middle'])
+        self.assertEqual(subtree[0]['children'][0]['depth'], 2)
+
+    def test_tree_drops_folders_under_a_filtered_out_parent(self):
+        Folder.objects.filter(id=self.middle.id).update(type='PUBLIC')
+        self._prompt(self.bottom)
+
+        tree = self._tree(organization_id=str(self.org.id), type='PRIVATE')
+        self.assertEqual([node['name'] for node in tree], ['Top'])
+        self.assertEqual([node['name'] for node in tree[0]['children']], ['Side'])
+        self.assertEqual(tree[0]['subtree_prompt_count'], 0)
+
+        # Filters do not apply to an explicit root
+        tree = self._tree(root=str(self.top.id), type='PRIVATE')
+        self.assertEqual([node['name'] for node in tree[0]['children']], ['Middle', 'Side'])
+        self.assertEqual(tree[0]['subtree_prompt_count'], 1)
+
+    def test_tree_query_count_does_not_grow_with_depth(self):
+        def count():
+            with CaptureQueriesContext(connection) as ctx:
+                self._tree(root=str(self.top.id))
+            return len(ctx.captured_queries)
+
+        count()  # membership is loaded and cached on first use
+        baseline = count()
+        parent = self.bottom
+        for i in range(10):
+            parent = Folder.objects.create(organization=self.org, name=f'Level {i}', parent=parent)
+            self._prompt(parent)
+        self.assertEqual(count(), baseline)
+
+    def test_prompts_under_a_folder(self):
+        in_top, in_bottom = self._prompt(self.top), self._prompt(self.bottom)
+        self._prompt(self.side)
+        outside = Folder.objects.create(organization=self.org, name='Outside')
+        self._prompt(outside)
+
+        response = self.client.get(reverse('prompt-list'), {'folder_id': str(self.middle.id), 'include_subfolders': 'true'})
+        self.assertEqual([row['id'] for row in response.data['results']], [str(in_bottom.id)])
+        response = self.client.get(reverse('prompt-list'), {'folder_id': str(self.top.id), 'include_subfolders': 'true'})
+        self.assertEqual(response.data['count'], 3)
+        self.assertNotIn(str(outside.id), {row['folder'] for row in response.data['results']})
+        self.assertIn(str(in_top.id), {row['id'] for row in response.data['results']})
+
+    def test_rebuild_command_repairs_paths(self):
+        Folder.objects.filter(id__in=[self.middle.id, self.bottom.id]).update(path='', depth=0)
+        out = StringIO()
+        call_command('rebuild_folder_paths', '--check', stdout=out)
+        self.assertIn('2 folders out of date', out.getvalue())
+
+        call_command('rebuild_folder_paths', stdout=StringIO())
+        self.bottom.refresh_from_db()
+        self.assertEqual(self.bottom.path, f'{self.top.id.hex}/{self.middle.id.hex}/{self.bottom.id.hex}/')
+        self.assertEqual(self.bottom.depth, 2)
+
+
+class FolderSubtreeTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='mover@example.com', password='password123', name='Mover')
+        self.other = User.objects.create_user(email='private@example.com', password='password123', name='Private')
+        self.client.force_authenticate(user=self.user)
+        self.org = Organization.objects.create(name='Subtree Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        OrganizationMember.objects.create(organization=self.org, user=self.other, role='MEMBER')
+        self.team = Team.objects.create(organization=self.org, name='Readers')
+        self.category = Category.objects.create(organization=self.org, name='Ops')
+
+        self.top = Folder.objects.create(organization=self.org, name='Top')
+        self.child = Folder.objects.create(organization=self.org, name='Child', parent=self.top)
+        self.target = Folder.objects.create(organization=self.org, name='Target')
+
+    def _prompts(self, folder, count, **fields):
+        prompts = [
+            Prompt.objects.create(
+                organization=self.org, created_by=fields.get('created_by', self.user), folder=folder,
+                name=f'{folder.name} {i}', prompt='x', model='gpt-4', visibility=fields.get('visibility', 'PUBLIC'),
+            )
+            for i in range(count)
+        ]
+        for prompt in prompts:
+            PromptCategory.objects.create(prompt=prompt, category=self.category)
+            TeamPrompt.objects.create(prompt=prompt, team=self.team)
+        return prompts
+
+    def test_copy_duplicates_folders_prompts_and_links(self):
+        self._prompts(self.top, 2)
+        self._prompts(self.child, 3)
+        self._prompts(self.child, 1, created_by=self.other, visibility='PRIVATE')
+
+        response = self.client.post(reverse('folder-copy', args=[self.top.id]), {'parent': str(self.target.id), 'name': 'Top copy'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((response.data['folders'], response.data['prompts']), (2, 5))
+
+        copy = Folder.objects.get(id=response.data['folder']['id'])
+        self.assertEqual((copy.name, copy.parent_id, copy.depth), ('Top copy', self.target.id, 1))
+        copied_child = Folder.objects.get(parent=copy)
+        self.assertEqual(copied_child.path, f'{self.target.id.hex}/{copy.id.hex}/{copied_child.id.hex}/')
+
+        copies = Prompt.objects.filter(folder=copied_child)
+        self.assertEqual(copies.count(), 3)
+        self.assertEqual(PromptCategory.objects.filter(prompt__in=copies, category=self.category).count(), 3)
+        self.assertEqual(TeamPrompt.objects.filter(prompt__in=copies, team=self.team).count(), 3)
+        # The originals are untouched and the copies are listed like any new prompt
+        self.assertEqual(Prompt.objects.filter(folder=self.child).count(), 4)
+        response = self.client.get(reverse('prompt-list'), {'folder_id': str(copied_child.id)})
+        self.assertEqual(response.data['count'], 3)
+
+    def test_interrupted_copy_resumes_after_its_last_batch(self):
+        self._prompts(self.top, 2)
+        self._prompts(self.child, 3)
+        subtree = FolderSubtree(self.top, batch_size=2)
+        copy_prompts = subtree.copy_prompts
+        calls = []
+
+        def fail_second_batch(rows, copy_id):
+            calls.append(len(rows))
+            if len(calls) == 2:
+                raise RuntimeError('interrupted')
+            return copy_prompts(rows, copy_id)
+
+        with mock.patch.object(subtree, 'copy_prompts', side_effect=fail_second_batch):
+            with self.assertRaises(RuntimeError):
+                subtree.copy(self.target)
+        # The folders and the first batch are committed
+        root = subtree.copy_root
+        self.assertEqual(Prompt.objects.filter(**subtree_lookup(root.path, 'folder__')).count(), 2)
+
+        root, folders, prompts = FolderSubtree(self.top, batch_size=2).copy(None, resume=root)
+        self.assertEqual((folders, prompts), (0, 3))
+        self.assertEqual(root.parent_id, self.target.id)
+        copied_child = Folder.objects.get(parent=root)
+        self.assertEqual(Prompt.objects.filter(folder=root).count(), 2)
+        self.assertEqual(Prompt.objects.filter(folder=copied_child).count(), 3)
+        self.assertEqual(TeamPrompt.objects.filter(prompt__folder=copied_child).count(), 3)
+
+    def test_purge_detaches_prompts_in_constant_queries(self):
+        def purge(count):
+            top = Folder.objects.create(organization=self.org, name=f'Purge {count}')
+            child = Folder.objects.create(organization=self.org, name='Child', parent=top)
+            prompts = self._prompts(child, count)
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.delete(reverse('folder-detail', args=[top.id]))
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+            self.assertFalse(Folder.objects.filter(id__in=[top.id, child.id]).exists())
+            self.assertEqual(Prompt.objects.filter(id__in=[p.id for p in prompts], folder__isnull=True).count(), count)
+            return len(ctx.captured_queries)
+
+        purge(1)
+        self.assertEqual(purge(5), purge(40))
+
+    def test_purge_can_delete_visible_prompts(self):
+        mine = self._prompts(self.child, 2)
+        hidden, = self._prompts(self.child, 1, created_by=self.other, visibility='PRIVATE')
+        workflow = Workflow.objects.create(organization=self.org, created_by=self.user, name='Flow')
+        step = WorkflowStep.objects.create(workflow=workflow, prompt=mine[0], order=1)
+        self.client.patch(reverse('prompt-detail', args=[mine[0].id]), {'name': 'Edited'}, format='json')
+
+        response = self.client.post(reverse('folder-purge', args=[self.top.id]), {'delete_prompts': True}, format='json')
+        self.assertEqual(response.data, {'folders': 2, 'prompts_deleted': 2, 'prompts_detached': 1})
+        self.assertFalse(Prompt.objects.filter(id__in=[p.id for p in mine]).exists())
+        self.assertFalse(PromptHistory.objects.filter(prompt_id=mine[0].id).exists())
+        self.assertFalse(PromptCategory.objects.filter(prompt_id__in=[p.id for p in mine]).exists())
+        step.refresh_from_db()
+        self.assertIsNone(step.prompt_id)
+        hidden.refresh_from_db()
+        self.assertIsNone(hidden.folder_id)
+
+    def test_move_action(self):
+        response = self.client.post(reverse('folder-move', args=[self.top.id]), {'parent': str(self.target.id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['folders'], 2)
+        self.child.refresh_from_db()
+        self.assertEqual(self.child.depth, 2)
+
+        response = self.client.post(reverse('folder-move', args=[self.target.id]), {'parent': str(self.child.id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_copy_into_own_subtree_is_rejected(self):
+        self._prompts(self.child, 2)
+        folders, prompts = Folder.objects.count(), Prompt.objects.count()
+
+        for parent in (self.top, self.child):
+            response = self.client.post(reverse('folder-copy', args=[self.top.id]), {'parent': str(parent.id)}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertRaises(SubtreeError):
+            FolderSubtree(self.top).copy(self.child)
+        self.assertEqual((Folder.objects.count(), Prompt.objects.count()), (folders, prompts))
+
+        # The subfolder itself may be copied out of the subtree
+        response = self.client.post(reverse('folder-copy', args=[self.child.id]), {'parent': str(self.target.id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_command_reports_progress(self):
+        self._prompts(self.child, 5)
+        out = StringIO()
+        call_command('folder_subtree', 'copy', str(self.top.id), '--batch-size', '2', stdout=out)
+        self.assertIn('prompts: 2/5', out.getvalue())
+        self.assertIn('prompts: 5/5', out.getvalue())
+        self.assertEqual(Folder.objects.filter(name='Top', parent__isnull=True).count(), 2)
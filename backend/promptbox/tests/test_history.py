@@ -0,0 +1,424 @@
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox.history import KEYFRAME_INTERVAL, apply_delta, diff_snapshots, make_delta, prompt_history
+from promptbox.membership import invalidate_membership
+from promptbox.models import (
+    User, Organization, OrganizationMember, Category, Prompt, PromptHistory, HistoryRetentionPolicy,
+    Workflow, WorkflowHistory, HistoryOutbox
+)
+from promptbox import outbox
+from promptbox.outbox import drain
+
+BODY = ''.join(f'Line {i} of a long prompt body that is edited over and over.\n' for i in range(40))
+
+
+class DeltaTests(APITestCase):
+    def test_round_trip(self):
+        old = {'name': 'Old', 'prompt': BODY, 'category_ids': ['a'], 'folder': None}
+        new = {'name': 'New', 'prompt': BODY.replace('Line 7 ', 'Line seven '), 'category_ids': ['a', 'b']}
+        delta = make_delta(old, new)
+        self.assertEqual(apply_delta(old, delta), new)
+        # Only the edited line is stored for the body
+        self.assertEqual(len(delta['edit']['prompt']), 1)
+        self.assertEqual(delta['unset'], ['folder'])
+
+    def test_list_changes_are_spliced(self):
+        steps = [{'prompt': f'p{i}', 'order': i, 'name': f'Step {i}'} for i in range(30)]
+        moved = steps[:3] + steps[4:20] + [dict(steps[3], order=19)] + steps[20:]
+        delta = make_delta({'steps': steps}, {'steps': moved})
+        self.assertEqual(apply_delta({'steps': steps}, delta), {'steps': moved})
+        self.assertNotIn('set', delta)
+        self.assertEqual(sum(len(items) for _, _, items in delta['splice']['steps']), 1)
+
+    def test_step_diff_lists_only_the_touched_steps(self):
+        steps = [{'prompt': f'p{i}', 'order': i, 'name': f'Step {i}'} for i in range(10)]
+        edited = steps[:2] + [dict(steps[2], name='Renamed')] + steps[3:9] + [{'prompt': 'new', 'order': 9, 'name': 'Extra'}]
+        changes = diff_snapshots({'steps': steps}, {'steps': edited})
+        self.assertEqual(changes['steps'], {
+            'type': 'list',
+            'added': [],
+            'removed': [],
+            'changed': [
+                {'index': 2, 'from': steps[2], 'to': edited[2]},
+                {'index': 9, 'from': steps[9], 'to': edited[9]},
+            ],
+        })
+        changes = diff_snapshots({'steps': steps}, {'steps': steps[:4] + steps[5:]})
+        self.assertEqual(changes['steps']['removed'], [{'index': 4, 'item': steps[4]}])
+        self.assertEqual(changes['steps']['changed'], [])
+
+    def test_unchanged_snapshot_gives_empty_delta(self):
+        state = {'name': 'Same', 'prompt': BODY}
+        self.assertEqual(make_delta(state, dict(state)), {})
+
+
+class PromptHistoryStorageTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='history@example.com', password='password123', name='Historian')
+        self.client.force_authenticate(user=self.user)
+        self.org = Organization.objects.create(name='History Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.prompt = Prompt.objects.create(
+            organization=self.org, created_by=self.user, name='Version 0', prompt=BODY, model='gpt-4',
+        )
+        self.url = reverse('prompt-detail', args=[self.prompt.id])
+
+    def _edit(self, count):
+        for i in range(1, count + 1):
+            body = BODY.replace('Line 3 ', f'Line 3 (rev {i}) ')
+            response = self.client.patch(self.url, {'name': f'Version {i}', 'prompt': body}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_edits_are_stored_as_keyframes_and_deltas(self):
+        self._edit(KEYFRAME_INTERVAL + 5)
+        drain()
+        rows = PromptHistory.objects.filter(prompt=self.prompt).order_by('version')
+        self.assertEqual(
+            [row.version for row in rows if row.is_keyframe], [1, KEYFRAME_INTERVAL + 1]
+        )
+        self.assertTrue(all(row.snapshot is None for row in rows if not row.is_keyframe))
+
+    def test_versions_are_numbered_under_a_parent_lock(self):
+        locked = []
+        lock_parents = prompt_history.lock_parents
+
+        def spy(parent_ids):
+            # The lock only holds inside a transaction, which must also cover the insert
+            self.assertTrue(connection.in_atomic_block)
+            locked.append(set(parent_ids))
+            lock_parents(parent_ids)
+
+        with mock.patch.object(prompt_history, 'lock_parents', spy), CaptureQueriesContext(connection) as ctx:
+            prompt_history.record(self.prompt, {'name': 'Locked'})
+        self.assertEqual(locked, [{self.prompt.id}])
+        parent_reads = [i for i, q in enumerate(ctx.captured_queries) if 'FROM "promptbox_prompt"' in q['sql']]
+        history_reads = [i for i, q in enumerate(ctx.captured_queries) if 'FROM "promptbox_prompthistory"' in q['sql']]
+        self.assertLess(parent_reads[0], history_reads[0])
+
+    def test_history_endpoint_reconstructs_snapshots(self):
+        self._edit(KEYFRAME_INTERVAL + 5)
+        response = self.client.get(reverse('prompt-history', args=[self.prompt.id]), {'page_size': 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        entries = sorted(response.data['results'], key=lambda entry: entry['version'])
+        self.assertEqual([entry['snapshot']['name'] for entry in entries], [f'Version {i}' for i in range(KEYFRAME_INTERVAL + 5)])
+        self.assertIn('(rev 7)', entries[7]['snapshot']['prompt'])
+        self.assertEqual(entries[0]['snapshot']['prompt'], BODY)
+
+    def test_revert_to_delta_version(self):
+        self._edit(6)
+        drain()
+        entry = PromptHistory.objects.get(prompt=self.prompt, version=4)
+        self.assertFalse(entry.is_keyframe)
+        response = self.client.post(reverse('prompt-revert', args=[self.prompt.id]), {'history_id': str(entry.id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.prompt.refresh_from_db()
+        self.assertEqual(self.prompt.name, 'Version 3')
+        self.assertIn('(rev 3)', self.prompt.prompt)
+
+    def test_revert_records_the_locked_state(self):
+        from promptbox import views
+
+        kept, dropped = (Category.objects.create(organization=self.org, name=name) for name in ('Kept', 'Dropped'))
+        self.client.patch(self.url, {'category_ids': [str(kept.id)]}, format='json')
+        self.client.patch(self.url, {'category_ids': [str(kept.id), str(dropped.id)]}, format='json')
+        drain()
+        entry = PromptHistory.objects.get(prompt=self.prompt, version=2)
+        kept_row = self.prompt.prompt_categories.get(category=kept)
+        lock = views.lock_for_update
+
+        def write_first(instance):
+            # Another request's edit commits after the revert loaded the prompt
+            Prompt.objects.filter(pk=instance.pk).update(name='Concurrent', updated_at=timezone.now())
+            return lock(instance)
+
+        with mock.patch.object(views, 'lock_for_update', side_effect=write_first):
+            response = self.client.post(reverse('prompt-revert', args=[self.prompt.id]), {'history_id': str(entry.id)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        drain()
+        latest = PromptHistory.objects.filter(prompt=self.prompt).latest('version')
+        self.assertEqual(prompt_history.snapshot(latest)['name'], 'Concurrent')
+        # Only the category added since then is removed; the kept row stays as it is
+        self.assertEqual(list(self.prompt.prompt_categories.values_list('pk', flat=True)), [kept_row.pk])
+
+    def test_compress_command_converts_full_snapshots(self):
+        states = [{'name': f'Legacy {i}', 'prompt': BODY + f'Tail {i}\n'} for i in range(5)]
+        for version, state in enumerate(states, start=1):
+            PromptHistory.objects.create(
+                prompt=self.prompt, version=version, change_summary='Updated name', snapshot=state,
+            )
+
+        call_command('compress_history', stdout=StringIO())
+        rows = list(PromptHistory.objects.filter(prompt=self.prompt).order_by('version'))
+        self.assertEqual([row.is_keyframe for row in rows], [True, False, False, False, False])
+        prompt_history.resolve(rows)
+        self.assertEqual([row.snapshot for row in rows], states)
+
+        # New edits continue the compressed chain
+        self._edit(1)
+        drain()
+        latest = PromptHistory.objects.get(prompt=self.prompt, version=6)
+        self.assertFalse(latest.is_keyframe)
+        self.assertEqual(prompt_history.snapshot(latest)['name'], 'Version 0')
+
+
+class HistoryOutboxTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='outbox@example.com', password='password123', name='Outbox')
+        self.client.force_authenticate(user=self.user)
+        self.org = Organization.objects.create(name='Outbox Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.prompt = Prompt.objects.create(
+            organization=self.org, created_by=self.user, name='Queued', prompt=BODY, model='gpt-4',
+        )
+        self.url = reverse('prompt-detail', args=[self.prompt.id])
+
+    def test_update_queues_history_without_reading_it(self):
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch(self.url, {'name': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('promptbox_prompthistory' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(HistoryOutbox.objects.get().snapshot['name'], 'Queued')
+        self.assertIn(outbox.wake, callbacks)
+        self.assertFalse(PromptHistory.objects.exists())
+
+    def test_history_endpoint_flushes_pending_entries(self):
+        self.client.patch(self.url, {'name': 'Renamed'}, format='json')
+        queued_at = HistoryOutbox.objects.get().created_at
+        response = self.client.get(reverse('prompt-history', args=[self.prompt.id]))
+        [entry] = response.data['results']
+        self.assertEqual(entry['snapshot']['name'], 'Queued')
+        # History keeps the time of the change, not the time it was written
+        self.assertEqual(PromptHistory.objects.get().created_at, queued_at)
+        self.assertFalse(HistoryOutbox.objects.exists())
+
+    def test_worker_command_writes_batches_in_order(self):
+        for i in range(3):
+            self.client.patch(self.url, {'name': f'Version {i + 1}'}, format='json')
+        gone = Prompt.objects.create(organization=self.org, created_by=self.user, name='Gone', prompt='x', model='gpt-4')
+        self.client.patch(reverse('prompt-detail', args=[gone.id]), {'name': 'Gone soon'}, format='json')
+        gone.delete()
+
+        out = StringIO()
+        call_command('process_history_outbox', '--once', '--batch-size', '2', stdout=out)
+        self.assertIn('Wrote 4 history rows, 0 pending', out.getvalue())
+        rows = PromptHistory.objects.filter(prompt=self.prompt).order_by('version')
+        self.assertEqual([prompt_history.snapshot(row)['name'] for row in rows], ['Queued', 'Version 1', 'Version 2'])
+
+
+@override_settings(PROMPTBOX_HISTORY_OUTBOX_THREAD=False)
+class HistoryOutboxConcurrencyTests(TransactionTestCase):
+    def test_flush_waits_for_the_drainer_thread(self):
+        user = User.objects.create_user(email='race@example.com', password='password123', name='Racer')
+        org = Organization.objects.create(name='Race Org')
+        prompt = Prompt.objects.create(organization=org, created_by=user, name='Raced', prompt=BODY, model='gpt-4')
+        outbox.enqueue(prompt_history, [
+            (prompt.id, {'name': f'Version {i}', 'prompt': BODY}, {'change_summary': 'Updated'}) for i in range(3)
+        ])
+
+        entered, release, errors = threading.Event(), threading.Event(), []
+        write = outbox.write
+
+        def slow_write(batch):
+            entered.set()
+            release.wait(5)
+            write(batch)
+
+        def run(target):
+            try:
+                target()
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        with mock.patch.object(outbox, 'write', slow_write):
+            # The background drainer holds the batch while a request flushes the same prompt
+            drainer = threading.Thread(target=run, args=(lambda: outbox.drain(skip_locked=True),))
+            drainer.start()
+            self.assertTrue(entered.wait(5))
+            flusher = threading.Thread(target=run, args=(lambda: outbox.flush(prompt_history, [prompt.id]),))
+            flusher.start()
+            time.sleep(0.2)
+            release.set()
+            drainer.join(5)
+            flusher.join(5)
+
+        self.assertEqual(errors, [])
+        self.assertFalse(HistoryOutbox.objects.exists())
+        rows = PromptHistory.objects.filter(prompt=prompt).order_by('version')
+        self.assertEqual([prompt_history.snapshot(row)['name'] for row in rows], ['Version 0', 'Version 1', 'Version 2'])
+
+
+class HistoryRetentionTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='retention@example.com', password='password123', name='Keeper')
+        self.client.force_authenticate(user=self.user)
+        self.org = Organization.objects.create(name='Retention Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.prompt = Prompt.objects.create(
+            organization=self.org, created_by=self.user, name='Kept', prompt=BODY, model='gpt-4',
+        )
+
+    def _record(self, count, days_ago=None):
+        noon = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+        for i in range(count):
+            state = {'name': f'Name {i}', 'prompt': BODY.replace('Line 5 ', f'Line 5 ({i}) ')}
+            row = prompt_history.record(self.prompt, state, change_summary='Updated name')
+            if days_ago is not None:
+                created = noon - timedelta(days=days_ago[i]) + timedelta(minutes=i)
+                PromptHistory.objects.filter(pk=row.pk).update(created_at=created)
+
+    def _snapshots(self):
+        rows = list(PromptHistory.objects.filter(prompt=self.prompt).order_by('version'))
+        return [row.snapshot['name'] for row in prompt_history.resolve(rows)]
+
+    def _prune(self, *args):
+        out = StringIO()
+        call_command('prune_history', *args, stdout=out)
+        return out.getvalue()
+
+    def test_keep_last_removes_older_versions(self):
+        self._record(30)
+        HistoryRetentionPolicy.objects.create(organization=self.org, keep_last=5, max_bytes=1)
+        output = self._prune()
+        self.assertIn('removed 25 prompt versions', output)
+        self.assertEqual(self._snapshots(), [f'Name {i}' for i in range(25, 30)])
+        self.assertTrue(PromptHistory.objects.get(prompt=self.prompt, version=26).is_keyframe)
+
+    def test_daily_thinning_keeps_last_version_of_each_day(self):
+        self._record(9, days_ago=[10, 10, 10, 9, 9, 9, 1, 1, 1])
+        HistoryRetentionPolicy.objects.create(organization=self.org, daily_after_days=7)
+        self._prune()
+        self.assertEqual(self._snapshots(), ['Name 2', 'Name 5', 'Name 6', 'Name 7', 'Name 8'])
+
+        # The chain stays writable after pruning
+        prompt_history.record(self.prompt, {'name': 'Later', 'prompt': BODY}, change_summary='Updated name')
+        self.assertEqual(self._snapshots()[-1], 'Later')
+
+    def test_size_cap_never_drops_the_newest_version(self):
+        self._record(10)
+        HistoryRetentionPolicy.objects.create(organization=self.org, keep_last=None, max_bytes=1)
+        self._prune()
+        self.assertEqual(self._snapshots(), ['Name 9'])
+        self.assertTrue(PromptHistory.objects.get(prompt=self.prompt).is_keyframe)
+
+    def test_prune_reads_the_chain_under_the_parent_lock(self):
+        self._record(10)
+        policy = HistoryRetentionPolicy(organization=self.org, keep_last=2, max_bytes=1)
+        lock, calls = prompt_history.lock_parents, []
+
+        def write_then_lock(parent_ids):
+            calls.append(list(parent_ids))
+            if len(calls) == 1:
+                # A write queued while prune was starting lands before it gets the lock
+                outbox.enqueue(prompt_history, [(self.prompt.id, {'name': 'Concurrent', 'prompt': BODY}, {})])
+                drain()
+            lock(parent_ids)
+
+        with mock.patch.object(prompt_history, 'lock_parents', side_effect=write_then_lock):
+            prompt_history.prune(self.prompt.id, policy)
+        self.assertEqual(calls[0], [self.prompt.id])
+        self.assertEqual(self._snapshots(), ['Name 9', 'Concurrent'])
+
+    def test_dry_run_changes_nothing(self):
+        self._record(10)
+        HistoryRetentionPolicy.objects.create(organization=self.org, keep_last=2, max_bytes=1)
+        output = self._prune('--dry-run')
+        self.assertIn('Would remove 8 versions', output)
+        self.assertEqual(PromptHistory.objects.filter(prompt=self.prompt).count(), 10)
+
+    def test_policy_endpoint_is_admin_only(self):
+        url = reverse('organization-history-retention', args=[self.org.id])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.put(url, {'keep_last': 10, 'daily_after_days': 30, 'weekly_after_days': 90}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.org.history_retention.keep_last, 10)
+
+        response = self.client.patch(url, {'weekly_after_days': 7}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        OrganizationMember.objects.filter(user=self.user).update(role='MEMBER')
+        invalidate_membership(self.user.id)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class VersionDiffTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='differ@example.com', password='password123', name='Differ')
+        self.client.force_authenticate(user=self.user)
+        self.org = Organization.objects.create(name='Diff Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.category = Category.objects.create(organization=self.org, name='Diffed')
+        self.prompt = Prompt.objects.create(
+            organization=self.org, created_by=self.user, name='First', prompt=BODY, model='gpt-4',
+        )
+        detail = reverse('prompt-detail', args=[self.prompt.id])
+        self.client.patch(detail, {'name': 'Second', 'prompt': BODY.replace('Line 3 of', 'Line 3 (edited) of')}, format='json')
+        self.client.patch(detail, {'category_ids': [str(self.category.id)]}, format='json')
+        drain()
+        self.first, self.second = PromptHistory.objects.filter(prompt=self.prompt).order_by('version')
+        self.url = reverse('prompt-diff', args=[self.prompt.id])
+
+    def test_diff_between_versions(self):
+        response = self.client.get(self.url, {'from': str(self.first.id), 'to': str(self.second.id)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        changes = response.data['changes']
+        self.assertEqual(changes['name'], {'type': 'value', 'from': 'First', 'to': 'Second'})
+        [hunk] = changes['prompt']['hunks']
+        self.assertEqual(hunk['old_start'], 4)
+        self.assertIn(['insert', ' (edited)'], hunk['words'])
+        self.assertNotIn('category_ids', changes)
+        # Far smaller than the two snapshots it replaces
+        self.assertLess(len(str(response.data)), len(BODY))
+
+    def test_diff_against_current_state(self):
+        response = self.client.get(self.url, {'from': str(self.second.id)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['to']['id'], 'current')
+        self.assertEqual(response.data['changes']['category_ids']['added'], [str(self.category.id)])
+
+    def test_diffs_are_cached_by_version_pair(self):
+        params = {'from': str(self.first.id), 'to': str(self.second.id)}
+        first = self.client.get(self.url, params)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.url, params)
+        self.assertEqual(first.data, second.data)
+        self.assertFalse(any('"snapshot"' in q['sql'] for q in ctx.captured_queries))
+
+    def test_current_diff_follows_changes(self):
+        params = {'from': str(self.second.id)}
+        self.client.get(self.url, params)
+        self.client.patch(reverse('prompt-detail', args=[self.prompt.id]), {'model': 'gpt-5'}, format='json')
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.data['changes']['model'], {'type': 'value', 'from': 'gpt-4', 'to': 'gpt-5'})
+
+    def test_unknown_history_is_rejected(self):
+        other = Prompt.objects.create(organization=self.org, created_by=self.user, name='Other', prompt='x', model='gpt-4')
+        foreign = prompt_history.record(other, {'name': 'Other'}, change_summary='Updated name')
+        self.assertEqual(self.client.get(self.url, {'from': str(foreign.id)}).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(self.url, {'from': 'nope'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_workflow_diff(self):
+        workflow = Workflow.objects.create(organization=self.org, created_by=self.user, name='Flow')
+        self.client.patch(reverse('workflow-detail', args=[workflow.id]), {'name': 'Renamed flow'}, format='json')
+        drain()
+        entry = WorkflowHistory.objects.get(workflow=workflow)
+        response = self.client.get(reverse('workflow-diff', args=[workflow.id]), {'from': str(entry.id)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['changes'], {'name': {'type': 'value', 'from': 'Flow', 'to': 'Renamed flow'}})
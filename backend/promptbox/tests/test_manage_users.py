@@ -1,8 +1,23 @@
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 
 from promptbox.models import User, Organization, OrganizationMember, Team, TeamMember
+from promptbox.passwords import pool_context
+from promptbox.templating import read_rows
+from promptbox import user_import, views
+from promptbox.user_import import POOL_MIN_ROWS, UserImporter
 
 
 class ManageUsersApiTests(APITestCase):
@@ -119,3 +134,189 @@ class ManageUsersApiTests(APITestCase):
         response = self.client.post(remove_url, {'team_id': str(self.default_team.id)}, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data['error'], 'User must be assigned to at least one team')
+
+    def _list_queries(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('user-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(ctx.captured_queries)
+
+    def test_list_loads_teams_in_constant_queries(self):
+        params = {'organization_id': str(self.org.id), 'page_size': 100}
+        self._list_queries(params)
+        _, baseline = self._list_queries(params)
+
+        for i in range(20):
+            user = User.objects.create_user(email=f'bulk{i}@test.com', password='password123', name=f'Bulk {i}')
+            OrganizationMember.objects.create(organization=self.org, user=user, role='MEMBER')
+            TeamMember.objects.create(team=self.eng_team, user=user, role='MEMBER')
+        response, queries = self._list_queries(params)
+        self.assertEqual(response.data['count'], 23)
+        self.assertEqual(queries, baseline)
+
+    def test_list_teams_are_scoped_active_and_sorted(self):
+        OrganizationMember.objects.create(organization=self.other_org, user=self.user_a, role='MEMBER')
+        OrganizationMember.objects.create(organization=self.other_org, user=self.admin, role='ADMIN')
+        archived = Team.objects.create(organization=self.org, name='Archive', is_active=False)
+        TeamMember.objects.create(team=archived, user=self.user_a, role='MEMBER')
+        left = Team.objects.create(organization=self.org, name='Alumni')
+        TeamMember.objects.create(team=left, user=self.user_a, role='MEMBER', is_active=False)
+
+        response, _ = self._list_queries({'organization_id': str(self.org.id)})
+        alice = next(u for u in response.data['results'] if u['email'] == 'a@test.com')
+        self.assertEqual([t['name'] for t in alice['teams']], sorted(['Engineering', self.org.name]))
+        # Alice belongs to both organizations but is listed once
+        response, _ = self._list_queries({})
+        self.assertEqual([u['email'] for u in response.data['results']].count('a@test.com'), 1)
+        alice = next(u for u in response.data['results'] if u['email'] == 'a@test.com')
+        self.assertIn('Globex', [t['name'] for t in alice['teams']])
+
+    def test_retrieve_includes_teams(self):
+        response = self.client.get(reverse('user-detail', kwargs={'pk': str(self.user_a.id)}), {'organization_id': str(self.org.id)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({t['name'] for t in response.data['teams']}, {'Engineering', self.org.name})
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserImportTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.org = Organization.objects.create(name='Onboarded')
+        self.admin = User.objects.create_user(email='admin@onboarded.com', password='password123', name='Admin')
+        OrganizationMember.objects.create(organization=self.org, user=self.admin, role='ADMIN')
+        self.default_team = Team.objects.get(organization=self.org, name=self.org.name)
+        self.client.force_authenticate(user=self.admin)
+        self.url = reverse('user-bulk-import') + f'?organization_id={self.org.id}'
+
+    def _import(self, body, content_type='text/csv', url=None):
+        response = self.client.generic('POST', url or self.url, body, content_type=content_type)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_imports_csv_rows_and_reports_errors(self):
+        body = (
+            'email,name,password,role\n'
+            'ann@Example.COM,Ann,secret-1,\n'
+            'ben@example.com,Ben,secret-2,admin\n'
+            'ann@example.com,Ann again,secret-3,\n'
+            'admin@onboarded.com,Taken,secret-4,\n'
+            'cat@example.com,Cat,,\n'
+            'dan@example.com,Dan,secret-5,OWNER\n'
+            'not-an-email,Eve,secret-6,\n'
+        )
+        results = self._import(body)
+        self.assertEqual([r['row'] for r in results], list(range(1, 8)))
+        self.assertEqual([r.get('error') for r in results], [
+            None, None, 'Duplicate email in this file.', 'A user with this email already exists.',
+            'Missing password.', 'role must be one of: ADMIN, MEMBER, VIEWER.', 'Enter a valid email address.',
+        ])
+
+        ann = User.objects.get(id=results[0]['id'])
+        self.assertEqual((ann.email, ann.name), ('ann@example.com', 'Ann'))
+        self.assertTrue(ann.check_password('secret-1'))
+        roles = dict(OrganizationMember.objects.filter(organization=self.org).values_list('user__name', 'role'))
+        self.assertEqual(roles, {'Admin': 'ADMIN', 'Ann': 'MEMBER', 'Ben': 'ADMIN'})
+        self.assertEqual(TeamMember.objects.filter(team=self.default_team, user__name__in=['Ann', 'Ben']).count(), 2)
+
+        response = self.client.get(reverse('user-list'), {'organization_id': str(self.org.id)})
+        self.assertEqual(response.data['count'], 3)
+
+    def test_writes_each_chunk_in_bulk(self):
+        def lines(count, offset=0):
+            return [json.dumps({'email': f'user{i}@example.com', 'name': f'User {i}', 'password': 'pw'}) + '\n'
+                    for i in range(offset, offset + count)]
+
+        def insert_count(count, offset):
+            importer = UserImporter(self.org, workers=0, chunk_size=10)
+            with CaptureQueriesContext(connection) as ctx:
+                results = list(importer.run(read_rows(lines(count, offset), 'application/x-ndjson')))
+            self.assertEqual((importer.created, importer.failed, len(results)), (count, 0, count))
+            return sum(1 for q in ctx.captured_queries if q['sql'].startswith('INSERT'))
+
+        # users, organization memberships and team memberships: three inserts per chunk
+        self.assertEqual(insert_count(10, 0), 3)
+        self.assertEqual(insert_count(30, 100), 9)
+        self.assertEqual(User.objects.filter(email__startswith='user').count(), 40)
+
+    def test_hashes_in_a_process_pool(self):
+        count = POOL_MIN_ROWS + 4
+        rows = [(i + 1, {'email': f'pool{i}@example.com', 'name': f'Pool {i}', 'password': f'pw-{i}'}) for i in range(count)]
+        importer = UserImporter(self.org, workers=2, chunk_size=POOL_MIN_ROWS)
+        results = list(importer.run(rows))
+        self.assertEqual([r['row'] for r in results], list(range(1, count + 1)))
+        self.assertEqual(importer.created, count)
+        user = User.objects.get(email='pool7@example.com')
+        self.assertTrue(user.check_password('pw-7'))
+        # Workers are never forked from the (threaded) server process
+        self.assertNotEqual(pool_context().get_start_method(), 'fork')
+
+    def test_requests_share_one_hashing_pool(self):
+        body = ''.join(
+            json.dumps({'email': f'shared{i}@example.com', 'name': 'Shared', 'password': 'pw'}) + '\n'
+            for i in range(POOL_MIN_ROWS)
+        )
+        threads = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(threads.shutdown)
+        pool = mock.Mock(wraps=threads)
+        with mock.patch.object(views, 'shared_pool', return_value=pool), \
+                mock.patch.object(views, 'shared_pool_workers', return_value=2), \
+                mock.patch.object(user_import, 'ProcessPoolExecutor') as per_import:
+            self._import(body, content_type='application/x-ndjson')
+            self._import(body.replace('shared', 'again'), content_type='application/x-ndjson')
+        per_import.assert_not_called()
+        self.assertEqual(pool.map.call_count, 2)
+        pool.shutdown.assert_not_called()
+        self.assertEqual(User.objects.filter(email__startswith='again').count(), POOL_MIN_ROWS)
+
+    def test_email_taken_after_validation_is_reported_for_its_row(self):
+        rows = [(i, {'email': f'race{i}@example.com', 'name': 'Race', 'password': 'pw'}) for i in range(1, 4)]
+        importer = UserImporter(self.org, workers=0)
+        validate = importer.validate
+
+        def validate_then_race(chunk):
+            checked = validate(chunk)
+            if chunk:
+                User.objects.create_user(email='race2@example.com', password='pw', name='Elsewhere')
+            return checked
+
+        with mock.patch.object(importer, 'validate', side_effect=validate_then_race):
+            results = list(importer.run(rows))
+        self.assertEqual([r['row'] for r in results], [1, 2, 3])
+        self.assertEqual(results[1]['error'], 'A user with this email already exists.')
+        self.assertEqual((importer.created, importer.failed), (2, 1))
+        self.assertEqual(User.objects.get(email='race2@example.com').name, 'Elsewhere')
+        self.assertTrue(OrganizationMember.objects.filter(organization=self.org, user_id=results[2]['id']).exists())
+
+    def test_stops_after_max_rows(self):
+        rows = [(i, {'email': f'cap{i}@example.com', 'name': 'Cap', 'password': 'pw'}) for i in range(1, 6)]
+        results = list(UserImporter(self.org, workers=0, chunk_size=2, max_rows=3).run(rows))
+        self.assertEqual([r['row'] for r in results], [1, 2, 3, 4])
+        self.assertEqual(results[-1]['error'], 'At most 3 rows per import.')
+        self.assertEqual(User.objects.filter(email__startswith='cap').count(), 3)
+
+        # A limit that ends exactly on a chunk boundary still reports the next row
+        rows = [(i, {'email': f'edge{i}@example.com', 'name': 'Edge', 'password': 'pw'}) for i in range(1, 7)]
+        results = list(UserImporter(self.org, workers=0, chunk_size=2, max_rows=4).run(rows))
+        self.assertEqual([r['row'] for r in results], [1, 2, 3, 4, 5])
+        self.assertEqual(results[-1]['error'], 'At most 4 rows per import.')
+        self.assertEqual(User.objects.filter(email__startswith='edge').count(), 4)
+
+    def test_requires_admin_and_supported_body(self):
+        response = self.client.generic('POST', self.url, '{}', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+        member = User.objects.create_user(email='member@onboarded.com', password='password123', name='Member')
+        OrganizationMember.objects.create(organization=self.org, user=member, role='MEMBER')
+        self.client.force_authenticate(user=member)
+        response = self.client.generic('POST', self.url, 'email,name,password\n', content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command_imports_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as source:
+            source.write('{"email": "cmd@example.com", "name": "Cmd", "password": "pw"}\n[]\n')
+        self.addCleanup(os.remove, source.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_users', source.name, '--organization', str(self.org.id), '--workers', '0', stdout=out, stderr=err)
+        self.assertIn('Created 1 users, 1 rows failed', out.getvalue())
+        self.assertIn('row 2: Each line must be a JSON object.', err.getvalue())
+        self.assertTrue(TeamMember.objects.filter(team=self.default_team, user__email='cmd@example.com').exists())
@@ -0,0 +1,61 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox.membership import get_membership
+from promptbox.models import User, Organization, OrganizationMember, Team, TeamMember, Prompt, TeamPrompt
+
+class MembershipContextTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(email='boss@example.com', password='password123', name='Boss')
+        self.member = User.objects.create_user(email='member@example.com', password='password123', name='Member')
+        self.client.force_authenticate(user=self.admin)
+
+        self.org = Organization.objects.create(name='Cached Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.admin, role='ADMIN')
+        OrganizationMember.objects.create(organization=self.org, user=self.member, role='MEMBER')
+        self.team = Team.objects.create(organization=self.org, name='Cached Team')
+
+    def _membership_queries(self, ctx):
+        return [
+            q['sql'] for q in ctx.captured_queries
+            if 'FROM "promptbox_organizationmember"' in q['sql'] or 'FROM "promptbox_teammember"' in q['sql']
+        ]
+
+    def test_context_reports_orgs_roles_and_teams(self):
+        context = get_membership(self.admin)
+        self.assertEqual(context.org_ids, [self.org.id])
+        self.assertTrue(context.is_admin(str(self.org.id)))
+        self.assertFalse(get_membership(self.member).is_admin(self.org.id))
+        self.assertFalse(context.is_admin('not-a-uuid'))
+
+    def test_warm_cache_costs_no_membership_queries(self):
+        self.client.get(reverse('prompt-list'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('prompt-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._membership_queries(ctx), [])
+
+    def test_admin_check_uses_cached_context(self):
+        url = reverse('user-detail', kwargs={'pk': str(self.member.id)})
+        self.client.patch(url, {'name': 'Warm'}, format='json')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch(url, {'name': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._membership_queries(ctx), [])
+
+    def test_membership_changes_invalidate_the_cache(self):
+        prompt = Prompt.objects.create(
+            organization=self.org, created_by=self.member, name='Team only',
+            prompt='Body', model='gpt-4', visibility='TEAM',
+        )
+        TeamPrompt.objects.create(team=self.team, prompt=prompt)
+        self.assertEqual(self.client.get(reverse('prompt-list')).data['count'], 0)
+
+        membership = TeamMember.objects.create(team=self.team, user=self.admin, role='MEMBER')
+        self.assertEqual(self.client.get(reverse('prompt-list')).data['count'], 1)
+
+        membership.delete()
+        self.assertEqual(self.client.get(reverse('prompt-list')).data['count'], 0)
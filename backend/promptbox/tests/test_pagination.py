@@ -0,0 +1,90 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox.models import User, Organization, OrganizationMember, Team, Prompt
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='pager@example.com', password='password123', name='Pager')
+        self.client.force_authenticate(user=self.user)
+
+        self.org = Organization.objects.create(name='Paging Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+
+        # Duplicate names exercise the id tiebreaker
+        for i in range(23):
+            Prompt.objects.create(
+                organization=self.org, created_by=self.user, name=f'Prompt {i % 7}',
+                prompt='Body', model='gpt-4', visibility='PUBLIC',
+            )
+        self.url = reverse('prompt-list')
+
+    def _walk(self, url, params=None):
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            if not response.data['next']:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_walk_returns_every_row_once_in_order(self):
+        pages = self._walk(self.url, {'pagination': 'cursor', 'page_size': 5})
+        rows = [p for page in pages for p in page['results']]
+
+        self.assertEqual(len(pages), 5)
+        self.assertEqual(len({p['id'] for p in rows}), 23)
+        self.assertEqual([p['name'] for p in rows], sorted(p['name'] for p in rows))
+        self.assertNotIn('count', pages[0])
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_previous_link_returns_the_prior_page(self):
+        first = self.client.get(self.url, {'pagination': 'cursor', 'page_size': 5}).data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+
+        self.assertEqual([p['id'] for p in back['results']], [p['id'] for p in first['results']])
+        self.assertIsNone(back['previous'])
+
+    def test_descending_created_at_ordering(self):
+        pages = self._walk(self.url, {'pagination': 'cursor', 'page_size': 10, 'ordering': '-created_at'})
+        created = [p['created_at'] for page in pages for p in page['results']]
+        self.assertEqual(len(created), 23)
+        self.assertEqual(created, sorted(created, reverse=True))
+
+    def test_cursor_pages_skip_count_query(self):
+        first = self.client.get(self.url, {'pagination': 'cursor', 'page_size': 5}).data
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(first['next'])
+        self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unsupported_cursor_orderings_are_rejected(self):
+        for ordering in ('prompt', 'name,-created_at', 'nope'):
+            response = self.client.get(self.url, {'pagination': 'cursor', 'ordering': ordering})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, ordering)
+        # Relevance is not a column the cursor can seek on; an explicit ordering is
+        response = self.client.get(self.url, {'pagination': 'cursor', 'search': 'prompt'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'pagination': 'cursor', 'search': 'prompt', 'ordering': 'name'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_page_number_clients_are_unchanged(self):
+        response = self.client.get(self.url, {'page': 2, 'page_size': 10})
+        self.assertEqual(response.data['count'], 23)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_cursor_mode_on_teams(self):
+        for i in range(4):
+            Team.objects.create(organization=self.org, name=f'Team {i}')
+        pages = self._walk(reverse('team-list'), {'organization_id': str(self.org.id), 'pagination': 'cursor', 'page_size': 2})
+        names = [t['name'] for page in pages for t in page['results']]
+        self.assertEqual(names, sorted(Team.objects.filter(organization=self.org).values_list('name', flat=True)))
@@ -0,0 +1,174 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox.models import (
+    User, Organization, OrganizationMember, Team, TeamMember, Category, Prompt, PromptCategory, TeamPrompt,
+    Workflow, WorkflowStep, WorkflowTeam
+)
+from promptbox.outbox import drain
+from promptbox.serializers import UpdatePromptSerializer
+
+class ListQueryCountTests(APITestCase):
+    """
+    Guards against N+1 queries: the number of queries for a list page must not
+    depend on how many rows the page holds.
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='counter@example.com', password='password123', name='Counter')
+        self.client.force_authenticate(user=self.user)
+
+        self.org = Organization.objects.create(name='Count Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.team = Team.objects.create(organization=self.org, name='Counted')
+        TeamMember.objects.create(team=self.team, user=self.user, role='MEMBER')
+        categories = [Category.objects.create(organization=self.org, name=f'Category {i}') for i in range(2)]
+
+        for i in range(20):
+            prompt = Prompt.objects.create(
+                organization=self.org, created_by=self.user, name=f'Prompt {i:02d}',
+                prompt='Body', model='gpt-4', visibility='TEAM',
+            )
+            TeamPrompt.objects.create(team=self.team, prompt=prompt)
+            for category in categories:
+                PromptCategory.objects.create(prompt=prompt, category=category)
+
+            workflow = Workflow.objects.create(organization=self.org, created_by=self.user, name=f'Flow {i:02d}', visibility='TEAM')
+            WorkflowTeam.objects.create(workflow=workflow, team=self.team)
+            for order in range(3):
+                WorkflowStep.objects.create(workflow=workflow, prompt=prompt, order=order)
+
+    def _count_queries(self, url, page_size, **params):
+        # Warm the membership cache so only the list queries are measured
+        self.client.get(url, {'page_size': 1})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'page_size': page_size, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(ctx.captured_queries)
+
+    def test_prompt_list_query_count_is_independent_of_page_size(self):
+        url = reverse('prompt-list')
+        self.assertEqual(self._count_queries(url, 2), self._count_queries(url, 20))
+
+    def test_prompt_list_includes_nested_relations(self):
+        response = self.client.get(reverse('prompt-list'), {'page_size': 1})
+        prompt = response.data['results'][0]
+        self.assertEqual(prompt['created_by_name'], 'Counter')
+        self.assertEqual(sorted(c['category_name'] for c in prompt['categories']), ['Category 0', 'Category 1'])
+        self.assertEqual([t['team_name'] for t in prompt['shared_teams']], ['Counted'])
+
+    def test_workflow_list_query_count_is_independent_of_page_size(self):
+        url = reverse('workflow-list')
+        self.assertEqual(self._count_queries(url, 2), self._count_queries(url, 20))
+
+    def test_workflow_summary_query_count_is_independent_of_page_size(self):
+        url = reverse('workflow-list')
+        self.assertEqual(self._count_queries(url, 2, view='summary'), self._count_queries(url, 20, view='summary'))
+
+    def test_workflow_step_count_is_annotated(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('workflow-list'), {'fields': 'id,name,step_count', 'page_size': 20})
+        self.assertEqual([item['step_count'] for item in response.data['results']], [3] * 20)
+        # Counted inside the page query; no step rows are loaded
+        self.assertFalse(any(q['sql'].startswith('SELECT "promptbox_workflowstep"') for q in ctx.captured_queries))
+
+    def test_workflow_steps_load_prompt_names_only(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('workflow-list'), {'page_size': 5})
+        step = response.data['results'][0]['steps'][0]
+        self.assertEqual(step['prompt_name'], 'Prompt 00')
+        [steps_query] = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT "promptbox_workflowstep"')]
+        self.assertIn('"promptbox_prompt"."name"', steps_query)
+        self.assertNotIn('"promptbox_prompt"."prompt"', steps_query)
+
+
+class UpdateWriteTests(APITestCase):
+    """Updates only write the relation rows that actually changed."""
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='writer@example.com', password='password123', name='Writer')
+        self.client.force_authenticate(user=self.user)
+
+        self.org = Organization.objects.create(name='Write Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.team = Team.objects.create(organization=self.org, name='Writers')
+        self.categories = [Category.objects.create(organization=self.org, name=f'Category {i}') for i in range(3)]
+        self.prompt = Prompt.objects.create(
+            organization=self.org, created_by=self.user, name='Edited', prompt='Body', model='gpt-4',
+        )
+        for category in self.categories[:2]:
+            PromptCategory.objects.create(prompt=self.prompt, category=category)
+
+    def _writes(self, ctx, table):
+        return [
+            q['sql'] for q in ctx.captured_queries
+            if f'"{table}"' in q['sql'] and not q['sql'].startswith('SELECT')
+        ]
+
+    def test_unchanged_relations_are_not_rewritten(self):
+        url = reverse('prompt-detail', args=[self.prompt.id])
+        category_ids = [str(c.id) for c in self.categories[:2]]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch(url, {'name': 'Renamed', 'category_ids': category_ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._writes(ctx, 'promptbox_promptcategory'), [])
+        # The snapshot and the diff share one load of the rows (the search index reads names separately)
+        loads = [q for q in ctx.captured_queries if q['sql'].startswith('SELECT "promptbox_promptcategory"."id"')]
+        self.assertEqual(len(loads), 1)
+
+    def test_changed_relations_are_diffed(self):
+        kept = PromptCategory.objects.get(prompt=self.prompt, category=self.categories[0])
+        url = reverse('prompt-detail', args=[self.prompt.id])
+        category_ids = [str(self.categories[0].id), str(self.categories[2].id)]
+        response = self.client.patch(url, {'category_ids': category_ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        rows = PromptCategory.objects.filter(prompt=self.prompt)
+        self.assertEqual({row.category_id for row in rows}, {self.categories[0].id, self.categories[2].id})
+        self.assertTrue(rows.filter(pk=kept.pk).exists())
+        drain()
+        self.assertEqual(self.prompt.history.get().change_summary, 'Updated categories')
+
+    def test_removed_relations_are_deleted_in_one_statement(self):
+        for category in self.categories[2:]:
+            PromptCategory.objects.create(prompt=self.prompt, category=category)
+        url = reverse('prompt-detail', args=[self.prompt.id])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.patch(url, {'category_ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(PromptCategory.objects.filter(prompt=self.prompt).exists())
+        self.assertEqual(len(self._writes(ctx, 'promptbox_promptcategory')), 1)
+        # One UPDATE of the prompt itself, no per-row touch
+        self.assertEqual(len([sql for sql in self._writes(ctx, 'promptbox_prompt') if sql.startswith('UPDATE')]), 1)
+
+    def test_history_snapshot_is_read_under_the_row_lock(self):
+        instance = Prompt.objects.get(pk=self.prompt.pk)
+        # Committed by another request after this one loaded the prompt
+        Prompt.objects.filter(pk=self.prompt.pk).update(name='Concurrent', updated_at=timezone.now())
+        serializer = UpdatePromptSerializer(instance, data={'description': 'Edited'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        drain()
+        self.assertEqual(self.prompt.history.get().snapshot['name'], 'Concurrent')
+        self.prompt.refresh_from_db()
+        self.assertEqual((self.prompt.name, self.prompt.description), ('Concurrent', 'Edited'))
+
+    def test_workflow_steps_are_updated_in_place(self):
+        workflow = Workflow.objects.create(organization=self.org, created_by=self.user, name='Flow')
+        steps = [WorkflowStep.objects.create(workflow=workflow, prompt=self.prompt, order=i, name=f'Step {i}') for i in range(3)]
+        payload = [
+            {'prompt': str(self.prompt.id), 'order': 0, 'name': 'Step 0'},
+            {'prompt': str(self.prompt.id), 'order': 1, 'name': 'Renamed step'},
+        ]
+        response = self.client.patch(reverse('workflow-detail', args=[workflow.id]), {'steps': payload}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        rows = list(workflow.steps.all())
+        self.assertEqual([(row.pk, row.name) for row in rows], [(steps[0].pk, 'Step 0'), (steps[1].pk, 'Renamed step')])
+        drain()
+        snapshot = workflow.history.get().snapshot
+        self.assertEqual([step['name'] for step in snapshot['steps']], ['Step 0', 'Step 1', 'Step 2'])
@@ -0,0 +1,83 @@
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox import response_cache
+from promptbox.models import User, Organization, OrganizationMember, Team, TeamPrompt, Folder, Prompt
+
+class ListResponseCacheTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='cached@example.com', password='password123', name='Cached')
+        self.client.force_authenticate(user=self.user)
+
+        self.org = Organization.objects.create(name='Cache Org')
+        self.other_org = Organization.objects.create(name='Other Cache Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.prompt = Prompt.objects.create(
+            organization=self.org, created_by=self.user, name='Cached prompt',
+            prompt='Body', model='gpt-4', visibility='PUBLIC',
+        )
+        self.url = reverse('prompt-list')
+        self.params = {'organization_id': str(self.org.id)}
+
+    def test_repeated_list_is_served_from_cache(self):
+        first = self.client.get(self.url, self.params)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.url, self.params)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertFalse(any('FROM "promptbox_prompt"' in q['sql'] for q in ctx.captured_queries))
+
+    def test_cached_entry_answers_conditional_requests(self):
+        etag = self.client.get(self.url, self.params)['ETag']
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_writes_evict_the_organization(self):
+        self.client.get(self.url, self.params)
+        self.prompt.name = 'Renamed'
+        self.prompt.save()
+        self.assertEqual(self.client.get(self.url, self.params).data['results'][0]['name'], 'Renamed')
+
+        team = Team.objects.create(organization=self.org, name='Sharing')
+        self.client.get(self.url, self.params)
+        TeamPrompt.objects.create(team=team, prompt=self.prompt)
+        self.assertEqual(len(self.client.get(self.url, self.params).data['results'][0]['shared_teams']), 1)
+
+    def test_folder_delete_evicts_prompt_lists(self):
+        folder = Folder.objects.create(organization=self.org, name='Temp', user=self.user)
+        self.prompt.folder = folder
+        self.prompt.save()
+        self.assertEqual(self.client.get(self.url, self.params).data['results'][0]['folder'], folder.id)
+
+        folder.delete()
+        self.assertIsNone(self.client.get(self.url, self.params).data['results'][0]['folder'])
+
+    def test_writes_in_a_transaction_evict_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.prompt.name = 'Pending'
+            self.prompt.save()
+            # Another request reading before the commit caches the old rows under the new generation
+            during = response_cache.get_generations('prompts', [self.org.id])
+        self.assertNotEqual(response_cache.get_generations('prompts', [self.org.id]), during)
+
+    def test_other_organizations_do_not_evict(self):
+        self.client.get(self.url, self.params)
+        before = response_cache.stats()
+        Prompt.objects.create(organization=self.other_org, name='Elsewhere', prompt='Body', model='gpt-4')
+        self.client.get(self.url, self.params)
+        self.assertEqual(response_cache.stats()['hits'], before['hits'] + 1)
+
+    def test_stats_endpoint_requires_staff(self):
+        url = reverse('cache-stats')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('hits', response.data)
+        self.assertIn('hit_ratio', response.data)
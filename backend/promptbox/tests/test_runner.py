@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox.backends import ModelBackend, StepRequest, StubBackend
+from promptbox.models import (
+    User, Organization, OrganizationMember, Prompt, Workflow, WorkflowRun, WorkflowStep, WorkflowStepRun
+)
+from promptbox.runner import run_workflow
+
+
+class SlowBackend(StubBackend):
+    """Stub that takes a while and remembers how many calls overlapped."""
+    name = 'slow'
+
+    def __init__(self, delay=0.2):
+        super().__init__(delay=delay)
+        self.running = self.peak = 0
+
+    async def complete(self, request):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            return await super().complete(request)
+        finally:
+            self.running -= 1
+
+
+class FailingBackend(ModelBackend):
+    name = 'failing'
+
+    def complete_sync(self, request):
+        if 'explode' in request.text:
+            raise RuntimeError('Model unavailable')
+        return request.text.upper()
+
+
+class WorkflowRunnerTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='runner@example.com', password='password123', name='Runner')
+        self.client.force_authenticate(user=self.user)
+        self.org = Organization.objects.create(name='Runner Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.workflow = Workflow.objects.create(organization=self.org, created_by=self.user, name='Pipeline', visibility='PUBLIC')
+
+    def _step(self, order, name, body='Summarize', **prompt_fields):
+        prompt_fields = {'created_by': self.user, 'visibility': 'PUBLIC', **prompt_fields}
+        prompt = Prompt.objects.create(organization=self.org, name=name, prompt=body, model='gpt-4', **prompt_fields)
+        return WorkflowStep.objects.create(workflow=self.workflow, prompt=prompt, order=order, name=name)
+
+    def _stream(self, **body):
+        response = self.client.post(reverse('workflow-run', args=[self.workflow.id]), body, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_stub_backend_is_deterministic(self):
+        request = StepRequest(text='Hello', model='gpt-4', step_name='Greet')
+        first = asyncio.run(StubBackend().complete(request))
+        self.assertEqual(first, asyncio.run(StubBackend().complete(request)))
+        self.assertNotEqual(first, asyncio.run(StubBackend().complete(StepRequest(text='Bye', model='gpt-4'))))
+
+    def test_run_streams_events_and_records_timings(self):
+        self._step(1, 'Draft')
+        self._step(2, 'Review')
+        events = self._stream(input='Quarterly numbers')
+        self.assertEqual([event['event'] for event in events], ['run', 'step', 'step', 'done'])
+        self.assertEqual([event['name'] for event in events[1:3]], ['Draft', 'Review'])
+        self.assertEqual(events[-1]['status'], 'SUCCEEDED')
+        self.assertEqual(events[-1]['output'], events[2]['output'])
+
+        run = WorkflowRun.objects.get()
+        self.assertEqual((run.status, run.input, run.backend), ('SUCCEEDED', 'Quarterly numbers', 'stub'))
+        self.assertIsNotNone(run.duration_ms)
+        self.assertEqual(run.step_runs.filter(duration_ms__isnull=False, status='SUCCEEDED').count(), 2)
+
+        response = self.client.get(reverse('workflow-runs', args=[self.workflow.id]))
+        [listed] = response.data['results']
+        self.assertEqual([step['name'] for step in listed['step_runs']], ['Draft', 'Review'])
+
+    def test_steps_with_the_same_order_run_concurrently(self):
+        for name in ('Translate', 'Summarize', 'Classify'):
+            self._step(1, name)
+        self._step(2, 'Merge')
+        backend = SlowBackend()
+        run = run_workflow(self.workflow, backend, input_text='Text')
+        self.assertEqual(run.status, 'SUCCEEDED')
+        self.assertEqual(backend.peak, 3)
+        # Two groups of 0.2s, not four sequential steps
+        self.assertLess(run.duration_ms, 700)
+        merge = WorkflowStepRun.objects.get(run=run, name='Merge')
+        self.assertGreaterEqual(merge.queued_ms, 200)
+
+    @override_settings(PROMPTBOX_RUNNER_MAX_CONCURRENCY=2)
+    def test_concurrency_is_capped(self):
+        for i in range(4):
+            self._step(1, f'Part {i}')
+        backend = SlowBackend(delay=0.05)
+        run_workflow(self.workflow, backend)
+        self.assertEqual(backend.peak, 2)
+
+    def test_failed_step_stops_later_groups(self):
+        self._step(1, 'Fine', body='fine')
+        self._step(1, 'Broken', body='explode')
+        self._step(2, 'Never')
+        run = run_workflow(self.workflow, FailingBackend())
+        self.assertEqual(run.status, 'FAILED')
+        statuses = dict(run.step_runs.values_list('name', 'status'))
+        self.assertEqual(statuses, {'Fine': 'SUCCEEDED', 'Broken': 'FAILED', 'Never': 'SKIPPED'})
+        self.assertEqual(run.step_runs.get(name='Broken').error, 'Model unavailable')
+
+    def test_outputs_feed_the_next_group(self):
+        self._step(1, 'Shout', body='first')
+        self._step(2, 'Again', body='second')
+        run = run_workflow(self.workflow, FailingBackend(), input_text='input')
+        self.assertEqual(run.output, 'SECOND\n\nFIRST\n\nINPUT')
+
+    def test_prompts_the_user_cannot_see_are_not_run(self):
+        other = User.objects.create_user(email='owner@example.com', password='password123', name='Owner')
+        secret = self._step(1, 'Secret', body='classified', created_by=other, visibility='PRIVATE')
+        events = self._stream()
+        step = next(event for event in events if event['event'] == 'step')
+        self.assertEqual((step['step'], step['status'], step['output']), (str(secret.id), 'FAILED', ''))
+
+    def test_rejects_unknown_backend(self):
+        response = self.client.post(reverse('workflow-run', args=[self.workflow.id]), {'backend': 'promptbox.backends.StubBackend'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
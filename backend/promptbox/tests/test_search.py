@@ -0,0 +1,75 @@
+from io import StringIO
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox.models import User, Organization, OrganizationMember, Category, Prompt, PromptCategory
+from promptbox.search import get_search_backend
+
+class PromptSearchTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='search@example.com', password='password123', name='Search User')
+        self.other = User.objects.create_user(email='other@example.com', password='password123', name='Other User')
+        self.client.force_authenticate(user=self.user)
+
+        self.org = Organization.objects.create(name='Search Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        OrganizationMember.objects.create(organization=self.org, user=self.other, role='MEMBER')
+
+        self.category = Category.objects.create(organization=self.org, name='Summarization')
+        self.url = reverse('prompt-list')
+
+    def _create(self, name, body, visibility='PUBLIC', created_by=None, description=''):
+        return Prompt.objects.create(
+            organization=self.org, created_by=created_by or self.user, name=name,
+            description=description, prompt=body, model='gpt-4', visibility=visibility,
+        )
+
+    def _search(self, term, **params):
+        response = self.client.get(self.url, {'search': term, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [p['name'] for p in response.data['results']]
+
+    def test_search_ranks_name_matches_first(self):
+        self._create('Body mention', 'Please write a haiku about the sea.')
+        self._create('Haiku writer', 'Write a short poem.')
+        self._create('Unrelated', 'Translate to French.')
+
+        self.assertEqual(self._search('haiku'), ['Haiku writer', 'Body mention'])
+
+    def test_search_matches_prefixes_and_category_names(self):
+        prompt = self._create('Meeting notes', 'Condense the transcript.')
+        PromptCategory.objects.create(prompt=prompt, category=self.category)
+
+        self.assertEqual(self._search('summar'), ['Meeting notes'])
+        self.assertEqual(self._search('transcr'), ['Meeting notes'])
+
+    def test_search_applies_visibility_rules(self):
+        self._create('Private draft', 'Secret launch plan', visibility='PRIVATE', created_by=self.other)
+        self._create('Public plan', 'Public launch plan')
+
+        self.assertEqual(self._search('launch'), ['Public plan'])
+
+    def test_index_follows_updates_and_deletes(self):
+        prompt = self._create('Draft', 'Initial wording')
+        prompt.prompt = 'Revised wording about invoices'
+        prompt.save()
+        self.assertEqual(self._search('invoices'), ['Draft'])
+
+        prompt.delete()
+        self.assertEqual(self._search('invoices'), [])
+
+    def test_explicit_ordering_overrides_rank(self):
+        self._create('B report', 'quarterly report')
+        self._create('A summary', 'report')
+
+        self.assertEqual(self._search('report', ordering='name'), ['A summary', 'B report'])
+
+    def test_rebuild_command_backfills_index(self):
+        self._create('Backfilled', 'Needle in the haystack')
+        get_search_backend().clear()
+        self.assertEqual(self._search('needle'), [])
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self._search('needle'), ['Backfilled'])
@@ -0,0 +1,57 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase, APIClient
+from promptbox.models import User, Organization, OrganizationMember, Prompt, Workflow, WorkflowStep
+
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='sparse@example.com', password='password123', name='Sparse')
+        self.client.force_authenticate(user=self.user)
+
+        self.org = Organization.objects.create(name='Sparse Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.prompt = Prompt.objects.create(
+            organization=self.org, created_by=self.user, name='Long prompt',
+            prompt='word ' * 500, model='gpt-4', visibility='PUBLIC',
+        )
+        self.workflow = Workflow.objects.create(organization=self.org, created_by=self.user, name='Flow', visibility='PUBLIC')
+        for order in range(3):
+            WorkflowStep.objects.create(workflow=self.workflow, prompt=self.prompt, order=order)
+
+    def test_fields_param_limits_response_and_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('prompt-list'), {'fields': 'id,name'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+
+        prompt_sql = [q['sql'] for q in ctx.captured_queries if 'FROM "promptbox_prompt"' in q['sql'] and 'COUNT' not in q['sql']]
+        self.assertTrue(prompt_sql)
+        self.assertNotIn('"promptbox_prompt"."prompt"', prompt_sql[-1])
+        self.assertFalse(any('promptbox_promptcategory' in q['sql'] for q in ctx.captured_queries))
+
+    def test_exclude_param_drops_fields(self):
+        response = self.client.get(reverse('prompt-detail', kwargs={'pk': self.prompt.id}), {'exclude': 'prompt,shared_teams'})
+        self.assertNotIn('prompt', response.data)
+        self.assertNotIn('shared_teams', response.data)
+        self.assertIn('categories', response.data)
+
+    def test_prompt_summary_returns_truncated_preview(self):
+        response = self.client.get(reverse('prompt-list'), {'view': 'summary'})
+        item = response.data['results'][0]
+        self.assertNotIn('prompt', item)
+        self.assertNotIn('categories', item)
+        self.assertTrue(item['prompt_preview'].endswith('…'))
+        self.assertLessEqual(len(item['prompt_preview']), 201)
+
+    def test_workflow_summary_omits_steps_and_counts_them(self):
+        response = self.client.get(reverse('workflow-list'), {'view': 'summary'})
+        item = response.data['results'][0]
+        self.assertNotIn('steps', item)
+        self.assertEqual(item['step_count'], 3)
+
+    def test_full_representation_is_unchanged_by_default(self):
+        response = self.client.get(reverse('workflow-list'))
+        item = response.data['results'][0]
+        self.assertEqual(len(item['steps']), 3)
+        self.assertEqual(item['step_count'], 3)
@@ -0,0 +1,115 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox.models import User, Organization, OrganizationMember, Prompt, Workflow, WorkflowHistory, WorkflowStep
+from promptbox.outbox import drain
+from promptbox.steps import ORDER_GAP
+
+
+class WorkflowStepOperationTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='steps@example.com', password='password123', name='Stepper')
+        self.client.force_authenticate(user=self.user)
+        self.org = Organization.objects.create(name='Steps Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.prompt = Prompt.objects.create(organization=self.org, created_by=self.user, name='Step prompt', prompt='Do it', model='gpt-4')
+        self.workflow = Workflow.objects.create(organization=self.org, created_by=self.user, name='Flow')
+        self.url = reverse('workflow-steps', args=[self.workflow.id])
+
+    def _steps(self, orders):
+        return [
+            WorkflowStep.objects.create(workflow=self.workflow, prompt=self.prompt, order=order, name=f'Step {i}')
+            for i, order in enumerate(orders)
+        ]
+
+    def _edit(self, *operations):
+        return self.client.patch(self.url, {'operations': list(operations)}, format='json')
+
+    def _names(self):
+        return list(self.workflow.steps.order_by('order', 'created_at').values_list('name', flat=True))
+
+    def test_move_writes_only_the_moved_step(self):
+        steps = self._steps([(i + 1) * ORDER_GAP for i in range(50)])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._edit({'op': 'move', 'step': str(steps[40].id), 'after': str(steps[9].id)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        step_writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "promptbox_workflowstep"')]
+        self.assertEqual(len(step_writes), 1)
+        self.assertEqual(self._names()[10], 'Step 40')
+        moved = WorkflowStep.objects.get(id=steps[40].id)
+        self.assertEqual(moved.order, 10 * ORDER_GAP + ORDER_GAP // 2)
+        self.assertEqual(WorkflowStep.objects.filter(updated_at__gt=steps[49].updated_at).count(), 1)
+        self.assertEqual([step['name'] for step in response.data['steps']][10], 'Step 40')
+
+    def test_insert_remove_rename_and_parallel(self):
+        first, second = self._steps([ORDER_GAP, 2 * ORDER_GAP])
+        response = self._edit(
+            {'op': 'insert', 'prompt': str(self.prompt.id), 'name': 'Intro', 'after': None},
+            {'op': 'insert', 'prompt': str(self.prompt.id), 'name': 'Outro'},
+            {'op': 'insert', 'prompt': str(self.prompt.id), 'name': 'Alongside', 'parallel_with': str(second.id)},
+            {'op': 'rename', 'step': str(first.id), 'name': 'Renamed'},
+            {'op': 'remove', 'step': str(second.id)},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._names(), ['Intro', 'Renamed', 'Alongside', 'Outro'])
+        alongside = WorkflowStep.objects.get(workflow=self.workflow, name='Alongside')
+        self.assertEqual(alongside.order, 2 * ORDER_GAP)
+        self.assertEqual(WorkflowStep.objects.get(workflow=self.workflow, name='Outro').order, 3 * ORDER_GAP)
+
+        # Moving a step next to a group member takes it out of the group
+        self._edit({'op': 'move', 'step': str(alongside.id), 'after': str(first.id)})
+        orders = list(self.workflow.steps.order_by('order').values_list('order', flat=True))
+        self.assertEqual(len(set(orders)), 4)
+
+    def test_dense_orders_are_respaced_once(self):
+        steps = self._steps([1, 2, 3])
+        self._edit({'op': 'insert', 'prompt': str(self.prompt.id), 'name': 'Between', 'after': str(steps[0].id)})
+        self.assertEqual(self._names(), ['Step 0', 'Between', 'Step 1', 'Step 2'])
+        self.assertEqual(
+            list(self.workflow.steps.order_by('order').values_list('order', flat=True)),
+            [ORDER_GAP, ORDER_GAP + ORDER_GAP // 2, 2 * ORDER_GAP, 3 * ORDER_GAP],
+        )
+        drain()
+        operations = WorkflowHistory.objects.get(workflow=self.workflow).operations
+        self.assertEqual([op['op'] for op in operations], ['respace', 'insert'])
+
+    def test_history_records_operations_and_spliced_steps(self):
+        steps = self._steps([(i + 1) * ORDER_GAP for i in range(30)])
+        self._edit({'op': 'move', 'step': str(steps[25].id), 'after': str(steps[2].id)})
+        self._edit({'op': 'rename', 'step': str(steps[5].id), 'name': 'Renamed'})
+        drain()
+
+        second = WorkflowHistory.objects.get(workflow=self.workflow, version=2)
+        self.assertEqual(second.operations, [{'op': 'rename', 'step': str(steps[5].id), 'from': 'Step 5', 'name': 'Renamed'}])
+        self.assertFalse(second.is_keyframe)
+        self.assertNotIn('steps', second.delta.get('set', {}))
+        self.assertIn('steps', second.delta['splice'])
+
+        response = self.client.get(reverse('workflow-history', args=[self.workflow.id]))
+        latest = response.data['results'][0]
+        self.assertEqual(latest['change_summary'], 'Updated steps: rename')
+        self.assertEqual(latest['snapshot']['steps'][3]['name'], 'Step 25')
+
+    def test_failed_operation_writes_nothing(self):
+        first, = self._steps([ORDER_GAP])
+        other_org = Organization.objects.create(name='Elsewhere')
+        foreign = Prompt.objects.create(organization=other_org, created_by=self.user, name='Foreign', prompt='x', model='gpt-4')
+
+        response = self._edit(
+            {'op': 'rename', 'step': str(first.id), 'name': 'Renamed'},
+            {'op': 'insert', 'prompt': str(foreign.id)},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['operations'], [{}, {'prompt': ['Prompt not found.']}])
+        self.assertEqual(self._names(), ['Step 0'])
+
+        response = self._edit({'op': 'move', 'step': str(first.id)})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self._edit({'op': 'move', 'step': str(first.id), 'after': str(first.id)})
+        self.assertEqual(response.data['operations'][0], {'after': ['A step cannot be placed relative to itself.']})
+        drain()
+        self.assertFalse(WorkflowHistory.objects.filter(workflow=self.workflow).exists())
@@ -0,0 +1,81 @@
+import json
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from promptbox.models import User, Organization, OrganizationMember, Prompt
+from promptbox.templating import CompiledTemplate, MissingVariables, cache_info, clear_cache, get_template
+
+
+class CompiledTemplateTests(APITestCase):
+    def test_render_substitutes_variables(self):
+        template = CompiledTemplate('Hello {{ name }}, your {{item}} ships {{ name }}! {"json": {"stays": 1}}')
+        self.assertEqual(template.variables, ('name', 'item'))
+        self.assertEqual(
+            template.render({'name': 'Ada', 'item': 'order', 'unused': 'x'}),
+            'Hello Ada, your order ships Ada! {"json": {"stays": 1}}',
+        )
+
+    def test_missing_variables_are_reported(self):
+        with self.assertRaises(MissingVariables) as ctx:
+            CompiledTemplate('{{ a }} {{ b }}').render({'a': 1})
+        self.assertEqual(ctx.exception.names, ['b'])
+
+
+class BatchRenderTests(APITestCase):
+    def setUp(self):
+        clear_cache()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='render@example.com', password='password123', name='Renderer')
+        self.client.force_authenticate(user=self.user)
+        self.org = Organization.objects.create(name='Render Org')
+        OrganizationMember.objects.create(organization=self.org, user=self.user, role='ADMIN')
+        self.prompt = Prompt.objects.create(
+            organization=self.org, created_by=self.user, name='Greeting', model='gpt-4', visibility='PUBLIC',
+            prompt='Write to {{ name }} about {{ topic }}.',
+        )
+        self.url = reverse('prompt-render', args=[self.prompt.id])
+
+    def _render(self, body, content_type):
+        response = self.client.generic('POST', self.url, body, content_type=content_type)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_lists_variables(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data, {'variables': ['name', 'topic']})
+
+    def test_renders_csv_rows(self):
+        rows = ['name,topic'] + [f'"User {i}","Invoice, {i}"' for i in range(1000)]
+        results = self._render('\r\n'.join(rows) + '\r\n', 'text/csv')
+        self.assertEqual(len(results), 1000)
+        self.assertEqual(results[0], {'row': 1, 'text': 'Write to User 0 about Invoice, 0.'})
+        self.assertEqual(results[-1]['row'], 1000)
+
+    def test_renders_json_lines_and_reports_bad_rows(self):
+        body = '\n'.join([
+            json.dumps({'name': 'Ada', 'topic': 'engines'}),
+            json.dumps({'name': 'Grace'}),
+            '[1, 2]',
+            '{not json',
+        ])
+        results = self._render(body, 'application/x-ndjson')
+        self.assertEqual(results, [
+            {'row': 1, 'text': 'Write to Ada about engines.'},
+            {'row': 2, 'error': 'Missing variables: topic'},
+            {'row': 3, 'error': 'Each line must be a JSON object.'},
+            {'row': 4, 'error': 'Invalid JSON.'},
+        ])
+
+    def test_rejects_other_content_types(self):
+        response = self.client.post(self.url, {'name': 'x'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_templates_are_compiled_once_per_version(self):
+        first = get_template(self.prompt)
+        self.assertIs(get_template(Prompt.objects.get(id=self.prompt.id)), first)
+        self.client.patch(reverse('prompt-detail', args=[self.prompt.id]), {'prompt': 'Hi {{ name }}'}, format='json')
+        self.prompt.refresh_from_db()
+        self.assertEqual(get_template(self.prompt).variables, ('name',))
+        self.assertEqual((cache_info()['hits'], cache_info()['misses']), (1, 2))
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     AuthViewSet, OrganizationViewSet, TeamViewSet,
     PromptViewSet, CategoryViewSet, UserViewSet, FolderViewSet,
-    WorkflowViewSet
+    WorkflowViewSet, ListCacheStatsView
 )
 
 router = DefaultRouter()
@@ -17,5 +17,6 @@ router.register(r'users', UserViewSet)
 router.register(r'workflows', WorkflowViewSet)
 
 urlpatterns = [
+    path('cache-stats/', ListCacheStatsView.as_view(), name='cache-stats'),
     path('', include(router.urls)),
 ]
@@ -0,0 +1,206 @@
+"""
+Bulk user import.
+
+Rows (``email``, ``name``, ``password`` and an optional ``role``) are read
+from a CSV or JSON Lines stream (see promptbox.templating.read_rows) and
+handled in chunks: a chunk is validated against the file so far and the
+existing users in one query, its passwords are hashed, and its users,
+organization memberships and default-team memberships are written with
+``bulk_create`` in one transaction per chunk.
+
+Password hashing dominates the cost of creating a user, so it runs in a
+process pool (see promptbox.passwords), and a chunk is hashed while the
+previous one is written. The import_users command starts a pool per import;
+requests share one bounded pool (``shared_pool``) instead.
+An email taken by another writer after validation is reported as that row's
+error, and the rest of the chunk is written.
+``bulk_create`` skips model signals; the default-team membership that
+``add_member_to_default_team`` would add is written here instead.
+"""
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from .models import OrganizationMember, Team, TeamMember, User
+from .passwords import hash_password, pool_context
+
+CHUNK_SIZE = 500
+MAX_ROWS = 100_000
+# Smaller chunks are hashed in-process; starting the pool costs more than it saves
+POOL_MIN_ROWS = 16
+ROLES = ('ADMIN', 'MEMBER', 'VIEWER')
+EMAIL_TAKEN = 'A user with this email already exists.'
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def shared_pool_workers():
+    return min(os.cpu_count() or 1, getattr(settings, 'PROMPTBOX_USER_IMPORT_WORKERS', 2))
+
+
+def shared_pool():
+    """
+    The hashing pool shared by the server's import requests, started on first
+    use with ``shared_pool_workers()`` processes; None when that is 0 or 1
+    (hash in-process). Concurrent imports queue on it rather than each
+    starting processes of their own.
+    """
+    global _shared_pool
+    workers = shared_pool_workers()
+    if workers <= 1:
+        return None
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+        return _shared_pool
+
+
+class UserImporter:
+    def __init__(self, organization, role='MEMBER', workers=None, chunk_size=CHUNK_SIZE, max_rows=MAX_ROWS,
+                 pool=None):
+        """
+        ``role`` applies to rows without one of their own. ``workers`` is
+        the size of the hashing pool (default: one per CPU; 0 or 1 hashes
+        in-process). ``pool`` returns a running executor (e.g.
+        ``shared_pool``) to use instead of starting one; it is left running.
+        """
+        self.organization = organization
+        self.role = role
+        self.pool = pool
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = chunk_size
+        self.max_rows = max_rows
+        self.hasher = get_hasher()
+        self.default_team = Team.objects.filter(organization=organization, name=organization.name).first()
+        self.seen = set()
+        self.created = self.failed = 0
+
+    def run(self, rows):
+        """
+        Import ``rows`` (see read_rows) and yield one result per row, in
+        order: ``{"row": n, "id": ...}`` or ``{"row": n, "error": ...}``.
+        Results of a chunk are yielded once it is committed.
+        """
+        rows = iter(rows)
+        executor = None
+        pending = None
+        read = 0
+        try:
+            while True:
+                # Read at most one row past the limit, to report it
+                size = min(self.chunk_size, self.max_rows + 1 - read)
+                chunk = list(islice(rows, size))
+                read += len(chunk)
+                results, valid = self.validate(chunk)
+                if valid and executor is None and self.workers > 1 and len(valid) >= POOL_MIN_ROWS:
+                    executor = self.pool() if self.pool else ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=pool_context(),
+                    )
+                hashes = self.hash([fields['password'] for _, fields in valid], executor)
+                # Write the previous chunk while this one is being hashed
+                if pending is not None:
+                    yield from self.write(*pending)
+                pending = (results, valid, hashes)
+                if len(chunk) < size or read > self.max_rows:
+                    break
+            yield from self.write(*pending)
+        finally:
+            if executor is not None and self.pool is None:
+                executor.shutdown(cancel_futures=True)
+
+    def hash(self, passwords, executor):
+        if executor is None:
+            return iter([hash_password(self.hasher, password) for password in passwords])
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return executor.map(hash_password, [self.hasher] * len(passwords), passwords, chunksize=chunksize)
+
+    def validate(self, chunk):
+        """Returns ({row: result}, [(row, fields)]) for the chunk; the fields are ready to insert."""
+        results, valid = {}, []
+        for number, values in chunk:
+            if number > self.max_rows:
+                results[number] = {'row': number, 'error': f'At most {self.max_rows} rows per import.'}
+                break
+            error = values if isinstance(values, str) else None
+            fields = None if error else self.clean(values)
+            if isinstance(fields, str):
+                error = fields
+            elif fields is not None and fields['email'] in self.seen:
+                error = 'Duplicate email in this file.'
+            if error:
+                results[number] = {'row': number, 'error': error}
+            else:
+                self.seen.add(fields['email'])
+                valid.append((number, fields))
+
+        existing = set(User.objects.filter(
+            email__in=[fields['email'] for _, fields in valid]
+        ).values_list('email', flat=True))
+        for number, fields in valid:
+            if fields['email'] in existing:
+                results[number] = {'row': number, 'error': EMAIL_TAKEN}
+        return results, [(number, fields) for number, fields in valid if number not in results]
+
+    def clean(self, values):
+        """The row's fields, or an error message."""
+        fields = {name: str(values.get(name) or '').strip() for name in ('email', 'name', 'role')}
+        fields['password'] = values.get('password') or ''
+        missing = [name for name in ('email', 'name', 'password') if not fields[name]]
+        if missing:
+            return f'Missing {", ".join(missing)}.'
+        if not isinstance(fields['password'], str):
+            return 'password must be a string.'
+        fields['email'] = User.objects.normalize_email(fields['email'])
+        try:
+            validate_email(fields['email'])
+        except ValidationError:
+            return 'Enter a valid email address.'
+        fields['role'] = fields['role'].upper() or self.role
+        if fields['role'] not in ROLES:
+            return f'role must be one of: {", ".join(ROLES)}.'
+        return fields
+
+    def write(self, results, valid, hashes):
+        rows = [(number, fields, password) for (number, fields), password in zip(valid, hashes)]
+        while rows:
+            try:
+                self.insert(results, rows)
+                break
+            except IntegrityError:
+                # Another writer took some of these emails since validate()
+                emails = [fields['email'] for _, fields, _ in rows]
+                taken = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+                if not taken:
+                    raise
+                for number, fields, _ in rows:
+                    if fields['email'] in taken:
+                        results[number] = {'row': number, 'error': EMAIL_TAKEN}
+                rows = [row for row in rows if row[1]['email'] not in taken]
+        self.failed += sum(1 for result in results.values() if 'error' in result)
+        for number in sorted(results):
+            yield results[number]
+
+    def insert(self, results, rows):
+        users, memberships, team_memberships = [], [], []
+        for number, fields, password in rows:
+            user = User(id=uuid.uuid4(), email=fields['email'], name=fields['name'], password=password)
+            users.append(user)
+            memberships.append(OrganizationMember(organization=self.organization, user=user, role=fields['role']))
+            if self.default_team is not None:
+                team_memberships.append(TeamMember(team=self.default_team, user=user, role=fields['role']))
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+            OrganizationMember.objects.bulk_create(memberships)
+            TeamMember.objects.bulk_create(team_memberships)
+        for (number, _, _), user in zip(rows, users):
+            results[number] = {'row': number, 'id': str(user.id)}
+        self.created += len(users)
@@ -1,31 +1,194 @@
+import json
+
 from django.contrib.auth import authenticate, login, logout
-from django.db.models import Q
-from rest_framework import viewsets, permissions, status, filters, views, pagination
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery, prefetch_related_objects
+from django.db.models.functions import Coalesce, Length, Substr
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, permissions, status, filters, views
 from rest_framework.decorators import action
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from . import outbox as history_outbox
+from .access import prompt_access, workflow_access
+from .as_of import AsOfMixin, parse_as_of, prefetched
+from .bulk import BulkPromptReverter, BulkPromptWriter, MAX_ITEMS as BULK_MAX_ITEMS, MODES as BULK_MODES
 from .authentication import CsrfExemptSessionAuthentication
+from .backends import BACKENDS as MODEL_BACKENDS, get_model_backend
+from .conditional import ConditionalGetMixin
+from .deletion import delete_rows
+from .folders import FolderSubtree, SubtreeError, subtree
+from .history import diff_snapshots, prompt_history, workflow_history
+from .membership import as_uuid, get_membership
+from .pagination import StandardResultsSetPagination
+from .runner import WorkflowRunner
+from .response_cache import CachedListMixin, get_cache as get_response_cache, stats as list_cache_stats
+from .search import PromptSearchFilter
+from .steps import MAX_OPERATIONS as STEP_MAX_OPERATIONS, StepOperationError, WorkflowStepEditor
+from .templating import (
+    CSV_TYPES as TEMPLATE_CSV_TYPES, JSONL_TYPES as TEMPLATE_JSONL_TYPES, decode_lines, get_template, read_rows, render_rows
+)
+from .user_import import ROLES as USER_IMPORT_ROLES, UserImporter, shared_pool, shared_pool_workers
 
 from .models import (
     Organization, User, OrganizationMember, Team, TeamMember,
-    Category, Prompt, Folder, PromptHistory,
-    Workflow, WorkflowHistory
+    Category, Prompt, Folder, PromptHistory, PromptCategory, TeamPrompt,
+    Workflow, WorkflowHistory, WorkflowRun, WorkflowStep, WorkflowTeam, HistoryRetentionPolicy
 )
 from .serializers import (
     OrganizationSerializer, UserSerializer, OrganizationMemberSerializer,
     TeamSerializer, TeamMemberSerializer, CategorySerializer,
-    PromptSerializer, CreatePromptSerializer, UpdatePromptSerializer,
-    PromptHistorySerializer, FolderSerializer,
+    PromptSerializer, PromptSummarySerializer, CreatePromptSerializer, UpdatePromptSerializer,
+    PromptHistorySerializer, FolderSerializer, FolderTreeSerializer,
     UserManageSerializer, UserCreateSerializer, UserUpdateSerializer,
-    WorkflowSerializer, CreateWorkflowSerializer, UpdateWorkflowSerializer,
-    WorkflowHistorySerializer
+    WorkflowSerializer, WorkflowSummarySerializer, CreateWorkflowSerializer, UpdateWorkflowSerializer,
+    WorkflowHistorySerializer, WorkflowRunSerializer, WorkflowStepOperationSerializer,
+    HistoryRetentionPolicySerializer, PROMPT_PREVIEW_LENGTH,
+    build_prompt_snapshot, build_workflow_snapshot, diff_relation, lock_for_update
 )
 
-class StandardResultsSetPagination(pagination.PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'page_size'
-    max_page_size = 100
+
+def step_count():
+    """Steps per workflow, as a correlated subquery (no GROUP BY over the outer query)."""
+    steps = WorkflowStep.objects.filter(workflow=OuterRef('pk')).order_by().values('workflow').annotate(count=Count('id'))
+    return Coalesce(Subquery(steps.values('count')), 0)
+
+
+class SparseFieldsMixin:
+    """
+    Lets list and detail callers trim responses with ``?fields=a,b`` /
+    ``?exclude=c``, or switch to the summary serializer with ``?view=summary``.
+    Columns and relations the response will not contain are not loaded.
+    """
+    summary_serializer_class = None
+    # Columns ``?view=summary`` loads (all of them when empty)
+    summary_fields = ()
+    deferrable_fields = ()
+    select_related_fields = {}
+
+    def get_prefetch_fields(self):
+        """Map of serializer field -> Prefetch needed to render it."""
+        return {}
+
+    def get_annotated_fields(self):
+        """Map of serializer field -> expression annotated under the same name."""
+        return {}
+
+    def get_summary_annotations(self):
+        """Like get_annotated_fields, for the summary serializer."""
+        return {}
+
+    def is_summary(self):
+        return self.action in ('list', 'retrieve') and self.request.query_params.get('view') == 'summary'
+
+    def get_sparse_fields(self):
+        if self.action not in ('list', 'retrieve'):
+            return None, None
+
+        def parse(param):
+            raw = self.request.query_params.get(param)
+            if raw is None:
+                return None
+            return {name.strip() for name in raw.split(',') if name.strip()}
+
+        return parse('fields'), parse('exclude')
+
+    def wants_field(self, name):
+        only, exclude = self.get_sparse_fields()
+        if only is not None and name not in only:
+            return False
+        return not (exclude and name in exclude)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'], context['exclude'] = self.get_sparse_fields()
+        return context
+
+    def summarize_queryset(self, queryset):
+        if self.summary_fields:
+            queryset = queryset.only(*self.summary_fields)
+        annotations = self.get_summary_annotations()
+        return queryset.annotate(**annotations) if annotations else queryset
+
+    def optimize_queryset(self, queryset):
+        if self.is_summary():
+            return self.summarize_queryset(queryset)
+
+        deferred = [name for name in self.deferrable_fields if not self.wants_field(name)]
+        if deferred:
+            queryset = queryset.defer(*deferred)
+
+        related = [rel for name, rel in self.select_related_fields.items() if self.wants_field(name)]
+        if related:
+            queryset = queryset.select_related(*related)
+
+        annotations = {name: expression for name, expression in self.get_annotated_fields().items() if self.wants_field(name)}
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+
+        prefetches = {}
+        for name, prefetch in self.get_prefetch_fields().items():
+            if self.wants_field(name):
+                prefetches.setdefault(prefetch.prefetch_to, prefetch)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches.values())
+        return queryset
+
+
+class VersionDiffMixin:
+    """
+    ``GET <detail>/diff/?from=<history_id>&to=<history_id|current>`` returns
+    the changes between two versions (see history.diff_snapshots). A diff of
+    two history rows never changes, so results are cached by version pair;
+    diffs against the current state are keyed by the object's updated_at.
+    """
+    history_store = None
+    # Callable returning the current state of an object in history snapshot form
+    snapshot_builder = None
+    diff_cache_timeout = 60 * 60 * 24
+
+    @action(detail=True, methods=['get'])
+    def diff(self, request, pk=None):
+        """Compare two versions of this object."""
+        obj = self.get_object()
+        history_outbox.flush(self.history_store, [obj.pk])
+        from_id = as_uuid(request.query_params.get('from'))
+        to_param = request.query_params.get('to', 'current')
+        to_current = to_param == 'current'
+        to_id = None if to_current else as_uuid(to_param)
+        if from_id is None or (not to_current and to_id is None):
+            return Response({'error': 'from and to must be history IDs (to may be "current")'}, status=status.HTTP_400_BAD_REQUEST)
+
+        history = self.history_store.model.objects.filter(**{self.history_store.field: obj})
+        wanted = {from_id} if to_current else {from_id, to_id}
+        versions = {
+            row_id: {'id': row_id, 'version': version, 'created_at': created_at}
+            for row_id, version, created_at in history.filter(id__in=wanted).values_list('id', 'version', 'created_at')
+        }
+        if len(versions) != len(wanted):
+            return Response({'error': 'History entry not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        to_key = f'current@{obj.updated_at.isoformat()}' if to_current else to_id
+        key = f'promptbox:diff:{self.basename}:{from_id}:{to_key}'
+        cache = get_response_cache()
+        data = cache.get(key)
+        if data is None:
+            rows = self.history_store.resolve(list(history.filter(id__in=wanted)))
+            snapshots = {row.id: row.snapshot for row in rows}
+            if to_current:
+                new, target = self.snapshot_builder(obj), {'id': 'current', 'updated_at': obj.updated_at}
+            else:
+                new, target = snapshots[to_id], versions[to_id]
+            data = {
+                'from': versions[from_id],
+                'to': target,
+                'changes': diff_snapshots(snapshots[from_id], new),
+            }
+            cache.set(key, data, self.diff_cache_timeout)
+        return Response(data)
+
 
 class AuthViewSet(viewsets.ViewSet):
     """
@@ -71,6 +234,14 @@ class AuthViewSet(viewsets.ViewSet):
         serializer = UserSerializer(user)
         return Response({'status': 'created', 'user': serializer.data}, status=status.HTTP_201_CREATED)
 
+class ListCacheStatsView(views.APIView):
+    """Hit/miss counters of the list response cache, for sizing it."""
+    permission_classes = [IsAdminUser]
+    authentication_classes = [CsrfExemptSessionAuthentication]
+
+    def get(self, request):
+        return Response(list_cache_stats())
+
 class OrganizationViewSet(viewsets.ModelViewSet):
     queryset = Organization.objects.all()
     serializer_class = OrganizationSerializer
@@ -102,6 +273,28 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         serializer = OrganizationMemberSerializer(members, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get', 'put', 'patch', 'delete'], url_path='history-retention')
+    def history_retention(self, request, pk=None):
+        """Read or change the organization's history retention policy (admins only)."""
+        organization = self.get_object()
+        if not get_membership(request.user, request).is_admin(organization.id):
+            return Response({'error': 'Admin role required'}, status=status.HTTP_403_FORBIDDEN)
+
+        policy = HistoryRetentionPolicy.objects.filter(organization=organization).first()
+        if request.method == 'GET':
+            if policy is None:
+                return Response({'error': 'No retention policy configured'}, status=status.HTTP_404_NOT_FOUND)
+            return Response(HistoryRetentionPolicySerializer(policy).data)
+        if request.method == 'DELETE':
+            if policy is not None:
+                policy.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        serializer = HistoryRetentionPolicySerializer(policy, data=request.data, partial=request.method == 'PATCH')
+        serializer.is_valid(raise_exception=True)
+        serializer.save(organization=organization)
+        return Response(serializer.data)
+
 class TeamViewSet(viewsets.ModelViewSet):
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
@@ -142,7 +335,7 @@ class TeamViewSet(viewsets.ModelViewSet):
             return Response({'error': 'User is already in the team'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Verify user is in the organization
-        if not OrganizationMember.objects.filter(organization=team.organization, user=user).exists():
+        if not get_membership(user).is_member(team.organization_id):
              return Response({'error': 'User is not a member of the organization'}, status=status.HTTP_400_BAD_REQUEST)
 
         TeamMember.objects.create(team=team, user=user, role=role)
@@ -161,35 +354,59 @@ class TeamViewSet(viewsets.ModelViewSet):
         except TeamMember.DoesNotExist:
             return Response({'error': 'Member not found in team'}, status=status.HTTP_404_NOT_FOUND)
 
-class PromptViewSet(viewsets.ModelViewSet):
+class PromptViewSet(CachedListMixin, ConditionalGetMixin, AsOfMixin, SparseFieldsMixin, VersionDiffMixin, viewsets.ModelViewSet):
     queryset = Prompt.objects.all()
     serializer_class = PromptSerializer
     permission_classes = [IsAuthenticated]
     authentication_classes = [CsrfExemptSessionAuthentication]
     pagination_class = StandardResultsSetPagination
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    # Search runs after ordering so relevance can take precedence over the default ordering
+    filter_backends = [filters.OrderingFilter, PromptSearchFilter]
     search_fields = ['name', 'description', 'prompt', 'prompt_categories__category__name']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
+    cache_scope = 'prompts'
+    summary_fields = [
+        'id', 'organization', 'created_by', 'name', 'description',
+        'model', 'visibility', 'folder', 'created_at', 'updated_at',
+    ]
+    deferrable_fields = ['prompt', 'description']
+    select_related_fields = {'created_by_name': 'created_by'}
+    version_related_fields = {'prompt_categories': 'category', 'shared_teams': 'team'}
+    version_forward_fields = ['created_by']
+    history_store = prompt_history
+    snapshot_builder = staticmethod(build_prompt_snapshot)
+
+    def get_prefetch_fields(self):
+        return {
+            'categories': Prefetch('prompt_categories', queryset=PromptCategory.objects.select_related('category')),
+            'shared_teams': Prefetch('shared_teams', queryset=TeamPrompt.objects.select_related('team')),
+        }
 
     def get_serializer_class(self):
         if self.action == 'create':
             return CreatePromptSerializer
         if self.action in ['update', 'partial_update']:
             return UpdatePromptSerializer
+        if self.is_summary():
+            return PromptSummarySerializer
         return PromptSerializer
 
+    def get_summary_annotations(self):
+        # The body is truncated by the database
+        return {
+            'prompt_preview': Substr('prompt', 1, PROMPT_PREVIEW_LENGTH),
+            'prompt_length': Length('prompt'),
+        }
+
     def get_queryset(self):
         user = self.request.user
 
-        # Get user's organization IDs
-        user_org_ids = OrganizationMember.objects.filter(user=user).values_list('organization_id', flat=True)
-
-        # Get user's team IDs
-        user_team_ids = TeamMember.objects.filter(user=user).values_list('team_id', flat=True)
+        # User's organization and team IDs (cached, see promptbox.membership)
+        membership = get_membership(user, self.request)
 
         # Base queryset restricted to user's organizations
-        base_queryset = Prompt.objects.filter(organization_id__in=user_org_ids)
+        base_queryset = Prompt.objects.filter(organization_id__in=membership.org_ids)
 
         # Get query params
         org_id = self.request.query_params.get('organization_id')
@@ -202,35 +419,34 @@ class PromptViewSet(viewsets.ModelViewSet):
         if org_id:
             base_queryset = base_queryset.filter(organization_id=org_id)
 
-        # Apply folder filter if specified
-        if folder_id:
+        # Point-in-time reads only include prompts that existed back then
+        base_queryset = self.as_of_queryset(base_queryset)
+        as_of = self.get_as_of()
+
+        # Apply folder filter if specified (as of then, see below, for point-in-time reads)
+        if folder_id and folder_id != 'root' and self.request.query_params.get('include_subfolders') == 'true':
+            # Prompts anywhere under the folder (as placed now, also for point-in-time
+            # reads): one range scan of the folder path index
+            path = Folder.objects.filter(
+                id=as_uuid(folder_id), organization_id__in=membership.org_ids
+            ).values_list('path', flat=True).first()
+            base_queryset = base_queryset.filter(**subtree(path, 'folder__')) if path else base_queryset.none()
+            folder_id = None
+        elif folder_id and as_of is None:
             if folder_id == 'root':
                 base_queryset = base_queryset.filter(folder__isnull=True)
             else:
                 base_queryset = base_queryset.filter(folder_id=folder_id)
 
-        # If specific visibility is requested, filter by that visibility with appropriate access rules
+        # Apply PublicPromptFetchRules through the precomputed access index:
+        # 1. PUBLIC prompts are indexed under their organization
+        # 2. TEAM prompts are indexed under every team they are shared with
+        # 3. PRIVATE prompts are indexed under their creator
+        queryset = prompt_access.visible(base_queryset, membership.principal_ids)
+
+        # If specific visibility is requested, the access rules above already apply to it
         if visibility:
-            if visibility == 'PUBLIC':
-                queryset = base_queryset.filter(visibility='PUBLIC')
-            elif visibility == 'TEAM':
-                # Only return TEAM prompts shared with user's teams
-                queryset = base_queryset.filter(visibility='TEAM', shared_teams__team_id__in=user_team_ids)
-            elif visibility == 'PRIVATE':
-                # Only return PRIVATE prompts created by the user
-                queryset = base_queryset.filter(visibility='PRIVATE', created_by=user)
-            else:
-                queryset = base_queryset.filter(visibility=visibility)
-        else:
-            # No visibility filter: Apply PublicPromptFetchRules business rules
-            # 1. Return all prompts with visibility = PUBLIC
-            # 2. Return all prompts with visibility = TEAM and team_id in user's teams
-            # 3. Return all prompts with visibility = PRIVATE and created_by = user.id
-            queryset = base_queryset.filter(
-                Q(visibility='PUBLIC') |
-                Q(visibility='TEAM', shared_teams__team_id__in=user_team_ids) |
-                Q(visibility='PRIVATE', created_by=user)
-            ).distinct()
+            queryset = queryset.filter(visibility=visibility)
 
         # Apply team filter if specified (for specific team queries)
         if team_id:
@@ -243,15 +459,143 @@ class PromptViewSet(viewsets.ModelViewSet):
             else:
                 queryset = queryset.filter(created_by_id=created_by)
 
-        return queryset
+        # The folder a prompt was in at as_of may differ from its current one
+        if folder_id and as_of is not None:
+            if folder_id == 'root':
+                queryset = self.filter_as_of(queryset, 'folder_id', None, folder__isnull=True)
+            elif as_uuid(folder_id) is None:
+                queryset = queryset.none()
+            else:
+                queryset = self.filter_as_of(queryset, 'folder_id', as_uuid(folder_id), folder_id=folder_id)
+
+        # Load everything the serializer reads in a fixed number of queries
+        return self.optimize_queryset(queryset)
+
+    def restore_snapshots(self, pairs):
+        snapshots = [snapshot for _, snapshot in pairs]
+        categories = Category.objects.in_bulk({cid for s in snapshots for cid in s.get('category_ids', ())})
+        teams = Team.objects.in_bulk({tid for s in snapshots for tid in s.get('team_ids', ())})
+        for prompt, snapshot in pairs:
+            for field in ('name', 'description', 'prompt', 'model', 'visibility'):
+                if field in snapshot:
+                    setattr(prompt, field, snapshot[field])
+            if 'folder' in snapshot:
+                prompt.folder_id = as_uuid(snapshot['folder'])
+            prompt_categories = []
+            for category_id in snapshot.get('category_ids', ()):
+                row = PromptCategory(prompt=prompt, category_id=category_id)
+                PromptCategory.category.field.set_cached_value(row, categories.get(as_uuid(category_id)))
+                prompt_categories.append(row)
+            shared_teams = []
+            for team_id in snapshot.get('team_ids', ()):
+                row = TeamPrompt(prompt=prompt, team_id=team_id)
+                TeamPrompt.team.field.set_cached_value(row, teams.get(as_uuid(team_id)))
+                shared_teams.append(row)
+            prompt._prefetched_objects_cache = {
+                'prompt_categories': prefetched(PromptCategory, prompt_categories),
+                'shared_teams': prefetched(TeamPrompt, shared_teams),
+            }
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create, update and delete many prompts in one request.
+
+        Body: ``{"mode": "atomic" | "best_effort", "items": [{"op": "create" |
+        "update" | "delete", ...}]}``. Returns one result per item; see
+        promptbox.bulk for the semantics of each mode.
+        """
+        mode = request.data.get('mode', 'atomic')
+        items = request.data.get('items')
+        if mode not in BULK_MODES:
+            return Response({'error': f'mode must be one of: {", ".join(BULK_MODES)}'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'items must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > BULK_MAX_ITEMS:
+            return Response({'error': f'At most {BULK_MAX_ITEMS} items per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+        writer = BulkPromptWriter(request.user, get_membership(request.user, request), mode)
+        results, written = writer.run(items)
+        failed = sum(1 for result in results if result['status'] == 'error')
+        if not written:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif failed:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_200_OK
+        return Response({'mode': mode, 'written': written, 'failed': failed, 'results': results}, status=response_status)
+
+    @action(detail=False, methods=['post'], url_path='bulk-revert')
+    def bulk_revert(self, request):
+        """
+        Revert many prompts to their state at a point in time.
+
+        Body: ``{"as_of": <timestamp>, "organization_id": ..., "folder_id":
+        ..., "ids": [...], "dry_run": false}``. At least one of the scope
+        filters is required; given filters are combined. With ``dry_run``
+        the response lists what would change and nothing is written.
+        """
+        try:
+            as_of = parse_as_of(str(request.data.get('as_of') or ''))
+        except ValueError:
+            return Response({'as_of': 'Expected an ISO 8601 date or timestamp.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        membership = get_membership(request.user, request)
+        organization_id = request.data.get('organization_id')
+        folder_id = request.data.get('folder_id')
+        prompt_ids = request.data.get('ids')
+        if not (organization_id or folder_id or prompt_ids is not None):
+            return Response({'error': 'One of organization_id, folder_id or ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if organization_id and not membership.is_member(organization_id):
+            return Response({'error': 'You are not a member of this organization'}, status=status.HTTP_403_FORBIDDEN)
+        if folder_id and not Folder.objects.filter(id=as_uuid(folder_id), organization_id__in=membership.org_ids).exists():
+            return Response({'error': 'Folder not found'}, status=status.HTTP_404_NOT_FOUND)
+        if prompt_ids is not None:
+            if not isinstance(prompt_ids, list) or len(prompt_ids) > BULK_MAX_ITEMS:
+                return Response({'error': f'ids must be a list of at most {BULK_MAX_ITEMS} IDs'}, status=status.HTTP_400_BAD_REQUEST)
+            prompt_ids = [as_uuid(prompt_id) for prompt_id in prompt_ids]
+            if None in prompt_ids:
+                return Response({'error': 'ids must be UUIDs'}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = request.data.get('dry_run') in (True, 'true', '1')
+        reverter = BulkPromptReverter(request.user, membership)
+        scope = reverter.scope(as_of, organization_id, as_uuid(folder_id) if folder_id else None, prompt_ids)
+        counts, results = reverter.run(scope, as_of, dry_run=dry_run)
+        return Response({'as_of': as_of, 'dry_run': dry_run, **counts, 'results': results})
+
+    @action(detail=True, methods=['get', 'post'])
+    def render(self, request, pk=None):
+        """
+        GET lists the template variables of the prompt. POST renders it for
+        every row of a CSV (``text/csv``, header row = variable names) or JSON
+        Lines body and streams one NDJSON line per row back: ``{"row": n,
+        "text": ...}`` or ``{"row": n, "error": ...}``.
+        """
+        prompt = self.get_object()
+        template = get_template(prompt)
+        if request.method == 'GET':
+            return Response({'variables': list(template.variables)})
+
+        content_type = request.content_type.split(';')[0].strip().lower()
+        if content_type not in TEMPLATE_CSV_TYPES + TEMPLATE_JSONL_TYPES:
+            return Response(
+                {'error': f'Send rows as one of: {", ".join(TEMPLATE_CSV_TYPES + TEMPLATE_JSONL_TYPES)}'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        # The body is read lazily, row by row, while the response streams
+        rows = read_rows(decode_lines(request._request), content_type)
+        response = StreamingHttpResponse(render_rows(template, rows), content_type='application/x-ndjson')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
     @action(detail=True, methods=['get'])
     def history(self, request, pk=None):
         """Return paginated change history for a prompt."""
         prompt = self.get_object()
+        history_outbox.flush(prompt_history, [prompt.pk])
         history_qs = PromptHistory.objects.filter(prompt=prompt)
         page = self.paginate_queryset(history_qs)
         if page is not None:
@@ -273,53 +617,49 @@ class PromptViewSet(viewsets.ModelViewSet):
         except PromptHistory.DoesNotExist:
             return Response({'error': 'History entry not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        snapshot = history_entry.snapshot
-
-        # Build snapshot of current state before reverting
-        current_snapshot = {
-            'name': prompt.name,
-            'description': prompt.description,
-            'prompt': prompt.prompt,
-            'model': prompt.model,
-            'visibility': prompt.visibility,
-            'folder': str(prompt.folder_id) if prompt.folder_id else None,
-            'category_ids': sorted([str(pc.category_id) for pc in prompt.prompt_categories.all()]),
-            'team_ids': sorted([str(tp.team_id) for tp in prompt.shared_teams.all()]),
-        }
-
-        # Apply snapshot fields
-        for field in ['name', 'description', 'prompt', 'model', 'visibility']:
-            if field in snapshot:
-                setattr(prompt, field, snapshot[field])
-
-        if 'folder' in snapshot:
-            prompt.folder_id = snapshot['folder']
-
-        prompt.save()
-
-        # Restore categories
-        if 'category_ids' in snapshot:
-            prompt.prompt_categories.all().delete()
-            from .models import PromptCategory
-            for cat_id in snapshot['category_ids']:
-                PromptCategory.objects.create(prompt=prompt, category_id=cat_id)
-
-        # Restore teams
-        if 'team_ids' in snapshot:
-            prompt.shared_teams.all().delete()
-            from .models import TeamPrompt
-            for tid in snapshot['team_ids']:
-                TeamPrompt.objects.create(prompt=prompt, team_id=tid)
-
-        # Create history entry for the revert
-        revert_date = history_entry.created_at.strftime('%Y-%m-%d %H:%M')
-        PromptHistory.objects.create(
-            prompt=prompt,
-            changed_by=request.user,
-            change_summary=f'Reverted to version from {revert_date}',
-            snapshot=current_snapshot,
-        )
-
+        snapshot = prompt_history.snapshot(history_entry)
+
+        with transaction.atomic():
+            # The "before" snapshot is read from the locked row, so a write
+            # that lands meanwhile is recorded rather than lost
+            lock_for_update(prompt)
+            prefetch_related_objects([prompt], 'prompt_categories', 'shared_teams')
+            current_snapshot = build_prompt_snapshot(prompt)
+
+            # Apply snapshot fields
+            for field in ['name', 'description', 'prompt', 'model', 'visibility']:
+                if field in snapshot:
+                    setattr(prompt, field, snapshot[field])
+
+            if 'folder' in snapshot:
+                prompt.folder_id = snapshot['folder']
+
+            # Restore categories and teams, touching only the rows that differ
+            if 'category_ids' in snapshot:
+                wanted = [as_uuid(cat_id) for cat_id in snapshot['category_ids']]
+                stale, added = diff_relation(prompt.prompt_categories.all(), 'category_id', wanted)
+                delete_rows(PromptCategory, stale)
+                PromptCategory.objects.bulk_create([PromptCategory(prompt=prompt, category_id=cat_id) for cat_id in added])
+
+            if 'team_ids' in snapshot:
+                wanted = [as_uuid(tid) for tid in snapshot['team_ids']]
+                stale, added = diff_relation(prompt.shared_teams.all(), 'team_id', wanted)
+                delete_rows(TeamPrompt, stale)
+                TeamPrompt.objects.bulk_create([TeamPrompt(prompt=prompt, team_id=tid) for tid in added])
+
+            # Saved last, so its signals reindex, resync access and evict
+            # caches once against the restored relations
+            prompt.save()
+
+            # Queue the history entry for the revert
+            revert_date = history_entry.created_at.strftime('%Y-%m-%d %H:%M')
+            history_outbox.enqueue(prompt_history, [(prompt.pk, current_snapshot, {
+                'changed_by': request.user,
+                'change_summary': f'Reverted to version from {revert_date}',
+            })])
+
+        # Relations were rewritten above, so drop the prefetched copies
+        prompt._prefetched_objects_cache = {}
         serializer = PromptSerializer(prompt)
         return Response(serializer.data)
 
@@ -335,7 +675,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
             return Category.objects.filter(organization_id=org_id)
         return Category.objects.all()
 
-class FolderViewSet(viewsets.ModelViewSet):
+class FolderViewSet(CachedListMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Folder.objects.all()
     serializer_class = FolderSerializer
     permission_classes = [IsAuthenticated]
@@ -343,14 +683,74 @@ class FolderViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
+    cache_scope = 'folders'
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        # Set-based instead of the cascade collector; prompts are detached as before
+        self.get_subtree(instance).purge()
+
+    def get_subtree(self, folder):
+        membership = get_membership(self.request.user, self.request)
+        return FolderSubtree(folder, user=self.request.user, principal_ids=membership.principal_ids)
+
+    def get_target_folder(self, folder_id):
+        """The folder named by ``folder_id`` in the request body (``None`` for the root level)."""
+        if folder_id is None:
+            return None
+        target = Folder.objects.filter(
+            id=as_uuid(folder_id), organization_id__in=get_membership(self.request.user, self.request).org_ids
+        ).first()
+        if target is None:
+            raise ValidationError({'parent': 'Folder not found.'})
+        return target
+
+    @action(detail=True, methods=['post'])
+    def move(self, request, pk=None):
+        """Move the folder and its subtree under ``{"parent": <id> | null}``."""
+        folder = self.get_object()
+        try:
+            moved = self.get_subtree(folder).move(self.get_target_folder(request.data.get('parent')))
+        except SubtreeError as exc:
+            return Response({'parent': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'folder': FolderSerializer(folder).data, 'folders': moved})
+
+    @action(detail=True, methods=['post'])
+    def copy(self, request, pk=None):
+        """
+        Deep-copy the folder, its subfolders and the prompts in them that
+        the user can see (with their categories and team shares). Body:
+        ``{"parent": <id> | null, "name": "..."}``; by default the copy is
+        placed next to the original.
+        """
+        folder = self.get_object()
+        parent_id = request.data['parent'] if 'parent' in request.data else folder.parent_id
+        name = request.data.get('name')
+        if name is not None and (not isinstance(name, str) or not name.strip()):
+            return Response({'name': 'Expected a non-empty string.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            root, folders, prompts = self.get_subtree(folder).copy(self.get_target_folder(parent_id), name=name)
+        except SubtreeError as exc:
+            return Response({'parent': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'folder': FolderSerializer(root).data, 'folders': folders, 'prompts': prompts}, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def purge(self, request, pk=None):
+        """
+        Delete the folder and its subtree. ``{"delete_prompts": true}`` also
+        deletes the prompts in it that the user can see; all other prompts
+        are moved to the root level.
+        """
+        folder = self.get_object()
+        delete = request.data.get('delete_prompts') in (True, 'true', '1')
+        folders, deleted, detached = self.get_subtree(folder).purge(delete=delete)
+        return Response({'folders': folders, 'prompts_deleted': deleted, 'prompts_detached': detached})
+
     def get_queryset(self):
-        user = self.request.user
-        user_org_ids = OrganizationMember.objects.filter(user=user).values_list('organization_id', flat=True)
-        queryset = Folder.objects.filter(organization_id__in=user_org_ids)
+        membership = get_membership(self.request.user, self.request)
+        queryset = Folder.objects.filter(organization_id__in=membership.org_ids)
 
         org_id = self.request.query_params.get('organization_id')
         parent_id = self.request.query_params.get('parent_id')
@@ -378,7 +778,64 @@ class FolderViewSet(viewsets.ModelViewSet):
 
         return queryset
 
-class WorkflowViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """
+        Return folders as a nested tree: the whole subtree under
+        ``?root=<id>`` (the other filters do not apply then), or the trees
+        the other filters select. A folder whose parent is filtered out is
+        left out with everything below it rather than shown as a root, so
+        every node sits under its real parent. Each folder carries the number
+        of prompts visible to the user directly in it (``prompt_count``) and
+        in the returned nodes below it (``subtree_prompt_count``). Constant
+        queries: the root, the subtree (one path range scan) and the prompt
+        counts.
+        """
+        membership = get_membership(request.user, request)
+        root_id = request.query_params.get('root')
+        if root_id:
+            queryset = Folder.objects.filter(organization_id__in=membership.org_ids)
+            root = queryset.filter(id=as_uuid(root_id)).values_list('id', 'path').first()
+            if root is None:
+                return Response({'error': 'Folder not found'}, status=status.HTTP_404_NOT_FOUND)
+            tops = {root[0]}
+            queryset = queryset.filter(**subtree(root[1]))
+        else:
+            queryset = self.get_queryset()
+            tops = {None, as_uuid(request.query_params.get('parent_id'))}
+
+        # Depth order puts every parent before its children
+        folders = []
+        kept = set()
+        for folder in queryset.order_by('depth', 'name', 'id'):
+            if folder.pk in tops or folder.parent_id in tops or folder.parent_id in kept:
+                folders.append(folder)
+                kept.add(folder.pk)
+
+        prompts = Prompt.objects.filter(folder_id__in=queryset.values('id'))
+        counts = dict(
+            prompt_access.visible(prompts, membership.principal_ids)
+            .order_by().values('folder_id').annotate(count=Count('id')).values_list('folder_id', 'count')
+        )
+
+        by_id = {folder.pk: folder for folder in folders}
+        for folder in folders:
+            folder.prompt_count = folder.subtree_prompt_count = counts.get(folder.pk, 0)
+        # Deepest first, so every subtree is complete before it is added to its parent
+        for folder in reversed(folders):
+            parent = by_id.get(folder.parent_id)
+            if parent is not None:
+                parent.subtree_prompt_count += folder.subtree_prompt_count
+
+        nodes = {}
+        roots = []
+        for folder, data in zip(folders, FolderTreeSerializer(folders, many=True).data):
+            nodes[folder.pk] = node = {**data, 'children': []}
+            parent = nodes.get(folder.parent_id)
+            (parent['children'] if parent is not None else roots).append(node)
+        return Response(roots)
+
+class WorkflowViewSet(CachedListMixin, ConditionalGetMixin, AsOfMixin, SparseFieldsMixin, VersionDiffMixin, viewsets.ModelViewSet):
     queryset = Workflow.objects.all()
     serializer_class = WorkflowSerializer
     permission_classes = [IsAuthenticated]
@@ -388,47 +845,95 @@ class WorkflowViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
+    cache_scope = 'workflows'
+    summary_fields = [
+        'id', 'organization', 'created_by', 'name', 'description',
+        'visibility', 'created_at', 'updated_at',
+    ]
+    deferrable_fields = ['description']
+    select_related_fields = {'created_by_name': 'created_by'}
+    version_related_fields = {'steps': 'prompt', 'shared_teams': 'team'}
+    version_forward_fields = ['created_by']
+    history_store = workflow_history
+    snapshot_builder = staticmethod(build_workflow_snapshot)
+
+    def get_prefetch_fields(self):
+        # Steps need their prompt's name (and updated_at for validators); the bodies stay in the database
+        steps = WorkflowStep.objects.select_related('prompt').only(
+            'id', 'workflow_id', 'prompt__id', 'prompt__name', 'prompt__updated_at', 'order', 'name',
+        )
+        return {
+            'steps': Prefetch('steps', queryset=steps),
+            'shared_teams': Prefetch('shared_teams', queryset=WorkflowTeam.objects.select_related('team')),
+        }
+
+    def get_annotated_fields(self):
+        return {'step_count': step_count()}
 
     def get_serializer_class(self):
         if self.action == 'create':
             return CreateWorkflowSerializer
         if self.action in ['update', 'partial_update']:
             return UpdateWorkflowSerializer
+        if self.is_summary():
+            return WorkflowSummarySerializer
         return WorkflowSerializer
 
+    def get_summary_annotations(self):
+        return {'step_count': step_count()}
+
     def get_queryset(self):
-        user = self.request.user
-        user_org_ids = OrganizationMember.objects.filter(user=user).values_list('organization_id', flat=True)
-        user_team_ids = TeamMember.objects.filter(user=user).values_list('team_id', flat=True)
+        membership = get_membership(self.request.user, self.request)
 
-        base_qs = Workflow.objects.filter(organization_id__in=user_org_ids)
+        base_qs = Workflow.objects.filter(organization_id__in=membership.org_ids)
 
         org_id = self.request.query_params.get('organization_id')
         if org_id:
             base_qs = base_qs.filter(organization_id=org_id)
 
+        # Point-in-time reads only include workflows that existed back then
+        base_qs = self.as_of_queryset(base_qs)
+
+        queryset = workflow_access.visible(base_qs, membership.principal_ids)
+
         visibility = self.request.query_params.get('visibility')
         if visibility:
-            if visibility == 'PUBLIC':
-                queryset = base_qs.filter(visibility='PUBLIC')
-            elif visibility == 'TEAM':
-                queryset = base_qs.filter(visibility='TEAM', shared_teams__team_id__in=user_team_ids)
-            elif visibility == 'PRIVATE':
-                queryset = base_qs.filter(visibility='PRIVATE', created_by=user)
-            else:
-                queryset = base_qs.filter(visibility=visibility)
-        else:
-            queryset = base_qs.filter(
-                Q(visibility='PUBLIC') |
-                Q(visibility='TEAM', shared_teams__team_id__in=user_team_ids) |
-                Q(visibility='PRIVATE', created_by=user)
-            ).distinct()
+            queryset = queryset.filter(visibility=visibility)
 
-        return queryset
+        # Load everything the serializer reads in a fixed number of queries
+        return self.optimize_queryset(queryset)
+
+    def restore_snapshots(self, pairs):
+        snapshots = [snapshot for _, snapshot in pairs]
+        teams = Team.objects.in_bulk({tid for s in snapshots for tid in s.get('team_ids', ())})
+        prompts = Prompt.objects.only('id', 'name', 'updated_at').in_bulk(
+            # Steps whose prompt was deleted are recorded as 'None'
+            {as_uuid(step.get('prompt')) for s in snapshots for step in s.get('steps', ())} - {None}
+        )
+        for workflow, snapshot in pairs:
+            for field in ('name', 'description', 'visibility'):
+                if field in snapshot:
+                    setattr(workflow, field, snapshot[field])
+            steps = []
+            for step in snapshot.get('steps', ()):
+                prompt_id = as_uuid(step.get('prompt'))
+                row = WorkflowStep(workflow=workflow, prompt_id=prompt_id, order=step['order'], name=step.get('name', ''))
+                WorkflowStep.prompt.field.set_cached_value(row, prompts.get(prompt_id))
+                steps.append(row)
+            shared_teams = []
+            for team_id in snapshot.get('team_ids', ()):
+                row = WorkflowTeam(workflow=workflow, team_id=team_id)
+                WorkflowTeam.team.field.set_cached_value(row, teams.get(as_uuid(team_id)))
+                shared_teams.append(row)
+            workflow.step_count = len(steps)
+            workflow._prefetched_objects_cache = {
+                'steps': prefetched(WorkflowStep, steps),
+                'shared_teams': prefetched(WorkflowTeam, shared_teams),
+            }
 
     def perform_create(self, serializer):
         user = self.request.user
-        user_org_ids = list(OrganizationMember.objects.filter(user=user).values_list('organization_id', flat=True))
+        user_org_ids = get_membership(user, self.request).org_ids
         org_id = user_org_ids[0] if user_org_ids else None
         serializer.save(created_by=user, organization_id=org_id)
 
@@ -436,6 +941,7 @@ class WorkflowViewSet(viewsets.ModelViewSet):
     def history(self, request, pk=None):
         """Return paginated change history for a workflow."""
         workflow = self.get_object()
+        history_outbox.flush(workflow_history, [workflow.pk])
         history_qs = WorkflowHistory.objects.filter(workflow=workflow)
         page = self.paginate_queryset(history_qs)
         if page is not None:
@@ -444,6 +950,71 @@ class WorkflowViewSet(viewsets.ModelViewSet):
         serializer = WorkflowHistorySerializer(history_qs, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['patch'])
+    def steps(self, request, pk=None):
+        """
+        Edit the step list without resending it.
+
+        Body: ``{"operations": [{"op": "insert" | "move" | "remove" |
+        "rename", ...}]}``, applied in order and all or nothing; see
+        WorkflowStepOperationSerializer and promptbox.steps. Returns the
+        updated workflow.
+        """
+        workflow = self.get_object()
+        operations = request.data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            return Response({'error': 'operations must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(operations) > STEP_MAX_OPERATIONS:
+            return Response({'error': f'At most {STEP_MAX_OPERATIONS} operations per request'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = WorkflowStepOperationSerializer(data=operations, many=True)
+        if not serializer.is_valid():
+            return Response({'operations': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        editor = WorkflowStepEditor(workflow, request.user, get_membership(request.user, request).principal_ids)
+        try:
+            editor.run(serializer.validated_data)
+        except StepOperationError as exc:
+            errors = [{} for _ in operations]
+            errors[exc.index] = exc.errors
+            return Response({'operations': errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(self.get_queryset().get(pk=workflow.pk)).data)
+
+    @action(detail=True, methods=['post'])
+    def run(self, request, pk=None):
+        """
+        Run the workflow and stream its progress as newline-delimited JSON:
+        a ``run`` event, one ``step`` event per step as it completes, then
+        ``done``. Body: ``{"input": "...", "backend": "<name>"}``.
+        """
+        workflow = self.get_object()
+        input_text = request.data.get('input', '')
+        backend_name = request.data.get('backend')
+        if not isinstance(input_text, str):
+            return Response({'error': 'input must be a string'}, status=status.HTTP_400_BAD_REQUEST)
+        if backend_name is not None and backend_name not in MODEL_BACKENDS:
+            return Response({'error': f'backend must be one of: {", ".join(MODEL_BACKENDS)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        membership = get_membership(request.user, request)
+        runner = WorkflowRunner(
+            workflow, get_model_backend(backend_name), user=request.user, principal_ids=membership.principal_ids,
+        )
+        lines = (json.dumps(event, cls=DjangoJSONEncoder) + '\n' for event in runner.stream(input_text))
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    @action(detail=True, methods=['get'])
+    def runs(self, request, pk=None):
+        """Return paginated past runs of a workflow with their step timings."""
+        workflow = self.get_object()
+        runs_qs = WorkflowRun.objects.filter(workflow=workflow).select_related('started_by').prefetch_related('step_runs')
+        page = self.paginate_queryset(runs_qs)
+        if page is not None:
+            serializer = WorkflowRunSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = WorkflowRunSerializer(runs_qs, many=True)
+        return Response(serializer.data)
+
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     permission_classes = [IsAuthenticated]
@@ -463,8 +1034,7 @@ class UserViewSet(viewsets.ModelViewSet):
         return UserManageSerializer
 
     def get_queryset(self):
-        request_user = self.request.user
-        user_org_ids = OrganizationMember.objects.filter(user=request_user).values_list('organization_id', flat=True)
+        user_org_ids = get_membership(self.request.user, self.request).org_ids
         queryset = User.objects.filter(
             is_active=True,
             organization_memberships__organization_id__in=user_org_ids,
@@ -474,14 +1044,20 @@ class UserViewSet(viewsets.ModelViewSet):
         if org_id:
             queryset = queryset.filter(organization_memberships__organization_id=org_id)
 
+        if self.action in ('list', 'retrieve'):
+            # Active teams of the whole page in one query, read by UserManageSerializer.get_teams
+            team_memberships = TeamMember.objects.filter(is_active=True, team__is_active=True)
+            if org_id:
+                team_memberships = team_memberships.filter(team__organization_id=org_id)
+            queryset = queryset.prefetch_related(Prefetch(
+                'team_memberships',
+                queryset=team_memberships.select_related('team').only('user_id', 'team__id', 'team__name').order_by('team__name'),
+                to_attr='active_team_memberships',
+            ))
         return queryset
 
     def _require_admin(self, organization_id):
-        if not OrganizationMember.objects.filter(
-            organization_id=organization_id,
-            user=self.request.user,
-            role='ADMIN',
-        ).exists():
+        if not get_membership(self.request.user, self.request).is_admin(organization_id):
             return Response({'error': 'Admin role required'}, status=status.HTTP_403_FORBIDDEN)
         return None
 
@@ -490,8 +1066,8 @@ class UserViewSet(viewsets.ModelViewSet):
         if org_id:
             return org_id
 
-        request_org_ids = set(OrganizationMember.objects.filter(user=self.request.user).values_list('organization_id', flat=True))
-        target_org_ids = OrganizationMember.objects.filter(user=target_user).values_list('organization_id', flat=True)
+        request_org_ids = set(get_membership(self.request.user, self.request).org_ids)
+        target_org_ids = get_membership(target_user).org_ids
         for candidate in target_org_ids:
             if candidate in request_org_ids:
                 return str(candidate)
@@ -540,7 +1116,7 @@ class UserViewSet(viewsets.ModelViewSet):
         if forbidden is not None:
             return forbidden
 
-        if not OrganizationMember.objects.filter(organization=team.organization, user=user).exists():
+        if not get_membership(user).is_member(team.organization_id):
             return Response({'error': 'User is not a member of the organization'}, status=status.HTTP_400_BAD_REQUEST)
 
         membership, created = TeamMember.objects.get_or_create(
@@ -586,3 +1162,38 @@ class UserViewSet(viewsets.ModelViewSet):
         membership.is_active = False
         membership.save(update_fields=['is_active'])
         return Response({'status': 'team removed'})
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        """
+        Create users in ``?organization_id=`` from a CSV (``text/csv``, header
+        row ``email,name,password[,role]``) or JSON Lines body. ``?role=`` is
+        the role of rows without one (default MEMBER). Streams one NDJSON
+        line per row back: ``{"row": n, "id": ...}`` or ``{"row": n, "error": ...}``.
+        """
+        org_id = as_uuid(request.query_params.get('organization_id'))
+        if org_id is None:
+            return Response({'error': 'organization_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+        forbidden = self._require_admin(org_id)
+        if forbidden is not None:
+            return forbidden
+        organization = Organization.objects.filter(id=org_id, is_active=True).first()
+        if organization is None:
+            return Response({'error': 'Organization not found'}, status=status.HTTP_404_NOT_FOUND)
+        role = request.query_params.get('role', 'MEMBER').upper()
+        if role not in USER_IMPORT_ROLES:
+            return Response({'error': f'role must be one of: {", ".join(USER_IMPORT_ROLES)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = request.content_type.split(';')[0].strip().lower()
+        if content_type not in TEMPLATE_CSV_TYPES + TEMPLATE_JSONL_TYPES:
+            return Response(
+                {'error': f'Send rows as one of: {", ".join(TEMPLATE_CSV_TYPES + TEMPLATE_JSONL_TYPES)}'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        # Requests share one small pool rather than starting processes each
+        importer = UserImporter(organization, role=role, workers=shared_pool_workers(), pool=shared_pool)
+        rows = read_rows(decode_lines(request._request), content_type)
+        results = (json.dumps(result) + '\n' for result in importer.run(rows))
+        response = StreamingHttpResponse(results, content_type='application/x-ndjson')
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -131,6 +131,17 @@ export const api = {
     return response.json();
   },
 
+  getFolderTree: async (params = {}) => {
+    console.log('API: Fetching folder tree', params);
+    const queryString = new URLSearchParams(params).toString();
+    const response = await fetch(`${API_BASE_URL}/folders/tree/?${queryString}`, {
+      headers: getHeaders(),
+      credentials: 'include',
+    });
+    if (!response.ok) throw new Error('Failed to fetch folder tree');
+    return response.json();
+  },
+
   createFolder: async (folderData) => {
     console.log('API: Creating folder', folderData);
     const response = await fetch(`${API_BASE_URL}/folders/`, {
@@ -363,6 +374,26 @@ export const api = {
     return response.json();
   },
 
+  importUsers: async (organizationId, file, role = 'MEMBER') => {
+    console.log(`API: Importing users into organization ${organizationId}`);
+    const queryString = new URLSearchParams({ organization_id: organizationId, role }).toString();
+    const contentType = file.name.endsWith('.csv') ? 'text/csv' : 'application/x-ndjson';
+    const response = await fetch(`${API_BASE_URL}/users/import/?${queryString}`, {
+      method: 'POST',
+      headers: { 'Content-Type': contentType },
+      credentials: 'include',
+      body: file,
+    });
+    if (!response.ok) {
+      const errorData = await response.json();
+      console.error('API: Import users failed', errorData);
+      throw new Error(errorData.error || 'Failed to import users');
+    }
+    // One result per row: { row, id } or { row, error }
+    const text = await response.text();
+    return text.split('\n').filter(Boolean).map((line) => JSON.parse(line));
+  },
+
   // Workflows
   getWorkflows: async (params = {}) => {
     console.log('API: Fetching workflows', params);